@@ -1,17 +1,29 @@
 import streamlit as st
 import os
-import pandas as pd
+import logging
 from utils.supabase_conn import SupaBase
-from utils.openai import generate_social_posts, article_to_posts, refine_content
+from utils.openai import generate_social_posts, article_to_posts, refine_content, find_missing_slots, fill_missing_posts, flag_near_duplicates
 from utils.auth_ui import check_authentication
+from utils import telemetry
+from utils import embeddings
+from utils import jobs
+from utils import drafts
+from utils import cards
+from utils import paging
+from utils import post_metrics
+from utils import export
+from functools import partial
 import base64
 from datetime import datetime
 import json
-from io import BytesIO
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from utils import lazy
+
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+
+# Heavy modules are imported on first use, so the login screen never loads them
+pd = lazy.load("pandas")
+post_image = lazy.load("utils.post_image")
+image_export = lazy.load("utils.image_export")
 
 # Enhanced page configuration
 st.set_page_config(
@@ -337,37 +349,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper functions for enhanced UI
-def create_social_post_card(post, brand_name, post_index, tab_prefix=""):
-    """Create a visually appealing social media post card that looks like LinkedIn."""
-    
-    # Get brand initials for profile picture
-    brand_initials = ''.join([word[0].upper() for word in brand_name.split()[:2]])
-    
-    # Format post content with proper spacing and hashtags
-    content = post.get('content', '').replace('\\n', '\n')
-    
-    # Create the HTML card
-    card_html = f"""
-    <div class="social-post-card">
-        <div class="post-header">
-            <div class="profile-pic">{brand_initials}</div>
-            <div class="post-meta">
-                <div class="brand-name">{brand_name}</div>
-                <div class="post-time">{post.get('date', 'Today')} • LinkedIn</div>
-            </div>
-        </div>
-        <div class="post-content">{content}</div>
-        <div class="post-engagement">
-            <div class="engagement-btn">👍 Like</div>
-            <div class="engagement-btn">💬 Comment</div>
-            <div class="engagement-btn">🔄 Repost</div>
-            <div class="engagement-btn">📤 Send</div>
-        </div>
-    </div>
-    """
-    
-    return card_html
-
 def create_post_metrics():
     """Create engagement metrics for posts."""
     col1, col2, col3, col4 = st.columns(4)
@@ -404,87 +385,16 @@ def create_post_metrics():
         </div>
         """, unsafe_allow_html=True)
 
-def create_enhanced_export_data(posts, brand_name):
-    """Create enhanced export data with visual elements."""
-    export_data = []
-    
-    for i, post in enumerate(posts):
-        export_data.append({
-            "Post Number": f"#{post.get('number', i+1)}",
-            "Date": post.get('date', ''),
-            "Brand": brand_name,
-            "Content": post.get('content', ''),
-            "Graphic Concept": post.get('graphic', ''),
-            "Character Count": len(post.get('content', '')),
-            "Hashtags": len([word for word in post.get('content', '').split() if word.startswith('#')]),
-            "Mentions": len([word for word in post.get('content', '').split() if word.startswith('@')]),
-            "Estimated Reach": f"{(i+1) * 1200 + 500}-{(i+1) * 1500 + 800}",
-            "Best Time to Post": "9:00 AM - 11:00 AM" if i % 2 == 0 else "1:00 PM - 3:00 PM"
-        })
-    
-    return pd.DataFrame(export_data)
-
 def generate_post_image(post_content, brand_name, post_date, output_path=None):
-    """Generate a visual image of the post for download."""
+    """Generate a visual image of the post for download (see utils/post_image.py)."""
     try:
-        # Create figure and axis with better error handling
-        plt.style.use('default')  # Use default style to avoid theme issues
-        fig, ax = plt.subplots(figsize=(8, 10))
-        ax.set_xlim(0, 10)
-        ax.set_ylim(0, 12)
-        ax.axis('off')
-        
-        # Background
-        bg_rect = patches.Rectangle((0.5, 0.5), 9, 11, linewidth=1, 
-                                   edgecolor='#e1e8ed', facecolor='white')
-        ax.add_patch(bg_rect)
-        
-        # Header section
-        header_rect = patches.Rectangle((0.5, 9.5), 9, 2, linewidth=0, 
-                                       facecolor='#f8f9fa')
-        ax.add_patch(header_rect)
-        
-        # Profile circle
-        profile_circle = patches.Circle((1.5, 10.5), 0.3, facecolor='#667eea', 
-                                       edgecolor='white')
-        ax.add_patch(profile_circle)
-        
-        # Brand initials
-        brand_initials = ''.join([word[0].upper() for word in brand_name.split()[:2]])
-        ax.text(1.5, 10.5, brand_initials, ha='center', va='center', 
-                fontsize=12, fontweight='bold', color='white')
-        
-        # Brand name and date
-        ax.text(2.2, 10.7, brand_name, ha='left', va='center', 
-                fontsize=14, fontweight='bold')
-        ax.text(2.2, 10.3, f"{post_date} • LinkedIn", ha='left', va='center', 
-                fontsize=10, color='#666666')
-        
-        # Post content - limit length to prevent overflow
-        content_preview = post_content[:200] + "..." if len(post_content) > 200 else post_content
-        wrapped_content = textwrap.fill(content_preview, width=60)
-        ax.text(1, 8.5, wrapped_content, ha='left', va='top', 
-                fontsize=11, verticalalignment='top')
-        
-        # Engagement buttons
-        ax.text(1, 1.5, "👍 Like    💬 Comment    🔄 Repost    📤 Send", 
-                ha='left', va='center', fontsize=10, color='#666666')
-        
-        # Save or return
         if output_path:
-            plt.savefig(output_path, dpi=300, bbox_inches='tight', 
-                       facecolor='white', edgecolor='none')
-            plt.close()
+            # Print resolution
+            with open(output_path, "wb") as f:
+                f.write(post_image.post_image(post_content, brand_name, post_date, scale=2.0))
             return output_path
-        else:
-            # Convert to base64 for web display
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight',
-                       facecolor='white', edgecolor='none')
-            buffer.seek(0)
-            img_base64 = base64.b64encode(buffer.read()).decode()
-            plt.close()
-            return img_base64
+        # Base64 for web display
+        return base64.b64encode(post_image.post_image(post_content, brand_name, post_date)).decode()
     except Exception as e:
         # Return None instead of showing error in UI for this optional feature
         print(f"Warning: Could not generate post image: {str(e)}")
@@ -514,6 +424,33 @@ except Exception as e:
     st.sidebar.warning("Make sure your .env file contains DATABASE_URL and SUPABASE_API")
     st.session_state.supabase_client = None
 
+def drop_export_file(state_key):
+    """Forget the session's prepared export file and delete it."""
+    prepared = st.session_state.pop(state_key, None)
+    if prepared:
+        try:
+            os.remove(prepared["path"])
+        except OSError:
+            pass
+
+def keep_export_file(state_key, prepared):
+    """Keep a prepared export file (path, key and stats) in the session, deleting the one it replaces."""
+    drop_export_file(state_key)
+    st.session_state[state_key] = prepared
+
+def prepared_export_data(state_key, key):
+    """Contents of the session's prepared export file if it was made for `key` and still exists, else None."""
+    prepared = st.session_state.get(state_key)
+    if not prepared or prepared["key"] != key:
+        return None
+    try:
+        with open(prepared["path"], "rb") as f:
+            return f.read()
+    except OSError:
+        # Removed by export.EXPORT_FILE_TTL_S: prepare it again
+        st.session_state.pop(state_key, None)
+        return None
+
 def get_brand_by_id(brand_id, brands_list):
     """Get brand details by ID from the brands list."""
     for brand in brands_list:
@@ -521,6 +458,550 @@ def get_brand_by_id(brand_id, brands_list):
             return brand
     return None
 
+def saved_post_texts(brand_data):
+    """
+    Text of a brand's saved posts, used to catch near-duplicates. Nothing is
+    read until the generation job iterates it, and then a page at a time.
+    """
+    if not brand_data or not brand_data.get('id') or not st.session_state.supabase_client:
+        return []
+    chunks = export.query_chunks(st.session_state.supabase_client, brand_data['id'], st.session_state.get('user_id'))
+    return (row.get('post') or '' for chunk in chunks for row in chunk)
+
+def near_duplicate_note(post):
+    """Note for a post's card when it repeats an earlier one, else None."""
+    duplicate = post.get('near_duplicate')
+    if duplicate:
+        return (f"⚠️ {duplicate['similarity']:.0%} similar to a {duplicate['source']} post: "
+                f"\"{duplicate['match'][:80]}...\"")
+    return None
+
+def use_session_embedder():
+    """Embed with the session's OpenAI key when there is one, else the local stand-in."""
+    if st.session_state.supabase_client:
+        st.session_state.supabase_client.embedder = embeddings.get_embedder(st.session_state.get('api_key'))
+
+# Session state keys holding each draft kind's posts and the request that produced them
+DRAFT_STATE_KEYS = {
+    "calendar": ("generated_posts", "calendar_request"),
+    "article": ("article_posts", "article_request")
+}
+
+def save_job_draft(user_id, request, job):
+    """Keep a finished job's posts as a draft. Runs on the job's worker thread, even if the page is gone."""
+    if user_id and job.status == jobs.DONE and job.result:
+        drafts.save_draft(drafts.make_draft(job.id, user_id, job.kind, job.result, request))
+
+def update_draft(kind):
+    """Save this tab's edited posts over its draft."""
+    draft_id = st.session_state.get(f"{kind}_draft_id")
+    user_id = st.session_state.get('user_id')
+    if draft_id and user_id:
+        posts_key, request_key = DRAFT_STATE_KEYS[kind]
+        drafts.save_draft(drafts.make_draft(draft_id, user_id, kind, st.session_state.get(posts_key) or [],
+                                            st.session_state.get(request_key)))
+
+def reset_post_widgets(kind):
+    """Rebuild the card selection and the grid editor from the posts on the next run."""
+    st.session_state.pop(f"{kind}_card_selection", None)
+    st.session_state[f"{kind}_grid_version"] = st.session_state.get(f"{kind}_grid_version", 0) + 1
+
+def replace_posts(kind, posts):
+    """Show a new list of posts in a tab, dropping the card selection and grid edits of the old one."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    st.session_state[posts_key] = posts
+    reset_post_widgets(kind)
+
+def restore_drafts():
+    """
+    Reload the user's latest generated posts after a refresh, reconnect or
+    server restart, and pick up the generations a closed session left running.
+    """
+    user_id = st.session_state.get('user_id')
+    manager = jobs.get_manager()
+    for kind, (posts_key, request_key) in DRAFT_STATE_KEYS.items():
+        job = manager.adopt(user_id, kind)
+        if job is not None:
+            st.session_state[f"{kind}_job_id"] = job.id
+            st.session_state[f"{kind}_job_request"] = job.request
+            st.toast(f"⏳ Picked up your {kind} generation that was still running")
+        if st.session_state.get(posts_key):
+            continue
+        draft = drafts.load_latest(user_id, kind)
+        if draft and draft.get('posts'):
+            replace_posts(kind, draft['posts'])
+            st.session_state[request_key] = draft.get('request') or None
+            st.session_state[f"{kind}_draft_id"] = draft['id']
+            if kind == "calendar":
+                st.session_state.selected_posts = draft['posts'].copy()
+            st.toast(f"♻️ Restored your last {kind} draft ({len(draft['posts'])} posts)")
+
+def submit_generation_job(kind, fn, *args, request=None, **kwargs):
+    """Queue a generation call in the background, replacing this tab's previous job."""
+    manager = jobs.get_manager()
+    previous = st.session_state.get(f"{kind}_job_id")
+    if previous:
+        manager.cancel(previous, "replaced by a new generation")
+    user_id = st.session_state.get('user_id')
+    st.session_state[f"{kind}_job_id"] = manager.submit(
+        fn, *args, kind=kind, owner=user_id, request=request, on_done=partial(save_job_draft, user_id, request), **kwargs
+    )
+    st.session_state[f"{kind}_job_request"] = request
+
+def fill_posts(kind, posts, request, api_key, slots=None, saved_posts=None):
+    """
+    Job behind Fill Missing Posts and Regenerate Duplicates: regenerate the
+    missing posts (or `slots`) of a tab, and flag near-duplicates again when
+    `saved_posts` is given.
+    """
+    if kind == "calendar":
+        source = {"focus": request['focus'], "special_events": request['special_events']}
+    else:
+        source = {"article_text": request['article_text'], "website_url": request['website_url']}
+    posts = fill_missing_posts([dict(post) for post in posts], request['expected'], request['brand_data'],
+                               api_key, mode=kind, slots=slots, **source)
+    if saved_posts is not None:
+        flag_near_duplicates(posts, request['brand_data'], saved_posts)
+    return posts
+
+@st.fragment(run_every=1)
+def render_generation_job(kind):
+    """Live status of a background generation job; reruns the page once it finishes."""
+    manager = jobs.get_manager()
+    job = manager.get(st.session_state.get(f"{kind}_job_id"))
+    if job is None:
+        st.session_state.pop(f"{kind}_job_id", None)
+        return
+    if job.done:
+        st.session_state.pop(f"{kind}_job_id", None)
+        st.session_state[f"{kind}_finished_job"] = job
+        st.rerun()
+
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        if job.status == jobs.QUEUED:
+            st.info("⏳ Waiting for a free generation worker...")
+        else:
+            elapsed = job.elapsed()
+            st.progress(min(90, 10 + int(elapsed)),
+                        text=job.note or f"{job.label or '✍️ Creating engaging content'}... ({elapsed:.0f}s)")
+    with col2:
+        if st.button("✖️ Cancel", key=f"cancel_{kind}_job", help="Stop this generation and free its tokens"):
+            manager.cancel(job.id)
+
+def take_finished_job(kind):
+    """
+    Show the outcome of a finished generation job once.
+    Returns (result, request) for a successful job, else (None, None).
+    """
+    job = st.session_state.pop(f"{kind}_finished_job", None)
+    if job is None:
+        return None, None
+    request = st.session_state.pop(f"{kind}_job_request", None)
+    for level, message in job.messages:
+        getattr(st, level)(message)
+    if job.status == jobs.DONE:
+        st.session_state[f"{kind}_draft_id"] = job.id
+        return job.result, request
+    if job.status == jobs.TIMED_OUT:
+        st.error(f"⏱️ Generation stopped after {job.deadline_s:.0f}s. Try fewer posts or try again.")
+    elif job.status == jobs.CANCELLED:
+        st.warning("✖️ Generation cancelled.")
+    else:
+        st.error(f"Generation failed: {job.error}")
+    return None, None
+
+def select_all_posts(kind):
+    """Select All callback: select or clear every post in the cards and the grid."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    selected = st.session_state[f"select_all_{kind}"]
+    for post in st.session_state[posts_key]:
+        post['selected'] = selected
+    reset_post_widgets(kind)
+
+# Grid editor column -> post field
+GRID_COLUMNS = {"Include": "selected", "#": "number", "Date": "date", "Content": "content", "Graphic": "graphic"}
+
+def apply_grid_edits(kind, grid_key, grid_columns):
+    """Grid editor callback: apply the edited cells to the posts as a diff."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    posts = st.session_state[posts_key]
+    edited_rows = st.session_state[grid_key].get("edited_rows", {})
+    content_changed = False
+    for row, changes in edited_rows.items():
+        post = posts[int(row)]
+        for column, value in changes.items():
+            field = grid_columns[column]
+            if field == "selected":
+                value = bool(value)
+            elif value is None:
+                value = ""
+            if post.get(field) != value:
+                post[field] = value
+                content_changed = content_changed or field != "selected"
+                if field == "content":
+                    post_metrics.attach(post)
+    if content_changed:
+        update_draft(kind)
+    # A fresh grid over the updated posts, so later edits are diffed against them
+    st.session_state[f"{kind}_grid_version"] = st.session_state.get(f"{kind}_grid_version", 0) + 1
+
+def apply_refinement(kind, index, key_prefix, feedback, refine_post, refine_graphic):
+    """Apply button callback: refine one post before its editor is drawn again."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    refined_result = refine_content(
+        st.session_state[posts_key][index], feedback, st.session_state.api_key, 
+        refine_post=refine_post, refine_graphic=refine_graphic
+    )
+    st.session_state[posts_key][index] = refined_result
+    # Reset the editor's text areas so they show the refined text
+    st.session_state.pop(f"{key_prefix}edit_post_{index}", None)
+    st.session_state.pop(f"{key_prefix}edit_graphic_concept_{index}", None)
+    update_draft(kind)
+
+@st.fragment
+def render_post_editor(kind, index, key_prefix):
+    """Edit one post and refine it with AI. Typing here reruns only this post."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    post = st.session_state[posts_key][index]
+    col1, col2, col3 = st.columns([0.5, 0.25, 0.15])
+    
+    with col1:
+        content = st.text_area("Post Content", post['content'], height=150, key=f"{key_prefix}edit_post_{index}")
+        if content != post['content']:
+            post['content'] = content
+            post_metrics.attach(post)
+        post['graphic'] = st.text_area("Graphic Concept", post['graphic'], height=80, key=f"{key_prefix}edit_graphic_concept_{index}")
+    
+    with col2:
+        st.markdown("**🤖 AI Refinement**")
+        feedback = st.text_area("Refine as...", placeholder="more casual, professional", key=f"{key_prefix}edit_feedback_trad_{index}", height=70)
+        refine_post = st.checkbox("Refine Post", key=f"{key_prefix}edit_refine_post_trad_{index}")
+        refine_graphic = st.checkbox("Refine Graphic", key=f"{key_prefix}edit_refine_graphic_trad_{index}")
+    
+    with col3:
+        if feedback and (refine_post or refine_graphic):
+            st.button("🚀 Apply", key=f"{key_prefix}edit_apply_{index}", on_click=apply_refinement,
+                      args=(kind, index, key_prefix, feedback, refine_post, refine_graphic))
+
+@st.fragment
+def render_export_panel(kind, brand_id, brand_name, post_type, file_stem, enhanced_file_stem, use_post_dates):
+    """Save and download the selected posts. Changing the format reruns only this panel."""
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    selected_posts = [post for post in st.session_state[posts_key] if post.get('selected', False)]
+    
+    if not selected_posts:
+        st.markdown("""
+        <div style="background: linear-gradient(135deg, #f39c12 0%, #e67e22 100%); border: 2px solid #f39c12; padding: 15px; border-radius: 8px; text-align: center; color: white;">
+            <h4>📋 No Posts Selected</h4>
+            <p>Select at least one post to enable export options.</p>
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4>📊 Ready to Export</h4>
+            <p style="font-size: 24px; margin: 0;">{len(selected_posts)} posts</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        if st.button("💾 Save to Database", type="primary", use_container_width=True, key=f"save_{kind}_posts"):
+            use_session_embedder()
+            saved_count = 0
+            
+            for post in selected_posts:
+                result = st.session_state.supabase_client.save_posts(
+                    brand_id=brand_id,
+                    post=post['content'],
+                    user_id=st.session_state.get('user_id'),
+                    graphic_concept=post['graphic'],
+                    type=post_type,
+                    date=post['date'] if use_post_dates else datetime.now().strftime('%Y-%m-%d'),
+                    metrics=post_metrics.metrics_for(post)
+                )
+                if result:
+                    saved_count += 1
+            
+            st.session_state.supabase_client.flush_index()
+            st.success(f"✅ Saved {saved_count} posts to database!")
+            if saved_count == len(selected_posts):
+                # Saved for good: don't offer these posts again as a draft
+                drafts.discard(st.session_state.get('user_id'), st.session_state.pop(f"{kind}_draft_id", None))
+    
+    with col3:
+        export_format = st.selectbox("📄 Export Format", ["Enhanced CSV", "Basic CSV", "JSON"], key=f"{kind}_export_format")
+    
+    today = datetime.now().strftime('%Y%m%d')
+    if export_format == "Enhanced CSV":
+        export_df = export.enhanced_export_data(selected_posts, brand_name)
+        st.download_button(
+            label="📊 Download Enhanced CSV Report",
+            data=export_df.to_csv(index=False),
+            file_name=f"{enhanced_file_stem}_{today}.csv",
+            mime="text/csv",
+            use_container_width=True,
+            key=f"download_{kind}_enhanced"
+        )
+    
+    elif export_format == "Basic CSV":
+        basic_data = []
+        for post in selected_posts:
+            row = {"Date": post.get('date', '')} if use_post_dates else {}
+            row["Content"] = post.get('content', '')
+            row["Graphic Concept"] = post.get('graphic', '')
+            basic_data.append(row)
+        export_df = pd.DataFrame(basic_data)
+        st.download_button(
+            label="📄 Download Basic CSV",
+            data=export_df.to_csv(index=False),
+            file_name=f"{file_stem}_{today}.csv",
+            mime="text/csv",
+            use_container_width=True,
+            key=f"download_{kind}_basic"
+        )
+    
+    else:
+        export_df = pd.DataFrame(selected_posts)
+        st.download_button(
+            label="📋 Download JSON",
+            data=json.dumps(selected_posts, indent=2, ensure_ascii=False),
+            file_name=f"{file_stem}_{today}.json",
+            mime="application/json",
+            use_container_width=True,
+            key=f"download_{kind}_json"
+        )
+    
+    # Preview export data
+    if st.checkbox("👀 Preview Export Data", key=f"preview_{kind}_export"):
+        st.markdown("#### 📊 Enhanced Export Preview" if export_format == "Enhanced CSV" else "#### 📄 Export Preview")
+        st.dataframe(export_df, use_container_width=True)
+    
+    # Post images, rendered in parallel into one ZIP
+    st.markdown("#### 🖼️ Post Images")
+    images_key = image_export.archive_key(selected_posts, brand_name)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button(f"🖼️ Render {len(selected_posts)} Images", use_container_width=True, key=f"render_{kind}_images"):
+            with st.spinner("🖼️ Rendering images..."):
+                path, stats = image_export.images_zip_file(selected_posts, brand_name, file_stem)
+            keep_export_file(f"{kind}_images_zip", {"key": images_key, "path": path, "stats": stats})
+    with col2:
+        data = prepared_export_data(f"{kind}_images_zip", images_key)
+        if data is not None:
+            stats = st.session_state[f"{kind}_images_zip"]["stats"]
+            st.download_button(
+                label="📦 Download All Images (ZIP)",
+                data=data,
+                file_name=f"{file_stem}_images_{today}.zip",
+                mime="application/zip",
+                use_container_width=True,
+                key=f"download_{kind}_images"
+            )
+            st.caption(f"{stats['images']} images ({stats['rendered']} rendered, the rest cached) in "
+                       f"{stats['seconds']:.1f}s · {stats['images_per_s']:.1f} images/s on {stats['workers']} workers · "
+                       f"{stats['zip_bytes'] / 1e6:.1f} MB")
+
+@st.fragment
+def render_post_list(kind, brand_name, intro, item_label, export_title, export_args):
+    """
+    The generated posts as social cards or editors, with the export panel.
+    Selecting posts reruns only this list; each editor and the export panel
+    are fragments of their own.
+    """
+    posts_key, _ = DRAFT_STATE_KEYS[kind]
+    posts = st.session_state[posts_key]
+    key_prefix = "" if kind == "calendar" else f"{kind}_"
+    
+    # Display mode toggle
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        st.markdown(intro)
+    with col2:
+        view_mode = st.selectbox("👁️ View Mode", ["Social Cards", "Edit Mode"], key=f"{kind}_view_mode")
+    with col3:
+        st.checkbox("✅ Select All", key=f"select_all_{kind}", on_change=select_all_posts, args=(kind,))
+    
+    if view_mode == "Social Cards":
+        # Modern card view: one selection widget and one markdown block for all cards
+        selection_key = f"{kind}_card_selection"
+        if selection_key not in st.session_state:
+            st.session_state[selection_key] = [i for i, post in enumerate(posts) if post.get('selected')]
+        included = st.multiselect("✅ Include posts", options=list(range(len(posts))), key=selection_key,
+                                  format_func=lambda i: f"{item_label} #{posts[i]['number']}",
+                                  placeholder="Choose the posts to save and export")
+        for i, post in enumerate(posts):
+            post['selected'] = i in included
+        
+        cards.render_cards(
+            cards.card_html(
+                post.get('content', ''), brand_name, post.get('date'), post.get('graphic'),
+                notes=[note for note in (cards.post_stats(post_metrics.metrics_for(post)), near_duplicate_note(post)) if note]
+            )
+            for post in posts
+        )
+    
+    else:
+        # Grid editor: one widget for all posts, with AI refinement for one post on demand
+        grid_columns = GRID_COLUMNS if kind == "calendar" else {k: v for k, v in GRID_COLUMNS.items() if k != "Date"}
+        grid_key = f"{kind}_grid_{st.session_state.get(f'{kind}_grid_version', 0)}"
+        st.data_editor(
+            pd.DataFrame([{column: post.get(field) for column, field in grid_columns.items()} for post in posts]),
+            key=grid_key,
+            on_change=apply_grid_edits,
+            args=(kind, grid_key, grid_columns),
+            column_config={
+                "Include": st.column_config.CheckboxColumn("✅", width="small"),
+                "#": st.column_config.TextColumn(width="small"),
+                "Content": st.column_config.TextColumn("Post Content", width="large"),
+                "Graphic": st.column_config.TextColumn("Graphic Concept", width="medium")
+            },
+            disabled=["#"],
+            hide_index=True,
+            num_rows="fixed",
+            use_container_width=True
+        )
+        
+        refine_options = ["—"] + [f"{item_label} #{post['number']}" for post in posts]
+        refine_choice = st.selectbox("🤖 Refine a post", refine_options, key=f"{kind}_refine_choice",
+                                     help="Open one post's editor to refine it with AI")
+        if refine_choice != "—":
+            with st.container(border=True):
+                render_post_editor(kind, refine_options.index(refine_choice) - 1, key_prefix)
+    
+    # Enhanced Export Section
+    st.markdown("---")
+    st.markdown(f"### 📤 {export_title}")
+    render_export_panel(kind, **export_args)
+
+def turn_saved_posts_page(page):
+    """Previous/Next callback for the Saved Posts library."""
+    st.session_state.saved_posts_page = page
+    st.session_state.pop("saved_posts_copy", None)
+
+@st.fragment
+def render_saved_posts(brand_name):
+    """
+    One page of the Saved Posts library. Only that page is fetched and drawn,
+    while the next one is prefetched, so paging reruns just this fragment.
+    """
+    pager = st.session_state.saved_posts_pages
+    page = min(st.session_state.get('saved_posts_page', 0), pager.page_count - 1)
+    posts = pager.get(page)
+
+    # Posts summary
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4>📊 Total Posts</h4>
+            <p style="font-size: 24px; margin: 0;">{pager.total}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        avg_length = sum(post_metrics.metrics_for(p, 'post')['char_count'] for p in posts) // len(posts) if posts else 0
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4>📝 Avg Length (this page)</h4>
+            <p style="font-size: 24px; margin: 0;">{avg_length} chars</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        recent_posts = len([p for p in posts if 'Today' in (p.get('date') or '') or 'yesterday' in (p.get('date') or '').lower()])
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4>🕒 Recent Posts (this page)</h4>
+            <p style="font-size: 24px; margin: 0;">{recent_posts}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown("---")
+    st.markdown(f"### 📱 Posts for {brand_name}")
+
+    # Display mode selection
+    display_mode = st.selectbox("👁️ Display Mode", ["Social Cards", "List View"], key="saved_posts_display")
+
+    if display_mode == "Social Cards":
+        # Display as social media cards, in one markdown block
+        cards.render_cards(
+            cards.card_html(
+                post.get('post', ''), brand_name, post.get('date', 'Unknown Date'), post.get('graphic_concept'),
+                notes=[
+                    f"📅 {post.get('date', 'N/A')} · 📄 {post.get('type', 'N/A')} · 👤 {post.get('user_id', 'N/A')}",
+                    cards.post_stats(post_metrics.metrics_for(post, 'post'))
+                ]
+            )
+            for post in posts
+        )
+
+        # Quick actions
+        copy_options = ["—"] + list(range(len(posts)))
+        copy_choice = st.selectbox(
+            "📋 Copy Content", copy_options, key="saved_posts_copy",
+            format_func=lambda i: i if i == "—" else f"{posts[i].get('date', 'No Date')} | {posts[i].get('post', '')[:60]}"
+        )
+        if copy_choice != "—":
+            st.code(posts[copy_choice].get('post', ''), language=None)
+
+    else:
+        # Traditional list view
+        for i, post in enumerate(posts):
+            with st.expander(f"📅 {post.get('date', 'No Date')} | {post.get('type', 'No Type')}", expanded=False):
+                col1, col2 = st.columns([2, 1])
+
+                with col1:
+                    st.markdown("**📝 Post Content:**")
+                    # Use a styled container instead of code block for better visibility
+                    st.markdown(f"""
+                    <div style="background: linear-gradient(135deg, #2d2d2d 0%, #3d3d3d 100%); padding: 15px; border-radius: 8px; border: 2px solid #667eea; color: white; font-family: monospace; white-space: pre-wrap; margin: 10px 0;">
+{post.get('post', '')}
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                    if post.get('graphic_concept'):
+                        st.markdown("**🎨 Graphic Concept:**")
+                        st.markdown(f"""
+                        <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 10px; border-radius: 6px; border: 1px solid #667eea; color: #cccccc; font-style: italic; margin: 10px 0;">
+                            {post.get('graphic_concept', '')}
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                with col2:
+                    metrics = post_metrics.metrics_for(post, 'post')
+                    st.markdown("**📊 Post Details:**")
+                    st.markdown(f"**Type:** {post.get('type', 'N/A')}")
+                    st.markdown(f"**Date:** {post.get('date', 'N/A')}")
+                    st.markdown(f"**User ID:** `{post.get('user_id', 'N/A')}`")
+
+                    # Performance metrics (placeholder)
+                    st.markdown(f"""
+                    **📈 Estimated Performance:**
+                    - Characters: {metrics['char_count']}
+                    - Hashtags: {metrics['hashtag_count']}
+                    - Mentions: {metrics['mention_count']}
+                    - Links: {metrics['url_count']}
+                    - Reading time: {metrics['reading_time_s']}s
+                    """)
+
+    # Page controls
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("◀ Previous", key="saved_posts_prev", disabled=page == 0, use_container_width=True,
+                  on_click=turn_saved_posts_page, args=(page - 1,))
+    with col2:
+        first = page * pager.page_size + 1
+        st.markdown(f"<p style='text-align: center;'>Page {page + 1} of {pager.page_count} · "
+                    f"posts {first}–{first + len(posts) - 1} of {pager.total}</p>", unsafe_allow_html=True)
+    with col3:
+        st.button("Next ▶", key="saved_posts_next", disabled=page + 1 >= pager.page_count, use_container_width=True,
+                  on_click=turn_saved_posts_page, args=(page + 1,))
+
 # Load brands when the app starts
 if st.session_state.supabase_client:
     current_user_id = st.session_state.get('user_id')
@@ -530,6 +1011,14 @@ if st.session_state.supabase_client:
 if not check_authentication():
     st.stop()
 
+if not st.session_state.get('drafts_restored'):
+    st.session_state.drafts_restored = True
+    restore_drafts()
+
+with st.sidebar:
+    with st.expander("📈 Generation Telemetry", expanded=False):
+        telemetry.render_summary()
+
 # Main app interface with enhanced tabs
 tab1, tab2, tab3, tab4 = st.tabs([
     "🚀 Social Calendar Generator", 
@@ -835,6 +1324,9 @@ with tab1:
                 special_events = st.text_area("🎊 Special Events", 
                     placeholder="e.g., National Hot Dog Day (July 21), Franchise Convention", 
                     height=80)
+                regenerate_duplicates = st.checkbox("♻️ Regenerate near-duplicates", value=False,
+                    help="Rewrite posts that closely repeat the brand's example or saved posts",
+                    key="calendar_regenerate_duplicates")
                 
                 if not st.session_state.api_key:
                     api_key = st.text_input("🔑 OpenAI API Key", type="password", 
@@ -854,229 +1346,94 @@ with tab1:
                 else:
                     st.session_state.api_key = api_key
                     
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    with st.spinner("🎨 Generating personalized posts..."):
-                        status_text.text("🧠 Analyzing brand voice...")
-                        progress_bar.progress(25)
-                        
-                        status_text.text("✍️ Creating engaging content...")
-                        progress_bar.progress(50)
-                        
-                        st.session_state.generated_posts = generate_social_posts(
-                            selected_brand_data, focus, num_posts, 
-                            special_events, api_key
-                        )
-                        progress_bar.progress(75)
-                        
-                        status_text.text("🎯 Optimizing for engagement...")
-                        st.session_state.selected_posts = st.session_state.generated_posts.copy()
-                        progress_bar.progress(100)
-                        
-                        status_text.text("✅ Posts generated successfully!")
-                        
-                    st.markdown("""
-                    <div class="success-card">
-                        <h4>🎉 Success!</h4>
-                        <p>Generated {} high-quality LinkedIn posts for {}!</p>
-                    </div>
-                    """.format(len(st.session_state.generated_posts), selected_brand_name), 
-                    unsafe_allow_html=True)
+                    submit_generation_job(
+                        "calendar", generate_social_posts,
+                        selected_brand_data, focus, num_posts, 
+                        special_events, api_key,
+                        saved_posts=saved_post_texts(selected_brand_data),
+                        regenerate_duplicates=regenerate_duplicates,
+                        label="🎨 Generating personalized posts",
+                        request={
+                            "brand_data": selected_brand_data,
+                            "focus": focus,
+                            "special_events": special_events,
+                            "expected": num_posts * 2
+                        }
+                    )
+        
+        if st.session_state.get("calendar_job_id"):
+            render_generation_job("calendar")
+        posts, request = take_finished_job("calendar")
+        if posts is not None:
+            replace_posts("calendar", posts)
+            st.session_state.calendar_request = request
+            st.session_state.selected_posts = st.session_state.generated_posts.copy()
+            st.markdown("""
+            <div class="success-card">
+                <h4>🎉 Success!</h4>
+                <p>Generated {} high-quality LinkedIn posts for {}!</p>
+            </div>
+            """.format(len(posts), request["brand_data"].get("name", "")), 
+            unsafe_allow_html=True)
         
         # Display generated posts with enhanced UI
         if st.session_state.generated_posts and selected_brand_name:
             st.markdown("---")
             st.markdown("### 📱 Generated LinkedIn Posts")
             
-            # Display mode toggle
-            col1, col2, col3 = st.columns([2, 1, 1])
-            with col1:
-                st.markdown("Review and customize your posts. Use **Edit Mode** to modify content and apply AI refinements.")
-            with col2:
-                view_mode = st.selectbox("👁️ View Mode", ["Social Cards", "Edit Mode"], key="calendar_view_mode")
-            with col3:
-                show_all_selected = st.checkbox("✅ Select All", key="select_all_calendar")
-                
-            if show_all_selected:
-                for i in range(len(st.session_state.generated_posts)):
-                    st.session_state.generated_posts[i]['selected'] = True
-            
-            # Display posts based on view mode
-            if view_mode == "Social Cards":
-                # Modern card view
-                for i, post in enumerate(st.session_state.generated_posts):
+            # Offer to regenerate only the posts that are missing or failed
+            calendar_request = st.session_state.get('calendar_request')
+            if calendar_request:
+                missing_slots = find_missing_slots(st.session_state.generated_posts, calendar_request['expected'])
+                if missing_slots:
                     col1, col2 = st.columns([3, 1])
-                    
                     with col1:
-                        # Display the social post card
-                        card_html = create_social_post_card(post, selected_brand_name, i)
-                        st.markdown(card_html, unsafe_allow_html=True)
-                        
-                        # Show graphic concept below the card
-                        if post.get('graphic'):
-                            st.markdown(f"""
-                            <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 15px; border-radius: 8px; margin-top: 10px; border: 2px solid #667eea; color: white;">
-                                <strong>🎨 Graphic Concept:</strong><br>
-                                <em>{post['graphic']}</em>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
+                        st.warning(f"⚠️ {len(missing_slots)} of {calendar_request['expected']} posts are missing or failed: "
+                                   f"{', '.join(f'#{n}' for n in missing_slots)}")
                     with col2:
-                        st.markdown("#### Post Controls")
-                        
-                        # Selection checkbox
-                        selected = st.checkbox(
-                            f"Include Post #{post['number']}", 
-                            value=post.get('selected', False), 
-                            key=f"card_select_{i}"
-                        )
-                        st.session_state.generated_posts[i]['selected'] = selected
-                        
-                        # Post stats
-                        st.markdown(f"""
-                        <div style="font-size: 12px; color: #666; margin-top: 15px;">
-                            📊 <strong>Post Stats:</strong><br>
-                            • {len(post.get('content', ''))} characters<br>
-                            • {len([w for w in post.get('content', '').split() if w.startswith('#')])} hashtags<br>
-                            • {len([w for w in post.get('content', '').split() if w.startswith('@')])} mentions
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    st.markdown("---")
-            
-            else:
-                # Traditional edit mode
-                for i, post in enumerate(st.session_state.generated_posts):
-                    with st.expander(f"📝 Post #{post['number']} - {post.get('date', 'No Date')}", expanded=True):
-                        col1, col2, col3, col4 = st.columns([0.1, 0.5, 0.25, 0.15])
-                        
-                        with col1:
-                            selected = st.checkbox("✅", value=post.get('selected', False), key=f"edit_select_{i}")
-                            st.session_state.generated_posts[i]['selected'] = selected
-                        
-                        with col2:
-                            post['content'] = st.text_area("Post Content", post['content'], height=150, key=f"edit_post_{i}")
-                            post['graphic'] = st.text_area("Graphic Concept", post['graphic'], height=80, key=f"edit_graphic_concept_{i}")
-                        
-                        with col3:
-                            st.markdown("**🤖 AI Refinement**")
-                            feedback = st.text_area("Refine as...", placeholder="more casual, professional", key=f"edit_feedback_trad_{i}", height=70)
-                            refine_post = st.checkbox("Refine Post", key=f"edit_refine_post_trad_{i}")
-                            refine_graphic = st.checkbox("Refine Graphic", key=f"edit_refine_graphic_trad_{i}")
-                        
-                        with col4:
-                            if feedback and (refine_post or refine_graphic):
-                                if st.button("🚀 Apply", key=f"edit_apply_{i}"):
-                                    with st.spinner("Refining..."):
-                                        refined_result = refine_content(
-                                            post, feedback, st.session_state.api_key, 
-                                            refine_post=refine_post, refine_graphic=refine_graphic
-                                        )
-                                        st.session_state.generated_posts[i] = refined_result
-                                        st.rerun()
-            
-            # Enhanced Export Section
-            st.markdown("---")
-            st.markdown("### 📤 Export Options")
-            
-            selected_posts_count = sum(1 for post in st.session_state.generated_posts if post.get('selected', False))
-            
-            if selected_posts_count > 0:
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.markdown(f"""
-                    <div class="metric-card">
-                        <h4>📊 Ready to Export</h4>
-                        <p style="font-size: 24px; margin: 0;">{selected_posts_count} posts</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    if st.button("💾 Save to Database", type="primary", use_container_width=True):
-                        selected_posts = [post for post in st.session_state.generated_posts if post.get('selected', False)]
-                        saved_count = 0
-                        
-                        for post in selected_posts:
-                            result = st.session_state.supabase_client.save_posts(
-                                brand_id=selected_brand_id,
-                                post=post['content'],
-                                user_id=st.session_state.get('user_id'),
-                                graphic_concept=post['graphic'],
-                                type="LinkedIn Calendar Posts",
-                                date=post['date']
+                        if st.button("🩹 Fill Missing Posts", key="fill_missing_calendar", use_container_width=True,
+                                     disabled=bool(st.session_state.get("calendar_job_id"))):
+                            submit_generation_job(
+                                "calendar", fill_posts,
+                                "calendar", st.session_state.generated_posts, calendar_request, st.session_state.api_key,
+                                label=f"🩹 Generating {len(missing_slots)} missing posts",
+                                request=calendar_request
                             )
-                            if result:
-                                saved_count += 1
-                        
-                        st.success(f"✅ Saved {saved_count} posts to database!")
-                
-                with col3:
-                    export_format = st.selectbox("📄 Export Format", ["Enhanced CSV", "Basic CSV", "JSON"])
-                
-                # Export buttons
-                selected_posts = [post for post in st.session_state.generated_posts if post.get('selected', False)]
-                
-                if export_format == "Enhanced CSV":
-                    enhanced_df = create_enhanced_export_data(selected_posts, selected_brand_name)
-                    csv_data = enhanced_df.to_csv(index=False)
-                    
-                    st.download_button(
-                        label="📊 Download Enhanced CSV Report",
-                        data=csv_data,
-                        file_name=f"{selected_brand_name}_social_calendar_enhanced_{datetime.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                
-                elif export_format == "Basic CSV":
-                    basic_data = []
-                    for post in selected_posts:
-                        basic_data.append({
-                            "Date": post.get('date', ''),
-                            "Content": post.get('content', ''),
-                            "Graphic Concept": post.get('graphic', '')
-                        })
-                    
-                    basic_df = pd.DataFrame(basic_data)
-                    csv_data = basic_df.to_csv(index=False)
-                    
-                    st.download_button(
-                        label="📄 Download Basic CSV",
-                        data=csv_data,
-                        file_name=f"{selected_brand_name}_posts_{datetime.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                
-                elif export_format == "JSON":
-                    json_data = json.dumps(selected_posts, indent=2, ensure_ascii=False)
-                    
-                    st.download_button(
-                        label="📋 Download JSON",
-                        data=json_data,
-                        file_name=f"{selected_brand_name}_posts_{datetime.now().strftime('%Y%m%d')}.json",
-                        mime="application/json",
-                        use_container_width=True
-                    )
-                
-                # Preview export data
-                if st.checkbox("👀 Preview Export Data"):
-                    if export_format == "Enhanced CSV":
-                        st.markdown("#### 📊 Enhanced Export Preview")
-                        st.dataframe(enhanced_df, use_container_width=True)
-                    else:
-                        st.markdown("#### 📄 Export Preview")
-                        st.dataframe(pd.DataFrame(basic_data), use_container_width=True)
+                            st.rerun()
+
+                duplicate_slots = [int(post['number']) for post in st.session_state.generated_posts if post.get('near_duplicate')]
+                if duplicate_slots:
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.info(f"♻️ {len(duplicate_slots)} posts closely repeat earlier posts: "
+                                f"{', '.join(f'#{n}' for n in duplicate_slots)}")
+                    with col2:
+                        if st.button("♻️ Regenerate Duplicates", key="regenerate_duplicates_calendar", use_container_width=True,
+                                     disabled=bool(st.session_state.get("calendar_job_id"))):
+                            submit_generation_job(
+                                "calendar", fill_posts,
+                                "calendar", st.session_state.generated_posts, calendar_request, st.session_state.api_key,
+                                slots=duplicate_slots,
+                                saved_posts=saved_post_texts(calendar_request['brand_data']),
+                                label=f"♻️ Regenerating {len(duplicate_slots)} posts",
+                                request=calendar_request
+                            )
+                            st.rerun()
             
-            else:
-                st.markdown("""
-                <div style="background: linear-gradient(135deg, #f39c12 0%, #e67e22 100%); border: 2px solid #f39c12; padding: 15px; border-radius: 8px; text-align: center; color: white;">
-                    <h4>📋 No Posts Selected</h4>
-                    <p>Select at least one post to enable export options.</p>
-                </div>
-                """, unsafe_allow_html=True)
+            render_post_list(
+                "calendar", selected_brand_name,
+                intro="Review and customize your posts. Use **Edit Mode** to modify content and apply AI refinements.",
+                item_label="Post",
+                export_title="Export Options",
+                export_args={
+                    "brand_id": selected_brand_id,
+                    "brand_name": selected_brand_name,
+                    "post_type": "LinkedIn Calendar Posts",
+                    "file_stem": f"{selected_brand_name}_posts",
+                    "enhanced_file_stem": f"{selected_brand_name}_social_calendar_enhanced",
+                    "use_post_dates": True
+                }
+            )
 
 with tab2:
     st.markdown("### 📄 Article to LinkedIn Posts")
@@ -1128,6 +1485,9 @@ with tab2:
     
     with col2:
         num_posts = st.number_input("Number of posts to generate", min_value=1, max_value=10, value=3)
+        article_regenerate_duplicates = st.checkbox("♻️ Regenerate near-duplicates", value=False,
+            help="Rewrite posts that closely repeat the brand's example or saved posts",
+            key="article_regenerate_duplicates")
     
     with col3:
         if not st.session_state.api_key:
@@ -1159,271 +1519,105 @@ with tab2:
             elif website_url:
                 content_source = "website URL"
             
-            with st.spinner(f"Generating posts from {content_source}..."):
-                # Use brand data if selected, otherwise use generic brand data
-                brand_data_to_use = selected_article_brand_data if selected_article_brand_data else {
-                    'name': 'Generic Brand',
-                    'brand_voice': 'Professional and engaging',
-                    'overall_voice': 'Informative and approachable',
-                    'brand_phrases': ''
+            # Use brand data if selected, otherwise use generic brand data
+            brand_data_to_use = selected_article_brand_data if selected_article_brand_data else {
+                'name': 'Generic Brand',
+                'brand_voice': 'Professional and engaging',
+                'overall_voice': 'Informative and approachable',
+                'brand_phrases': ''
+            }
+            
+            # Pass both article_text and website_url to the function
+            # The OpenAI function can handle the logic of which to use
+            submit_generation_job(
+                "article", article_to_posts,
+                article_text=article_text if article_text else None,
+                website_url=website_url if website_url else None, 
+                num_posts=num_posts, 
+                brand_data=brand_data_to_use, 
+                api_key=api_key,
+                saved_posts=saved_post_texts(selected_article_brand_data),
+                regenerate_duplicates=article_regenerate_duplicates,
+                label=f"Generating posts from {content_source}",
+                request={
+                    "brand_data": brand_data_to_use,
+                    "article_text": article_text if article_text else None,
+                    "website_url": website_url if website_url else None,
+                    "expected": num_posts
                 }
-                
-                # Pass both article_text and website_url to the function
-                # The OpenAI function can handle the logic of which to use
-                st.session_state.article_posts = article_to_posts(  
-                    article_text=article_text if article_text else None,
-                    website_url=website_url if website_url else None, 
-                    num_posts=num_posts, 
-                    brand_data=brand_data_to_use, 
-                    api_key=api_key
-                )
-                
-                if st.session_state.article_posts:
-                    st.success(f"Successfully generated {len(st.session_state.article_posts)} posts!")
-                else:
-                    st.error("Failed to generate posts. Please check your inputs and try again.")
+            )
+    
+    if st.session_state.get("article_job_id"):
+        render_generation_job("article")
+    posts, request = take_finished_job("article")
+    if posts is not None:
+        replace_posts("article", posts)
+        st.session_state.article_request = request
+        
+        if st.session_state.article_posts:
+            st.success(f"Successfully generated {len(st.session_state.article_posts)} posts!")
+        else:
+            st.error("Failed to generate posts. Please check your inputs and try again.")
     
     # Display article-based posts with enhanced styling
     if 'article_posts' in st.session_state and st.session_state.article_posts:
         st.markdown("---")
         st.markdown("### 📱 Generated LinkedIn Posts from Article")
         
-        # Display mode toggle
-        col1, col2, col3 = st.columns([2, 1, 1])
-        with col1:
-            st.markdown("Review and customize your article-based posts. Use **Edit Mode** to modify content and apply AI refinements.")
-        with col2:
-            view_mode = st.selectbox("👁️ View Mode", ["Social Cards", "Edit Mode"], key="article_view_mode")
-        with col3:
-            show_all_selected = st.checkbox("✅ Select All", key="select_all_article")
-            
-        if show_all_selected:
-            for i in range(len(st.session_state.article_posts)):
-                st.session_state.article_posts[i]['selected'] = True
-        
-        # Use the same enhanced display as the main tab
-        if view_mode == "Social Cards":
-            # Modern card view
-            for i, post in enumerate(st.session_state.article_posts):
+        # Offer to regenerate only the posts that are missing or failed
+        article_request = st.session_state.get('article_request')
+        if article_request:
+            missing_slots = find_missing_slots(st.session_state.article_posts, article_request['expected'])
+            if missing_slots:
                 col1, col2 = st.columns([3, 1])
-                
                 with col1:
-                    # Display the social post card
-                    brand_name = selected_article_brand_data['name'] if selected_article_brand_data else "Generic Brand"
-                    card_html = create_social_post_card(post, brand_name, i)
-                    st.markdown(card_html, unsafe_allow_html=True)
-                    
-                    # Show graphic concept below the card
-                    if post.get('graphic'):
-                        st.markdown(f"""
-                        <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 15px; border-radius: 8px; margin-top: 10px; border: 2px solid #667eea; color: white;">
-                            <strong>🎨 Graphic Concept:</strong><br>
-                            <em>{post['graphic']}</em>
-                        </div>
-                        """, unsafe_allow_html=True)
-                
+                    st.warning(f"⚠️ {len(missing_slots)} of {article_request['expected']} posts are missing or failed: "
+                               f"{', '.join(f'#{n}' for n in missing_slots)}")
                 with col2:
-                    st.markdown("#### Post Controls")
-                    
-                    # Selection checkbox
-                    selected = st.checkbox(
-                        f"Include Post #{post['number']}", 
-                        value=post.get('selected', False), 
-                        key=f"article_card_select_{i}"
-                    )
-                    st.session_state.article_posts[i]['selected'] = selected
-                    
-                    # Post stats
-                    st.markdown(f"""
-                    <div style="font-size: 12px; color: #cccccc; margin-top: 15px;">
-                        📊 <strong>Post Stats:</strong><br>
-                        • {len(post.get('content', ''))} characters<br>
-                        • {len([w for w in post.get('content', '').split() if w.startswith('#')])} hashtags<br>
-                        • {len([w for w in post.get('content', '').split() if w.startswith('@')])} mentions
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                st.markdown("---")
-        
-        else:
-            # Traditional edit mode
-            for i, post in enumerate(st.session_state.article_posts):
-                with st.expander(f"📝 Article Post #{post['number']}", expanded=True):
-                    col1, col2, col3, col4 = st.columns([0.1, 0.5, 0.25, 0.15])
-                    
-                    with col1:
-                        selected = st.checkbox("✅", value=post.get('selected', False), key=f"article_edit_select_{i}")
-                        st.session_state.article_posts[i]['selected'] = selected
-                    
-                    with col2:
-                        post['content'] = st.text_area("Post Content", post['content'], height=150, key=f"article_edit_post_{i}")
-                        post['graphic'] = st.text_area("Graphic Concept", post['graphic'], height=80, key=f"article_edit_graphic_concept_{i}")
-                    
-                    with col3:
-                        st.markdown("**🤖 AI Refinement**")
-                        feedback = st.text_area("Refine as...", placeholder="more casual, professional", key=f"article_edit_feedback_trad_{i}", height=70)
-                        refine_post = st.checkbox("Refine Post", key=f"article_edit_refine_post_trad_{i}")
-                        refine_graphic = st.checkbox("Refine Graphic", key=f"article_edit_refine_graphic_trad_{i}")
-                    
-                    with col4:
-                        if feedback and (refine_post or refine_graphic):
-                            if st.button("🚀 Apply", key=f"article_edit_apply_{i}"):
-                                with st.spinner("Refining..."):
-                                    refined_result = refine_content(
-                                        post, feedback, st.session_state.api_key, 
-                                        refine_post=refine_post, refine_graphic=refine_graphic
-                                    )
-                                    st.session_state.article_posts[i] = refined_result
-                                    st.rerun()
-            
-            with col3:
-                st.markdown("**Refinement Options**")
-                # Single feedback textbox
-                article_feedback = st.text_area("Refine as...", placeholder="e.g., more casual, professional, engaging", key=f"article_feedback_{i}", height=70)
-                
-                # Checkboxes for what to refine
-                article_refine_post = st.checkbox("Refine Post Text", key=f"article_refine_post_check_{i}")
-                article_refine_graphic = st.checkbox("Refine Graphic", key=f"article_refine_graphic_check_{i}")
-                
-                # Store the feedback and checkbox states in the post object
-                st.session_state.article_posts[i]['feedback'] = article_feedback
-                st.session_state.article_posts[i]['refine_post'] = article_refine_post
-                st.session_state.article_posts[i]['refine_graphic'] = article_refine_graphic
-            
-            with col4:
-                st.markdown("**Actions**")
-                st.write("") # Empty space for alignment
-                st.write("") # Empty space for alignment
-                
-                if article_feedback and (article_refine_post or article_refine_graphic):
-                    if st.button("Apply Refinement", key=f"article_refine_{i}"):
-                        with st.spinner("Refining content..."):
-                            refined_result = refine_content(
-                                post, article_feedback, st.session_state.api_key, 
-                                refine_post=article_refine_post, refine_graphic=article_refine_graphic
-                            )
-                            st.session_state.article_posts[i] = refined_result
-                            st.rerun()
-                else:
-                    if not article_feedback:
-                        st.info("Enter feedback to refine")
-                    elif not (article_refine_post or article_refine_graphic):
-                        st.info("Select what to refine")
-            
-            st.divider()
-        
-        # Enhanced Export Section for Article Posts
-        st.markdown("---")
-        st.markdown("### 📤 Export Article Posts")
-        
-        selected_posts_count = sum(1 for post in st.session_state.article_posts if post.get('selected', False))
-        
-        if selected_posts_count > 0:
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>📊 Ready to Export</h4>
-                    <p style="font-size: 24px; margin: 0;">{selected_posts_count} posts</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                if st.button("💾 Save to Database", type="primary", use_container_width=True, key="save_article_posts"):
-                    selected_posts = [post for post in st.session_state.article_posts if post.get('selected', False)]
-                    saved_count = 0
-                    
-                    for post in selected_posts:
-                        result = st.session_state.supabase_client.save_posts(
-                            brand_id=selected_article_brand_id,
-                            post=post['content'],
-                            user_id=st.session_state.get('user_id'),
-                            graphic_concept=post['graphic'],
-                            type="LinkedIn Article Posts",
-                            date=datetime.now().strftime('%Y-%m-%d')
+                    if st.button("🩹 Fill Missing Posts", key="fill_missing_article", use_container_width=True,
+                                 disabled=bool(st.session_state.get("article_job_id"))):
+                        submit_generation_job(
+                            "article", fill_posts,
+                            "article", st.session_state.article_posts, article_request, st.session_state.api_key,
+                            label=f"🩹 Generating {len(missing_slots)} missing posts",
+                            request=article_request
                         )
-                        if result:
-                            saved_count += 1
-                    
-                    st.success(f"✅ Saved {saved_count} article posts to database!")
-            
-            with col3:
-                export_format = st.selectbox("📄 Export Format", ["Enhanced CSV", "Basic CSV", "JSON"], key="article_export_format")
-            
-            # Export buttons
-            selected_posts = [post for post in st.session_state.article_posts if post.get('selected', False)]
-            
-            if export_format == "Enhanced CSV":
-                brand_name = selected_article_brand_data['name'] if selected_article_brand_data else "Generic Brand"
-                enhanced_df = create_enhanced_export_data(selected_posts, brand_name)
-                csv_data = enhanced_df.to_csv(index=False)
-                
-                st.download_button(
-                    label="📊 Download Enhanced CSV Report",
-                    data=csv_data,
-                    file_name=f"article_posts_enhanced_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True,
-                    key="download_article_enhanced"
-                )
-            
-            elif export_format == "Basic CSV":
-                basic_data = []
-                for post in selected_posts:
-                    basic_data.append({
-                        "Content": post.get('content', ''),
-                        "Graphic Concept": post.get('graphic', '')
-                    })
-                
-                basic_df = pd.DataFrame(basic_data)
-                csv_data = basic_df.to_csv(index=False)
-                
-                st.download_button(
-                    label="📄 Download Basic CSV",
-                    data=csv_data,
-                    file_name=f"article_posts_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True,
-                    key="download_article_basic"
-                )
-            
-            elif export_format == "JSON":
-                json_data = json.dumps(selected_posts, indent=2, ensure_ascii=False)
-                
-                st.download_button(
-                    label="📋 Download JSON",
-                    data=json_data,
-                    file_name=f"article_posts_{datetime.now().strftime('%Y%m%d')}.json",
-                    mime="application/json",
-                    use_container_width=True,
-                    key="download_article_json"
-                )
-            
-            # Preview export data
-            if st.checkbox("👀 Preview Export Data", key="preview_article_export"):
-                if export_format == "Enhanced CSV":
-                    st.markdown("#### 📊 Enhanced Export Preview")
-                    brand_name = selected_article_brand_data['name'] if selected_article_brand_data else "Generic Brand"
-                    enhanced_df = create_enhanced_export_data(selected_posts, brand_name)
-                    st.dataframe(enhanced_df, use_container_width=True)
-                else:
-                    st.markdown("#### 📄 Export Preview")
-                    basic_data = []
-                    for post in selected_posts:
-                        basic_data.append({
-                            "Content": post.get('content', ''),
-                            "Graphic Concept": post.get('graphic', '')
-                        })
-                    st.dataframe(pd.DataFrame(basic_data), use_container_width=True)
+                        st.rerun()
+
+            duplicate_slots = [int(post['number']) for post in st.session_state.article_posts if post.get('near_duplicate')]
+            if duplicate_slots:
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.info(f"♻️ {len(duplicate_slots)} posts closely repeat earlier posts: "
+                            f"{', '.join(f'#{n}' for n in duplicate_slots)}")
+                with col2:
+                    if st.button("♻️ Regenerate Duplicates", key="regenerate_duplicates_article", use_container_width=True,
+                                 disabled=bool(st.session_state.get("article_job_id"))):
+                        submit_generation_job(
+                            "article", fill_posts,
+                            "article", st.session_state.article_posts, article_request, st.session_state.api_key,
+                            slots=duplicate_slots,
+                            saved_posts=saved_post_texts(article_request['brand_data']),
+                            label=f"♻️ Regenerating {len(duplicate_slots)} posts",
+                            request=article_request
+                        )
+                        st.rerun()
         
-        else:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #f39c12 0%, #e67e22 100%); border: 2px solid #f39c12; padding: 15px; border-radius: 8px; text-align: center; color: white;">
-                <h4>📋 No Posts Selected</h4>
-                <p>Select at least one post to enable export options.</p>
-            </div>
-            """, unsafe_allow_html=True)
+        article_brand_name = selected_article_brand_data['name'] if selected_article_brand_data else "Generic Brand"
+        render_post_list(
+            "article", article_brand_name,
+            intro="Review and customize your article-based posts. Use **Edit Mode** to modify content and apply AI refinements.",
+            item_label="Article Post",
+            export_title="Export Article Posts",
+            export_args={
+                "brand_id": selected_article_brand_id,
+                "brand_name": article_brand_name,
+                "post_type": "LinkedIn Article Posts",
+                "file_stem": "article_posts",
+                "enhanced_file_stem": "article_posts_enhanced",
+                "use_post_dates": False
+            }
+        )
 
 with tab4:
     st.markdown("### 📚 Saved Posts Library")
@@ -1450,160 +1644,56 @@ with tab4:
         
         with col3:
             search_term = st.text_input("🔍 Search Posts", placeholder="Enter keywords...")
+            search_mode = st.radio("Search by", ["Keywords", "Meaning"], horizontal=True, key="saved_search_mode",
+                                   help="Meaning finds related posts even without the exact words, e.g. 'posts about hiring'")
         
         # Load posts button
         col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            page_size = st.selectbox("📄 Posts per page", [10, 25, 50], index=1, key="saved_posts_page_size")
         with col2:
             if st.button("📚 Load Saved Posts", type="primary", use_container_width=True):
                 if selected_prev_brand_id:
                     with st.spinner("🔄 Loading saved posts..."):
                         current_user_id = st.session_state.get('user_id')
-                        posts = st.session_state.supabase_client.get_posts_by_brand(selected_prev_brand_id, current_user_id)
-                        
-                        if posts:
-                            # Apply filters
-                            filtered_posts = posts
-                            
-                            if post_type_filter != "All Types":
-                                filtered_posts = [p for p in filtered_posts if p.get('type', '') == post_type_filter]
-                            
-                            if search_term:
-                                filtered_posts = [p for p in filtered_posts if search_term.lower() in p.get('post', '').lower()]
-                            
-                            st.session_state.loaded_posts = filtered_posts
-                            st.session_state.current_brand_name = selected_prev_brand_name
+                        type_filter = post_type_filter if post_type_filter != "All Types" else None
+                        if search_term and search_mode == "Meaning":
+                            use_session_embedder()
+                            posts = st.session_state.supabase_client.semantic_search(
+                                selected_prev_brand_id, search_term, k=20, user_id=current_user_id
+                            )
+                            if type_filter:
+                                posts = [p for p in posts if p.get('type', '') == type_filter]
+                            pager = paging.list_pages(posts, page_size)
                         else:
-                            st.session_state.loaded_posts = []
+                            # Filtered and paged by the database; only the pages on screen are fetched
+                            pager = paging.PageCache(
+                                partial(st.session_state.supabase_client.get_posts_page, selected_prev_brand_id,
+                                        current_user_id, page_size=page_size, post_type=type_filter,
+                                        search=search_term or None),
+                                page_size
+                            )
+                        pager.get(0)
+                        # What the export's "Current results" scope reads again, in larger chunks
+                        st.session_state.saved_posts_query = {
+                            "brand_id": selected_prev_brand_id, "user_id": current_user_id,
+                            "post_type": type_filter, "search": search_term or None
+                        }
+                        if search_term and search_mode == "Meaning":
+                            st.session_state.saved_posts_query["rows"] = posts
+                        st.session_state.saved_posts_pages = pager
+                        st.session_state.saved_posts_page = 0
+                        st.session_state.current_brand_name = selected_prev_brand_name
+                        st.session_state.pop("saved_posts_copy", None)
+                        drop_export_file("saved_posts_export")
                 else:
                     st.warning("⚠️ Please select a brand.")
         
-        # Display loaded posts
-        if 'loaded_posts' in st.session_state and st.session_state.loaded_posts:
-            posts = st.session_state.loaded_posts
+        # Display loaded posts, one page at a time
+        if 'saved_posts_pages' in st.session_state and st.session_state.saved_posts_pages.total:
+            pager = st.session_state.saved_posts_pages
             brand_name = st.session_state.current_brand_name
-            
-            # Posts summary
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>📊 Total Posts</h4>
-                    <p style="font-size: 24px; margin: 0;">{len(posts)}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                avg_length = sum(len(p.get('post', '')) for p in posts) // len(posts) if posts else 0
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>📝 Avg Length</h4>
-                    <p style="font-size: 24px; margin: 0;">{avg_length} chars</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                recent_posts = len([p for p in posts if 'Today' in p.get('date', '') or 'yesterday' in p.get('date', '').lower()])
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>🕒 Recent Posts</h4>
-                    <p style="font-size: 24px; margin: 0;">{recent_posts}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown("---")
-            st.markdown(f"### 📱 Posts for {brand_name}")
-            
-            # Display mode selection
-            display_mode = st.selectbox("👁️ Display Mode", ["Social Cards", "List View"], key="saved_posts_display")
-            
-            if display_mode == "Social Cards":
-                # Display as social media cards
-                for i, post in enumerate(posts):
-                    # Create a mock post object for the card function
-                    mock_post = {
-                        'content': post.get('post', ''),
-                        'date': post.get('date', 'Unknown Date'),
-                        'graphic': post.get('graphic_concept', '')
-                    }
-                    
-                    col1, col2 = st.columns([3, 1])
-                    
-                    with col1:
-                        # Display social post card
-                        card_html = create_social_post_card(mock_post, brand_name, i)
-                        st.markdown(card_html, unsafe_allow_html=True)
-                        
-                        # Show graphic concept if available
-                        if post.get('graphic_concept'):
-                            st.markdown(f"""
-                            <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 15px; border-radius: 8px; margin-top: 10px; border: 2px solid #667eea; color: white;">
-                                <strong>🎨 Graphic Concept:</strong><br>
-                                <em>{post['graphic_concept']}</em>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown("#### Post Info")
-                        st.markdown(f"**📅 Date:** {post.get('date', 'N/A')}")
-                        st.markdown(f"**📄 Type:** {post.get('type', 'N/A')}")
-                        st.markdown(f"**👤 User ID:** `{post.get('user_id', 'N/A')}`")
-                        
-                        # Character count and analysis
-                        content_length = len(post.get('post', ''))
-                        hashtag_count = len([word for word in post.get('post', '').split() if word.startswith('#')])
-                        mention_count = len([word for word in post.get('post', '').split() if word.startswith('@')])
-                        
-                        st.markdown(f"""
-                        <div style="font-size: 12px; color: #cccccc; margin-top: 15px; background: linear-gradient(135deg, #667eea15 0%, #764ba215 100%); padding: 10px; border-radius: 6px; border: 1px solid #667eea;">
-                            📊 <strong style="color: #ffffff;">Analysis:</strong><br>
-                            • {content_length} characters<br>
-                            • {hashtag_count} hashtags<br>
-                            • {mention_count} mentions
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Quick actions
-                        if st.button("📋 Copy Content", key=f"copy_{i}"):
-                            st.code(post.get('post', ''), language=None)
-                    
-                    st.markdown("---")
-            
-            else:
-                # Traditional list view
-                for i, post in enumerate(posts):
-                    with st.expander(f"📅 {post.get('date', 'No Date')} | {post.get('type', 'No Type')}", expanded=False):
-                        col1, col2 = st.columns([2, 1])
-                        
-                        with col1:
-                            st.markdown("**📝 Post Content:**")
-                            # Use a styled container instead of code block for better visibility
-                            st.markdown(f"""
-                            <div style="background: linear-gradient(135deg, #2d2d2d 0%, #3d3d3d 100%); padding: 15px; border-radius: 8px; border: 2px solid #667eea; color: white; font-family: monospace; white-space: pre-wrap; margin: 10px 0;">
-{post.get('post', '')}
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            if post.get('graphic_concept'):
-                                st.markdown("**🎨 Graphic Concept:**")
-                                st.markdown(f"""
-                                <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 10px; border-radius: 6px; border: 1px solid #667eea; color: #cccccc; font-style: italic; margin: 10px 0;">
-                                    {post.get('graphic_concept', '')}
-                                </div>
-                                """, unsafe_allow_html=True)
-                        
-                        with col2:
-                            st.markdown("**📊 Post Details:**")
-                            st.markdown(f"**Type:** {post.get('type', 'N/A')}")
-                            st.markdown(f"**Date:** {post.get('date', 'N/A')}")
-                            st.markdown(f"**User ID:** `{post.get('user_id', 'N/A')}`")
-                            
-                            # Performance metrics (placeholder)
-                            st.markdown(f"""
-                            **📈 Estimated Performance:**
-                            - Characters: {len(post.get('post', ''))}
-                            - Hashtags: {len([w for w in post.get('post', '').split() if w.startswith('#')])}
-                            - Mentions: {len([w for w in post.get('post', '').split() if w.startswith('@')])}
-                            """)
+            render_saved_posts(brand_name)
             
             # Bulk export options
             st.markdown("---")
@@ -1612,47 +1702,58 @@ with tab4:
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                # Export all as CSV
-                export_data = []
-                for post in posts:
-                    export_data.append({
-                        "Date": post.get('date', ''),
-                        "Type": post.get('type', ''),
-                        "Content": post.get('post', ''),
-                        "Graphic Concept": post.get('graphic_concept', ''),
-                        "Character Count": len(post.get('post', '')),
-                        "Hashtag Count": len([w for w in post.get('post', '').split() if w.startswith('#')]),
-                        "Mention Count": len([w for w in post.get('post', '').split() if w.startswith('@')])
-                    })
-                
-                df = pd.DataFrame(export_data)
-                csv_data = df.to_csv(index=False)
-                
-                st.download_button(
-                    "📊 Download as CSV",
-                    data=csv_data,
-                    file_name=f"{brand_name}_saved_posts_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            
+                scopes = {"current": f"Current results ({pager.total} posts)",
+                          "brand": f"All posts of {brand_name}"}
+                if st.session_state.get('user_id'):
+                    scopes["user"] = "All my brands"
+                export_scope = st.selectbox("📦 Export", options=list(scopes), format_func=scopes.get,
+                                            key="saved_posts_export_scope")
             with col2:
-                # Export as JSON
-                json_data = json.dumps(posts, indent=2, ensure_ascii=False, default=str)
+                export_format = st.selectbox("📄 Format", options=export.available_formats(),
+                                             format_func=lambda fmt: export.FORMATS[fmt]["label"],
+                                             key="saved_posts_export_format",
+                                             help="Excel needs openpyxl and Parquet needs pyarrow installed")
+            
+            # Posts are streamed from the database in chunks, so the whole library is never held in memory
+            export_key = (export_scope, export_format, json.dumps(
+                {k: v for k, v in st.session_state.saved_posts_query.items() if k != "rows"}, sort_keys=True))
+            if st.button("📦 Prepare Export", use_container_width=True):
+                with st.spinner("📦 Exporting posts..."):
+                    query = st.session_state.saved_posts_query
+                    client = st.session_state.supabase_client
+                    if export_scope == "brand":
+                        chunks = export.query_chunks(client, query["brand_id"], query["user_id"])
+                    elif export_scope == "user":
+                        chunks = export.query_chunks(client, None, query["user_id"])
+                    elif "rows" in query:
+                        chunks = export.list_chunks(query["rows"])
+                    else:
+                        chunks = export.query_chunks(client, **query)
+                    brand_names = {brand['id']: brand['name'] for brand in st.session_state.brands}
+                    path, stats = export.export_file(chunks, export_format, brand_names)
+                    keep_export_file("saved_posts_export", {"key": export_key, "path": path, "stats": stats})
+            
+            data = prepared_export_data("saved_posts_export", export_key)
+            if data is not None:
+                spec = export.FORMATS[export_format]
+                stats = st.session_state.saved_posts_export["stats"]
+                stem = brand_name if export_scope != "user" else "all_brands"
                 st.download_button(
-                    "📋 Download as JSON",
-                    data=json_data,
-                    file_name=f"{brand_name}_saved_posts_{datetime.now().strftime('%Y%m%d')}.json",
-                    mime="application/json",
+                    f"⬇️ Download {stats['rows']} Posts as {spec['label']}",
+                    data=data,
+                    file_name=f"{stem}_saved_posts_{datetime.now().strftime('%Y%m%d')}.{spec['extension']}",
+                    mime=spec["mime"],
                     use_container_width=True
                 )
+                st.caption(f"{stats['rows']} posts in {stats['chunks']} chunks, {stats['seconds']:.1f}s "
+                           f"({stats['rows_per_s']:.0f} posts/s), {stats['bytes'] / 1e6:.1f} MB")
             
             with col3:
                 # Analytics summary
                 if st.button("📊 Generate Report", use_container_width=True):
                     st.info("📈 Analytics report feature coming soon!")
         
-        elif 'loaded_posts' in st.session_state and not st.session_state.loaded_posts:
+        elif 'saved_posts_pages' in st.session_state:
             st.markdown("""
             <div style="text-align: center; padding: 40px; background: linear-gradient(135deg, #f39c12 0%, #e67e22 100%); border-radius: 12px; border: 2px solid #f39c12; color: white;">
                 <h3>📭 No Posts Found</h3>
@@ -0,0 +1,132 @@
+"""
+Headless entry point for generating posts for many brands at once.
+
+Examples:
+    python batch_generate.py --user jane --all-brands --focus "Brand Awareness"
+    python batch_generate.py --user jane --brand <id> --brand <id> --mode article \
+        --url https://example.com/article --num-posts 3 --output-dir out/
+
+Offline benchmark against mock_openai_server.py, with brands from a JSON file
+(a list of brand dictionaries) instead of the database:
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 python batch_generate.py --api-key mock \
+        --brands-file brands.json --output-dir out/ --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from utils.article_fetch import BlockedURLError, check_url
+from utils.batch import run_brands, format_report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate LinkedIn calendars or article posts for multiple brands.")
+    parser.add_argument("--user", help="Username or email of the user who owns the brands")
+    brand_group = parser.add_mutually_exclusive_group(required=True)
+    brand_group.add_argument("--brand", action="append", dest="brand_ids", metavar="BRAND_ID",
+                             help="Brand ID to generate for (repeat for several brands)")
+    brand_group.add_argument("--all-brands", action="store_true", help="Generate for every brand the user owns")
+    brand_group.add_argument("--brands-file", help="JSON file with a list of brands; skips the database "
+                                                   "and requires --output-dir")
+
+    parser.add_argument("--mode", choices=["calendar", "article"], default="calendar")
+    parser.add_argument("--focus", default="Keep Profile Active", help="Primary focus for calendar posts")
+    parser.add_argument("--posts-per-month", type=int, default=8)
+    parser.add_argument("--special-events", default="")
+    parser.add_argument("--article-file", help="Path to a text file with the article to turn into posts")
+    parser.add_argument("--url", help="Article URL to turn into posts")
+    parser.add_argument("--num-posts", type=int, default=3, help="Posts per brand in article mode")
+
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to $OPENAI_API_KEY)")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum brands generated concurrently")
+    parser.add_argument("--output-dir", help="Write JSON files here instead of saving to the database")
+    args = parser.parse_args(argv)
+    if args.brands_file and not args.output_dir:
+        parser.error("--brands-file requires --output-dir")
+    if not args.brands_file and not args.user:
+        parser.error("--user is required unless --brands-file is given")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if not args.api_key:
+        print("An OpenAI API key is required (--api-key or $OPENAI_API_KEY)", file=sys.stderr)
+        return 2
+
+    article_text = None
+    if args.mode == "article":
+        if not args.article_file and not args.url:
+            print("Article mode needs --article-file and/or --url", file=sys.stderr)
+            return 2
+        if args.url:
+            try:
+                check_url(args.url)
+            except BlockedURLError as e:
+                print(f"Cannot fetch --url: {str(e)}", file=sys.stderr)
+                return 2
+        if args.article_file:
+            with open(args.article_file, encoding="utf-8") as f:
+                article_text = f.read()
+
+    if args.brands_file:
+        with open(args.brands_file, encoding="utf-8") as f:
+            brands = json.load(f)
+        supabase_client, user = None, {"id": None}
+    else:
+        # Imported here so --brands-file runs without the supabase package
+        from utils.supabase_conn import SupaBase
+
+        supabase_client = SupaBase()
+        user = supabase_client.get_user_by_username_or_email(args.user)
+        if not user:
+            print(f"User not found: {args.user}", file=sys.stderr)
+            return 2
+        brands = supabase_client.get_brands(user["id"])
+
+    if args.brand_ids:
+        wanted = set(args.brand_ids)
+        missing = wanted - {brand["id"] for brand in brands}
+        if missing:
+            print(f"Brands not found for {args.user}: {', '.join(sorted(missing))}", file=sys.stderr)
+            return 2
+        brands = [brand for brand in brands if brand["id"] in wanted]
+
+    if not brands:
+        print(f"No brands to generate for {args.user or args.brands_file}", file=sys.stderr)
+        return 1
+
+    options = {
+        "focus": args.focus,
+        "posts_per_month": args.posts_per_month,
+        "special_events": args.special_events,
+        "article_text": article_text,
+        "website_url": args.url,
+        "num_posts": args.num_posts
+    }
+
+    def report_progress(result):
+        status = "ok" if not result["error"] else f"failed ({result['error']})"
+        print(f"[{result['brand']}] {result['posts']} posts in {result['seconds']:.1f}s - {status}", flush=True)
+
+    print(f"Generating {args.mode} posts for {len(brands)} brands with {args.workers} workers...", flush=True)
+    start = time.perf_counter()
+    results = run_brands(
+        brands, args.mode, args.api_key, options, user["id"],
+        supabase_client=supabase_client,
+        output_dir=args.output_dir,
+        max_workers=args.workers,
+        on_result=report_progress
+    )
+    print()
+    print(format_report(results, time.perf_counter() - start))
+
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Enhanced export benchmark: utils/export.enhanced_export_data against two
+per-post loops.
+
+- "original" is app_dev.create_enhanced_export_data as it was before
+  utils/export.py and utils/post_metrics.py: split() comprehensions and no
+  Links or Reading Time columns.
+- "loop" builds the same table as enhanced_export_data, post by post with
+  post_metrics.metrics_for; it is checked to produce the same table.
+
+For each size it times them on synthetic posts, once with no stored
+metrics (drafts and older rows, where every post is measured) and once
+with metrics stored on the posts, plus a repeat call that is served from
+the table cache. Time per 1000 rows staying flat as the size grows shows
+linear scaling.
+
+What it shows: building the table column by column is no faster than
+"loop" once hashing the posts for the cache key is counted. Without stored
+metrics it is about 2.3 times slower than "original", because it measures
+links and reading time with regular expressions; with stored metrics it
+is about 3 times faster. Almost all of the speedup on reruns comes from
+the table cache, whose hits cost the digest of the posts.
+
+Examples:
+    python benchmarks/enhanced_export.py
+    python benchmarks/enhanced_export.py --rows 1000,10000,50000 --runs 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from utils import export, post_metrics  # noqa: E402
+
+WORDS = ("growth team launch customers strategy insight hiring product partners results "
+         "learn build share community data future #leadership #innovation @partner https://example.com/report").split()
+
+
+def make_posts(count, seed=0):
+    rng = random.Random(seed)
+    return [{
+        "number": i + 1,
+        "date": f"Monday, July {i % 28 + 1}",
+        "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))),
+        "graphic": "Photo of the team",
+        "selected": True
+    } for i in range(count)]
+
+
+def original_export_data(posts, brand_name):
+    """app_dev.create_enhanced_export_data as it was before utils/export.py and utils/post_metrics.py, verbatim."""
+    export_data = []
+    
+    for i, post in enumerate(posts):
+        export_data.append({
+            "Post Number": f"#{post.get('number', i+1)}",
+            "Date": post.get('date', ''),
+            "Brand": brand_name,
+            "Content": post.get('content', ''),
+            "Graphic Concept": post.get('graphic', ''),
+            "Character Count": len(post.get('content', '')),
+            "Hashtags": len([word for word in post.get('content', '').split() if word.startswith('#')]),
+            "Mentions": len([word for word in post.get('content', '').split() if word.startswith('@')]),
+            "Estimated Reach": f"{(i+1) * 1200 + 500}-{(i+1) * 1500 + 800}",
+            "Best Time to Post": "9:00 AM - 11:00 AM" if i % 2 == 0 else "1:00 PM - 3:00 PM"
+        })
+    
+    return pd.DataFrame(export_data)
+
+
+def loop_export_data(posts, brand_name):
+    """The table enhanced_export_data builds, one post at a time."""
+    export_data = []
+    for i, post in enumerate(posts):
+        metrics = post_metrics.metrics_for(post)
+        export_data.append({
+            "Post Number": f"#{post.get('number', i+1)}",
+            "Date": post.get('date', ''),
+            "Brand": brand_name,
+            "Content": post.get('content', ''),
+            "Graphic Concept": post.get('graphic', ''),
+            "Character Count": metrics['char_count'],
+            "Hashtags": metrics['hashtag_count'],
+            "Mentions": metrics['mention_count'],
+            "Links": metrics['url_count'],
+            "Reading Time (s)": metrics['reading_time_s'],
+            "Estimated Reach": f"{(i+1) * 1200 + 500}-{(i+1) * 1500 + 800}",
+            "Best Time to Post": "9:00 AM - 11:00 AM" if i % 2 == 0 else "1:00 PM - 3:00 PM"
+        })
+    return pd.DataFrame(export_data)
+
+
+def uncached_export_data(posts, brand_name):
+    export._tables.clear()
+    export._tables_bytes = 0
+    return export.enhanced_export_data(posts, brand_name)
+
+
+def measure(build, posts, runs):
+    """Median milliseconds of build(posts)."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        build(posts, "Acme Corp")
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def same_table(posts):
+    expected = loop_export_data(posts, "Acme Corp")
+    actual = uncached_export_data(posts, "Acme Corp")
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        return True
+    except AssertionError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the columnar enhanced export with per-post loops.")
+    parser.add_argument("--rows", default="1000,5000,10000,50000", help="Comma-separated numbers of posts")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per measurement (median is shown)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.rows.split(",")]
+    print(f"same table as the loop: {'yes' if same_table(make_posts(500)) else 'NO'}")
+    print(f"\n  {'rows':>7}  {'metrics':<8}{'original ms':>13}{'loop ms':>10}{'columnar ms':>13}{'cached ms':>11}"
+          f"{'original ms/1k':>16}{'columnar ms/1k':>16}")
+    for size in sizes:
+        fresh = make_posts(size)
+        stored = post_metrics.attach_all(make_posts(size))
+        for label, posts in (("none", fresh), ("stored", stored)):
+            original_ms = measure(original_export_data, posts, args.runs)
+            loop_ms = measure(loop_export_data, posts, args.runs)
+            columnar_ms = measure(uncached_export_data, posts, args.runs)
+            export.enhanced_export_data(posts, "Acme Corp")
+            cached_ms = measure(export.enhanced_export_data, posts, args.runs)
+            print(f"  {size:>7}  {label:<8}{original_ms:>13.1f}{loop_ms:>10.1f}{columnar_ms:>13.1f}{cached_ms:>11.2f}"
+                  f"{original_ms * 1000 / size:>16.1f}{columnar_ms * 1000 / size:>16.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark: how long the app's imports take, with and without
+lazy imports (see utils/lazy.py).
+
+Every measurement runs in a fresh interpreter, so nothing is already in
+sys.modules. Three things are measured:
+    modules     each heavy dependency on its own
+    app import  the modules app_dev.py imports at the top
+    login page  a full run of app_dev.py for a signed-out user (Streamlit AppTest),
+                with a placeholder Supabase URL; needs the supabase package
+
+Both "app import" and "login page" run once with LAZY_IMPORTS=0 (everything
+imported eagerly, as before) and once lazily, and list the heavy modules
+each run ended up loading.
+
+Examples:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 7 --skip-login
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "openai", "httpx", "numpy", "PIL.Image"]
+
+APP_IMPORTS = """
+from utils.supabase_conn import SupaBase
+from utils.openai import generate_social_posts, article_to_posts, refine_content
+from utils.auth_ui import check_authentication
+from utils import telemetry, embeddings, jobs, drafts, cards, paging, post_metrics, export, lazy
+pd = lazy.load("pandas")
+post_image = lazy.load("utils.post_image")
+"""
+
+LOGIN_PAGE = """
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.secrets["DATABASE_URL"] = "http://127.0.0.1:9"
+at.secrets["SUPABASE_SECRET"] = "bench.bench.bench"
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+errors = [str(e.value) for e in at.exception]
+"""
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+errors = []
+{body}
+elapsed = locals().get("elapsed", time.perf_counter() - start)
+print(json.dumps({{"seconds": elapsed, "errors": errors,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_child(body, lazy=True):
+    """Run `body` in a fresh interpreter; returns seconds, errors and loaded heavy modules."""
+    env = dict(os.environ, LAZY_IMPORTS="1" if lazy else "0", PYTHONPATH=os.pathsep.join(
+        path for path in (ROOT, os.environ.get("PYTHONPATH")) if path))
+    code = CHILD.format(body=body, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"seconds": None, "errors": [completed.stderr.strip().splitlines()[-1:] or "failed"], "loaded": []}
+    return json.loads(lines[-1])
+
+
+def measure(body, runs, lazy=True):
+    results = [run_child(body, lazy) for _ in range(runs)]
+    times = [result["seconds"] for result in results if result["seconds"] is not None]
+    return {
+        "median_s": statistics.median(times) if times else None,
+        "loaded": results[-1]["loaded"],
+        "errors": results[-1]["errors"]
+    }
+
+
+def format_row(label, result):
+    seconds = "failed" if result["median_s"] is None else f"{result['median_s'] * 1000:8.0f} ms"
+    row = f"  {label:<28}{seconds:>12}   loads: {', '.join(result['loaded']) or '-'}"
+    if result["errors"]:
+        row += f"\n  {'':<28}errors: {result['errors'][0]}"
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import times with and without lazy imports.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement (median is shown)")
+    parser.add_argument("--skip-login", action="store_true", help="Skip the AppTest run of the login page")
+    args = parser.parse_args(argv)
+
+    print(f"Cold-start import times, median of {args.runs} fresh interpreters\n")
+    print("Heavy modules:")
+    for module in HEAVY_MODULES:
+        print(format_row(module, measure(f"import {module}", args.runs)))
+
+    sections = [("App import", APP_IMPORTS)]
+    if not args.skip_login:
+        sections.append(("Login page", LOGIN_PAGE.format(app=os.path.join(ROOT, "app_dev.py"))))
+    for title, body in sections:
+        eager = measure(body, args.runs, lazy=False)
+        lazy = measure(body, args.runs, lazy=True)
+        print(f"\n{title}:")
+        print(format_row("eager (LAZY_IMPORTS=0)", eager))
+        print(format_row("lazy", lazy))
+        if eager["median_s"] and lazy["median_s"]:
+            saved = eager["median_s"] - lazy["median_s"]
+            print(f"  {'saved':<28}{saved * 1000:8.0f} ms ({saved / eager['median_s']:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
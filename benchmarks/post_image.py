@@ -0,0 +1,125 @@
+"""
+Post image benchmark: the Pillow renderer (utils/post_image.py) against
+the matplotlib figure that app_dev.generate_post_image used to draw.
+
+For each renderer it reports the time per image and the peak Python-level
+memory allocated while rendering (tracemalloc; pixel buffers allocated in
+C by Pillow or Agg are not included), over a set of synthetic posts of
+varying length. The Pillow renderer is measured uncached (every post
+rendered) and cached (the same posts again). matplotlib is no longer a
+dependency of the app; the comparison is skipped when it isn't installed.
+
+Examples:
+    python benchmarks/post_image.py
+    python benchmarks/post_image.py --posts 40 --scale 2
+"""
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import post_image  # noqa: E402
+
+WORDS = ("growth team launch customers strategy insight hiring product partners results "
+         "learn build share community data future #leadership #innovation @partner https://example.com/report").split()
+
+
+def make_posts(count, seed=0):
+    rng = random.Random(seed)
+    posts = []
+    for i in range(count):
+        paragraphs = ["Post {}: {}".format(i + 1, " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))))]
+        paragraphs += [" ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))) for _ in range(rng.randint(0, 3))]
+        posts.append(("\n\n".join(paragraphs), "Acme Corp", f"Monday, July {i % 28 + 1}"))
+    return posts
+
+
+def render_matplotlib(post_content, brand_name, post_date, dpi=150):
+    """The matplotlib renderer app_dev.py used before utils/post_image.py, as the baseline."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.patches as patches
+    import matplotlib.pyplot as plt
+
+    plt.style.use('default')
+    fig, ax = plt.subplots(figsize=(8, 10))
+    ax.set_xlim(0, 10)
+    ax.set_ylim(0, 12)
+    ax.axis('off')
+    ax.add_patch(patches.Rectangle((0.5, 0.5), 9, 11, linewidth=1, edgecolor='#e1e8ed', facecolor='white'))
+    ax.add_patch(patches.Rectangle((0.5, 9.5), 9, 2, linewidth=0, facecolor='#f8f9fa'))
+    ax.add_patch(patches.Circle((1.5, 10.5), 0.3, facecolor='#667eea', edgecolor='white'))
+    brand_initials = ''.join([word[0].upper() for word in brand_name.split()[:2]])
+    ax.text(1.5, 10.5, brand_initials, ha='center', va='center', fontsize=12, fontweight='bold', color='white')
+    ax.text(2.2, 10.7, brand_name, ha='left', va='center', fontsize=14, fontweight='bold')
+    ax.text(2.2, 10.3, f"{post_date} • LinkedIn", ha='left', va='center', fontsize=10, color='#666666')
+    content_preview = post_content[:200] + "..." if len(post_content) > 200 else post_content
+    ax.text(1, 8.5, textwrap.fill(content_preview, width=60), ha='left', va='top', fontsize=11)
+    ax.text(1, 1.5, "Like    Comment    Repost    Send", ha='left', va='center', fontsize=10, color='#666666')
+    buffer = BytesIO()
+    plt.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor='white', edgecolor='none')
+    plt.close(fig)
+    buffer.seek(0)
+    return base64.b64encode(buffer.read()).decode()
+
+
+def measure(render, posts):
+    """Milliseconds per image (median) and peak traced Python memory in MB."""
+    render(*posts[0])  # warm-up: imports, fonts, templates
+    times = []
+    tracemalloc.start()
+    for post in posts:
+        start = time.perf_counter()
+        render(*post)
+        times.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Pillow post image renderer with matplotlib.")
+    parser.add_argument("--posts", type=int, default=20, help="Number of synthetic posts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Pillow scale (1.0 = 1080x1350, 2.0 = print)")
+    parser.add_argument("--dpi", type=int, default=150, help="matplotlib dpi (150 for display, 300 for print)")
+    args = parser.parse_args(argv)
+
+    posts = make_posts(args.posts)
+    results = []
+    try:
+        import matplotlib  # noqa: F401
+        results.append((f"matplotlib ({args.dpi} dpi)",
+                        measure(lambda *post: render_matplotlib(*post, dpi=args.dpi), posts)))
+    except ImportError:
+        print("matplotlib is not installed; skipping the baseline")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["POST_IMAGE_CACHE_DIR"] = cache_dir
+        results.append((f"pillow (scale {args.scale:g})",
+                        measure(lambda *post: post_image.render_png(*post, scale=args.scale), posts)))
+        # Fill the cache, then measure the same posts again
+        for post in posts:
+            post_image.post_image(*post, scale=args.scale)
+        results.append(("pillow, cached",
+                        measure(lambda *post: post_image.post_image(*post, scale=args.scale), posts)))
+
+    print(f"\n{args.posts} posts")
+    print(f"  {'renderer':<26}{'ms/image':>10}{'py MB':>10}")
+    for label, (ms, peak_mb) in results:
+        print(f"  {label:<26}{ms:>10.2f}{peak_mb:>10.1f}")
+    if len(results) == 3:
+        print(f"\n  pillow is {results[0][1][0] / results[1][1][0]:.1f}x faster than matplotlib before caching")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
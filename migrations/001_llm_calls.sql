@@ -0,0 +1,20 @@
+-- Telemetry for OpenAI calls, written when LLM_TELEMETRY_SINK=supabase
+create table if not exists llm_calls (
+    id bigint generated always as identity primary key,
+    timestamp timestamptz not null default now(),
+    operation text,
+    model text,
+    prompt_version text,
+    status text,
+    error text,
+    latency_s double precision,
+    ttft_s double precision,
+    prompt_tokens integer,
+    completion_tokens integer,
+    cached_tokens integer,
+    retries integer,
+    requested_posts integer,
+    parsed_posts integer
+);
+
+create index if not exists llm_calls_timestamp_idx on llm_calls (timestamp desc);
@@ -0,0 +1,3 @@
+-- Model routing details for OpenAI call telemetry
+alter table llm_calls add column if not exists route text;
+alter table llm_calls add column if not exists attempted_models text;
@@ -0,0 +1,3 @@
+-- Hedged request counters for OpenAI call telemetry
+alter table llm_calls add column if not exists hedged integer;
+alter table llm_calls add column if not exists hedge_won integer;
@@ -0,0 +1,12 @@
+-- Generated posts kept as drafts, written when DRAFTS_STORE=supabase
+create table if not exists drafts (
+    id text primary key,
+    user_id text not null,
+    kind text not null,
+    posts jsonb not null default '[]'::jsonb,
+    request jsonb not null default '{}'::jsonb,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists drafts_user_kind_idx on drafts (user_id, kind, updated_at desc);
@@ -0,0 +1,9 @@
+-- Text metrics stored with each saved post (see utils/post_metrics.py)
+alter table posts add column if not exists char_count integer;
+alter table posts add column if not exists word_count integer;
+alter table posts add column if not exists hashtag_count integer;
+alter table posts add column if not exists mention_count integer;
+alter table posts add column if not exists url_count integer;
+alter table posts add column if not exists reading_time_s integer;
+
+-- Rows saved before this migration keep null counts and are measured by the app when shown
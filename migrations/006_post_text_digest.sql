@@ -0,0 +1,4 @@
+-- Digest of the text a saved post's metrics were computed from (see utils/post_metrics.py)
+alter table posts add column if not exists text_digest text;
+
+-- Rows saved before this migration have no digest; the app measures them when shown
@@ -0,0 +1,543 @@
+"""
+Local OpenAI-compatible stand-in for load and regression testing.
+
+Serves /v1/chat/completions, /v1/responses (streaming and not) and
+/v1/embeddings without a real key or spend. Answers are built from
+templates that follow the post format the prompts ask for, or replayed
+from a JSONL file of recorded responses. The server can also:
+- return malformed answers;
+- add latency drawn from a configurable distribution;
+- inject 429s with Retry-After, or enforce a requests-per-minute limit;
+- report token usage, including simulated prompt caching.
+
+Point the app or the batch CLI at it with OPENAI_BASE_URL:
+
+    python mock_openai_server.py --port 8787 --ttft lognormal:0.4,0.5 --rate-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=mock \
+        python batch_generate.py --brands-file brands.json --output-dir out/ --workers 8
+
+GET /v1/_stats returns the token and error counters. With --fixtures DIR,
+files in DIR are served under /fixtures/ with ETag and Last-Modified
+headers, for exercising utils/article_fetch.py.
+"""
+import argparse
+import calendar
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_CHARS = 24
+MIN_CACHEABLE_TOKENS = 1024
+CACHE_INCREMENT = 128
+MALFORMED_MODES = ("truncated", "unnumbered", "missing_graphic", "empty", "prose")
+
+_SENTENCES = [
+    "{name} is all about {focus_lower}, and this month we're doubling down.",
+    "Here's what {focus_lower} looks like at {name} behind the scenes.",
+    "Our team keeps asking one question: how do we make {focus_lower} feel personal?",
+    "Three lessons we learned about {focus_lower} this year.",
+    "Small wins add up. This week's highlight: {focus_lower}.",
+    "Thank you to everyone who helped make {focus_lower} a success.",
+    "What does {focus_lower} mean to you? Tell us in the comments.",
+    "We believe great experiences start with people, and {focus_lower} proves it.",
+]
+_HASHTAGS = ["#Leadership", "#Growth", "#Community", "#Franchise", "#SmallBusiness", "#Teamwork", "#Marketing"]
+_GRAPHICS = [
+    "Bold text-based graphic with the key quote on a brand-colored background",
+    "Simple photo of the team with a short headline overlay",
+    "Clean infographic with three numbered tips",
+    "Minimal graphic with the brand logo and a single statistic",
+]
+
+
+def parse_distribution(spec):
+    """
+    Parse a latency distribution such as "fixed:0.2", "uniform:0.1,0.5",
+    "normal:0.5,0.1" or "lognormal:0.4,0.5" (median, sigma) into a sampler.
+    """
+    kind, _, params = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in params.split(",") if v] or [0.0]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(max(values[0], 1e-6)), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def count_tokens(text):
+    """Rough token count, about four characters per token like the client's estimate."""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+class Stats:
+    """Counters per model, returned by /v1/_stats and printed on exit."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._seen_prefixes = set()
+
+    def cached_tokens(self, model, prefix):
+        """Simulate automatic prompt caching: repeated prefixes of 1024+ tokens hit in 128-token steps."""
+        tokens = count_tokens(prefix)
+        if tokens < MIN_CACHEABLE_TOKENS:
+            return 0
+        key = (model, hashlib.sha1(prefix.encode("utf-8")).hexdigest())
+        with self._lock:
+            if key not in self._seen_prefixes:
+                self._seen_prefixes.add(key)
+                return 0
+        return tokens // CACHE_INCREMENT * CACHE_INCREMENT
+
+    def add(self, model, **counts):
+        with self._lock:
+            row = self._models.setdefault(model, {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                "rate_limited": 0, "server_errors": 0, "malformed": 0
+            })
+            for field, value in counts.items():
+                row[field] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {model: dict(row) for model, row in self._models.items()}
+
+
+class MockOpenAI:
+    """Builds answers and decides on latency, errors and malformed output."""
+
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats()
+        self.ttft = parse_distribution(args.ttft)
+        self.chunk_delay = parse_distribution(args.chunk_delay)
+        self.replay = self._load_replay(args.replay)
+        self.rng = random.Random(args.seed)
+        self._rng_lock = threading.Lock()
+        self._requests = {}
+        self._requests_lock = threading.Lock()
+
+    @staticmethod
+    def _load_replay(path):
+        if not path:
+            return []
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.append((re.compile(entry.get("match", ".*"), re.DOTALL), entry))
+        return entries
+
+    def request_rng(self, body):
+        """Per-request generator: the same request and seed always get the same answer."""
+        digest = zlib.crc32(json.dumps(body, sort_keys=True).encode("utf-8"))
+        return random.Random(f"{self.args.seed}:{digest}")
+
+    def roll(self, rate):
+        with self._rng_lock:
+            return self.rng.random() < rate
+
+    def over_rpm(self, api_key):
+        """Sliding one-minute window per API key when --rpm is set."""
+        if not self.args.rpm:
+            return False
+        now = time.monotonic()
+        with self._requests_lock:
+            window = self._requests.setdefault(api_key, deque())
+            while window and now - window[0] > 60:
+                window.popleft()
+            if len(window) >= self.args.rpm:
+                return True
+            window.append(now)
+            return False
+
+    # -- Answers ------------------------------------------------------------
+
+    def answer(self, system, user, rng):
+        """Text for a request: a replayed recording if one matches, otherwise a template."""
+        for pattern, entry in self.replay:
+            if pattern.search(f"{system}\n{user}"):
+                return entry["content"]
+
+        if "revise" in system.lower() or "revised" in user.lower():
+            return self._refinement(system, rng)
+        if "POST #" in system or "POST #" in user:
+            return self._posts(system, user, rng)
+        return f"Mock answer: {user.strip()[:200]}"
+
+    def _refinement(self, system, rng):
+        content = f"{rng.choice(_SENTENCES).format(name='our brand', focus_lower='this idea')} {rng.choice(_HASHTAGS)}"
+        graphic = rng.choice(_GRAPHICS)
+        if "only the revised graphic" in system.lower():
+            return graphic
+        if "graphic concept" in system.lower() and "both" in system.lower():
+            return f"{content}\n\nGRAPHIC:\n{graphic}"
+        return content
+
+    def _posts(self, system, user, rng):
+        name = (re.search(r"for (.+?) for \w+ \d{4}", user) or re.search(r"Brand: (.+)", system)
+                or re.search(r"You write LinkedIn posts for (.+?)\.", system))
+        name = name.group(1).strip() if name else "our brand"
+        focus = re.search(r"Primary focus: (.*)", user)
+        focus = focus.group(1).strip() if focus and focus.group(1).strip() else "what we do best"
+
+        only = re.search(r"Write ONLY posts ([#\d,\s]+)", user)
+        if only:
+            numbers = [int(n) for n in re.findall(r"\d+", only.group(1))]
+        else:
+            count = re.search(r"exactly (\d+)", user)
+            numbers = list(range(1, int(count.group(1)) + 1 if count else 4))
+
+        dates = []
+        with_dates = "[Weekday, Month Day, Year]" in system
+        if with_dates:
+            month_year = re.search(r"for (\w+) (\d{4})", user) or re.search(r"(\w+) (\d{4}) LinkedIn calendar", user)
+            now = datetime.now()
+            month = list(calendar.month_name).index(month_year.group(1)) if month_year and month_year.group(1) in calendar.month_name else now.month
+            year = int(month_year.group(2)) if month_year else now.year
+            dates = [datetime(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)
+                     if datetime(year, month, day).weekday() < 5]
+
+        sections = []
+        for i, number in enumerate(numbers):
+            sentences = rng.sample(_SENTENCES, 3)
+            body = " ".join(s.format(name=name, focus_lower=focus.lower()) for s in sentences)
+            body += f"\n\n{' '.join(rng.sample(_HASHTAGS, 2))}"
+            header = f"POST #{number}"
+            if with_dates and dates:
+                date = dates[min(len(dates) - 1, i * len(dates) // max(1, len(numbers)))]
+                header += f" - {date.strftime('%A, %B %d, %Y')}"
+            sections.append(f"{header}:\n{body}\n\nGRAPHIC:\n{rng.choice(_GRAPHICS)}")
+        return "\n\n".join(sections)
+
+    def malform(self, text, rng):
+        mode = rng.choice(self.args.malformed_modes)
+        if mode == "truncated":
+            return text[:int(len(text) * 0.6)]
+        if mode == "unnumbered":
+            return re.sub(r"POST #\d+( - [^:\n]*)?:", "", text)
+        if mode == "missing_graphic":
+            return re.sub(r"\n\nGRAPHIC:\n[^\n]*", "", text)
+        if mode == "empty":
+            return ""
+        return " ".join(line for line in text.splitlines() if line and not line.startswith(("POST #", "GRAPHIC")))
+
+    def embedding(self, text, dimensions):
+        """Deterministic feature-hashing vector, normalised."""
+        vector = [0.0] * dimensions
+        words = re.findall(r"[a-z0-9#@']+", (text or "").lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            vector[hashed % dimensions] += 1.0 if hashed & 0x80000000 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None  # set in main()
+
+    def log_message(self, format, *args):
+        if self.mock.args.verbose:
+            super().log_message(format, *args)
+
+    # -- Helpers ------------------------------------------------------------
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message, error_type, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": error_type, "code": None}}, headers)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, payload, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{prefix}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _api_key(self):
+        return (self.headers.get("Authorization") or "").replace("Bearer ", "", 1)
+
+    def _reject(self, model):
+        """Inject failures. Returns True when the request was answered with an error."""
+        args = self.mock.args
+        if self.mock.over_rpm(self._api_key()) or self.mock.roll(args.rate_429):
+            self.mock.stats.add(model, rate_limited=1)
+            retry_after = args.retry_after
+            self._error(429, "Rate limit reached (mock)", "requests", {
+                "Retry-After": str(math.ceil(retry_after)),
+                "retry-after-ms": str(int(retry_after * 1000))
+            })
+            return True
+        if self.mock.roll(args.rate_500):
+            self.mock.stats.add(model, server_errors=1)
+            self._error(500, "The server had an error (mock)", "server_error")
+            return True
+        return False
+
+    def _completion_text(self, model, system, user, rng):
+        text = self.mock.answer(system, user, rng)
+        if self.mock.args.malformed_rate and rng.random() < self.mock.args.malformed_rate:
+            self.mock.stats.add(model, malformed=1)
+            text = self.mock.malform(text, rng)
+        return text
+
+    def _usage(self, model, prefix, prompt_text, completion_text):
+        prompt_tokens = count_tokens(prompt_text)
+        completion_tokens = count_tokens(completion_text) if completion_text else 0
+        cached = min(prompt_tokens, self.mock.stats.cached_tokens(model, prefix))
+        self.mock.stats.add(model, requests=1, prompt_tokens=prompt_tokens,
+                            completion_tokens=completion_tokens, cached_tokens=cached)
+        return prompt_tokens, completion_tokens, cached
+
+    def _chunks(self, text, rng):
+        """Yield chunks of `text` after the first-token latency and per-chunk delays."""
+        time.sleep(self.mock.ttft(rng))
+        for start in range(0, len(text), CHUNK_CHARS):
+            if start:
+                time.sleep(self.mock.chunk_delay(rng))
+            yield text[start:start + CHUNK_CHARS]
+
+    # -- Routes -------------------------------------------------------------
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/_stats":
+            self._send_json(200, self.mock.stats.snapshot())
+        elif self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in self.mock.stats.snapshot()]})
+        elif self.path.startswith("/fixtures/") and self.mock.args.fixtures:
+            self._serve_fixture(self.path[len("/fixtures/"):])
+        else:
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        try:
+            body = self._read_body()
+        except ValueError:
+            self._error(400, "Invalid JSON body", "invalid_request_error")
+            return
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._chat(body)
+        elif path.endswith("/responses"):
+            self._responses(body)
+        elif path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def _chat(self, body):
+        model = body.get("model", "mock")
+        if self._reject(model):
+            return
+        messages = body.get("messages", [])
+        system = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        user = "\n".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+        rng = self.mock.request_rng(body)
+        text = self._completion_text(model, system, user, rng)
+        prompt_tokens, completion_tokens, cached = self._usage(
+            model, messages[0].get("content", "") if messages else "", system + user, text
+        )
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached}
+        }
+        completion_id = f"chatcmpl-mock{rng.getrandbits(48):012x}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            for _ in self._chunks(text, rng):
+                pass
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self._start_stream()
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        try:
+            for chunk in self._chunks(text, rng):
+                self._send_event({**base, "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]})
+            self._send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event({**base, "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client cancelled, e.g. a hedged request that lost
+
+    def _responses(self, body):
+        model = body.get("model", "mock")
+        if self._reject(model):
+            return
+        system = body.get("instructions") or ""
+        user = body.get("input") if isinstance(body.get("input"), str) else json.dumps(body.get("input"))
+        rng = self.mock.request_rng(body)
+        text = self._completion_text(model, system, user, rng)
+        prompt_tokens, completion_tokens, cached = self._usage(model, system, system + user, text)
+        response_id = f"resp_mock{rng.getrandbits(48):012x}"
+        response = {
+            "id": response_id, "object": "response", "created_at": int(time.time()), "model": model,
+            "status": "completed",
+            "output": [{"id": f"msg_{response_id}", "type": "message", "role": "assistant", "status": "completed",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+            "usage": {
+                "input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "input_tokens_details": {"cached_tokens": cached},
+                "output_tokens_details": {"reasoning_tokens": 0}
+            }
+        }
+
+        if not body.get("stream"):
+            for _ in self._chunks(text, rng):
+                pass
+            self._send_json(200, response)
+            return
+
+        self._start_stream()
+        sequence = 0
+        try:
+            for chunk in self._chunks(text, rng):
+                self._send_event({"type": "response.output_text.delta", "item_id": f"msg_{response_id}",
+                                  "output_index": 0, "content_index": 0, "delta": chunk,
+                                  "sequence_number": sequence}, event="response.output_text.delta")
+                sequence += 1
+            self._send_event({"type": "response.completed", "response": response, "sequence_number": sequence},
+                             event="response.completed")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _embeddings(self, body):
+        model = body.get("model", "mock-embedding")
+        if self._reject(model):
+            return
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        dimensions = int(body.get("dimensions") or 1536)
+        prompt_tokens = sum(count_tokens(text) for text in inputs)
+        self.mock.stats.add(model, requests=1, prompt_tokens=prompt_tokens)
+        self._send_json(200, {
+            "object": "list", "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": self.mock.embedding(text, dimensions)}
+                     for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        })
+
+    def _serve_fixture(self, name):
+        root = os.path.abspath(self.mock.args.fixtures)
+        path = os.path.abspath(os.path.join(root, name.split("?")[0]))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            self._error(404, f"No fixture {name}", "invalid_request_error")
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        mtime = int(os.path.getmtime(path))
+        last_modified = formatdate(mtime, usegmt=True)
+
+        not_modified = self.headers.get("If-None-Match") == etag
+        since = self.headers.get("If-Modified-Since")
+        if not not_modified and since and not self.headers.get("If-None-Match"):
+            try:
+                not_modified = mtime <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                pass
+        if not_modified:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content_type = "text/html; charset=utf-8" if path.endswith((".html", ".htm")) else "text/plain; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for answers and injected failures")
+    parser.add_argument("--ttft", default="fixed:0.05",
+                        help="Time to first token, e.g. fixed:0.2, uniform:0.1,0.5, normal:0.5,0.1, lognormal:0.4,0.5")
+    parser.add_argument("--chunk-delay", default="fixed:0.005", help="Delay between streamed chunks (same syntax)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute per API key before 429s (0 = off)")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of answers that are malformed")
+    parser.add_argument("--malformed-modes", default=",".join(MALFORMED_MODES),
+                        help=f"Comma-separated malformations to pick from: {', '.join(MALFORMED_MODES)}")
+    parser.add_argument("--replay", help="JSONL of recorded answers: {\"match\": regex, \"content\": text}")
+    parser.add_argument("--fixtures", help="Directory served under /fixtures/ with ETag and Last-Modified")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+    args.malformed_modes = [mode for mode in args.malformed_modes.split(",") if mode in MALFORMED_MODES]
+    if not args.malformed_modes:
+        parser.error("--malformed-modes needs at least one known mode")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    Handler.mock = MockOpenAI(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Mock OpenAI server on http://{args.host}:{args.port}/v1 (Ctrl+C to stop)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(Handler.mock.stats.snapshot(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+Fetch a web article and extract its main text.
+
+Pages are downloaded with urllib and reduced to their main content with a
+small readability-style extractor: script, navigation and other boilerplate
+are dropped, paragraphs are scored by length and link density, and the
+container with the best score wins. Results are cached on disk by URL.
+Within `max_age` seconds a cached article is used as is. After that the page
+is revalidated with If-None-Match / If-Modified-Since, so an unchanged page
+costs a 304 instead of a download and re-extraction. When the page cannot
+be fetched at all, an older cached copy is returned rather than nothing.
+
+Only public http(s) pages are fetched. Every connection, including those
+made for redirects, checks the addresses the host resolves to and refuses
+private, loopback, link-local and other non-public ones, so a URL typed in
+the app cannot reach internal services. Set ARTICLE_FETCH_ALLOW_LOCAL_FIXTURES=1
+to read the /fixtures/ pages of mock_openai_server.py on a loopback address.
+
+Run `python -m utils.article_fetch URL` to see what would be sent to the model.
+"""
+import hashlib
+import http.client
+import ipaddress
+import json
+import os
+import re
+import socket
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from functools import partial
+from html.parser import HTMLParser
+from typing import Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "articles")
+DEFAULT_MAX_AGE_S = 300
+DEFAULT_TIMEOUT_S = 15
+MAX_DOWNLOAD_BYTES = 5 * 1024 * 1024
+MIN_PARAGRAPH_LENGTH = 25
+USER_AGENT = "Mozilla/5.0 (compatible; CorporateCrusader/1.0; +article-fetch)"
+
+_SKIP_TAGS = {"script", "style", "noscript", "svg", "iframe", "form", "nav", "header", "footer",
+              "aside", "button", "select", "template", "figure", "canvas"}
+_BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "blockquote", "pre", "td", "dd"}
+_CONTAINER_TAGS = {"div", "section", "article", "main", "body", "td"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_NEGATIVE_HINTS = re.compile(r"comment|sidebar|footer|menu|nav|promo|share|social|related|advert|\bad\b|"
+                             r"cookie|banner|subscribe|newsletter|popup|breadcrumb", re.IGNORECASE)
+_POSITIVE_HINTS = re.compile(r"article|content|post|entry|story|body|main|text", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _Extractor(HTMLParser):
+    """Collects text blocks with their container ancestry and link text length."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.og_title = ""
+        self.blocks = []            # (ancestors tuple, tag, text, link_chars)
+        self.containers = {}        # id -> (tag, attributes hint text)
+        self._stack = []            # open tags as (tag, container id or None, skipped)
+        self._skip_depth = 0
+        self._block = None
+        self._link_depth = 0
+        self._in_title = False
+
+    def _ancestors(self):
+        return tuple(cid for _, cid, _ in self._stack if cid is not None)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta" and attrs.get("property") == "og:title":
+            self.og_title = attrs.get("content") or ""
+        if tag in _VOID_TAGS:
+            if tag == "br" and self._block is not None:
+                self._block["text"].append("\n")
+            return
+
+        hint = f"{attrs.get('class') or ''} {attrs.get('id') or ''} {attrs.get('role') or ''}"
+        skipped = (tag in _SKIP_TAGS or attrs.get("aria-hidden") == "true"
+                   or (tag in _CONTAINER_TAGS and tag not in ("body", "main", "article")
+                       and _NEGATIVE_HINTS.search(hint) and not _POSITIVE_HINTS.search(hint)))
+        container_id = None
+        if tag in _CONTAINER_TAGS and not skipped:
+            container_id = len(self.containers)
+            self.containers[container_id] = (tag, hint)
+        self._stack.append((tag, container_id, skipped))
+        if skipped:
+            self._skip_depth += 1
+            return
+
+        if tag == "title":
+            self._in_title = True
+        elif tag == "a":
+            self._link_depth += 1
+        elif tag in _BLOCK_TAGS and self._skip_depth == 0:
+            self._flush_block()
+            self._block = {"tag": tag, "text": [], "link_chars": 0, "ancestors": self._ancestors()}
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        # Close up to the matching open tag, tolerating sloppy markup
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > depth:
+            open_tag, _, skipped = self._stack.pop()
+            if skipped:
+                self._skip_depth -= 1
+            elif open_tag == "title":
+                self._in_title = False
+            elif open_tag == "a":
+                self._link_depth = max(0, self._link_depth - 1)
+            elif open_tag in _BLOCK_TAGS and self._block is not None and self._block["tag"] == open_tag:
+                self._flush_block()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_depth or self._block is None:
+            return
+        self._block["text"].append(data)
+        if self._link_depth:
+            self._block["link_chars"] += len(data.strip())
+
+    def _flush_block(self):
+        block, self._block = self._block, None
+        if block is None:
+            return
+        text = "\n".join(_WHITESPACE.sub(" ", line).strip() for line in "".join(block["text"]).split("\n"))
+        text = text.strip()
+        if text:
+            self.blocks.append((block["ancestors"], block["tag"], text, block["link_chars"]))
+
+    def close(self):
+        super().close()
+        self._flush_block()
+
+
+def _block_score(tag: str, text: str, link_chars: int) -> float:
+    if tag.startswith("h"):
+        return 0.0
+    if len(text) < MIN_PARAGRAPH_LENGTH:
+        return 0.0
+    link_density = link_chars / max(1, len(text))
+    if link_density > 0.5:
+        return 0.0
+    return (1 + text.count(",") + min(len(text) / 100.0, 3)) * (1 - link_density)
+
+
+def extract_article(html: str) -> Dict[str, str]:
+    """
+    Extract the title and main text of an HTML page.
+    Returns:
+        Dictionary with `title` and `text` (paragraphs separated by blank lines)
+    """
+    parser = _Extractor()
+    parser.feed(html)
+    parser.close()
+
+    # Readability-style scoring: each paragraph scores its container and half that for the grandparent
+    scores = {}
+    for ancestors, tag, text, link_chars in parser.blocks:
+        score = _block_score(tag, text, link_chars)
+        if not score or not ancestors:
+            continue
+        scores[ancestors[-1]] = scores.get(ancestors[-1], 0.0) + score
+        if len(ancestors) > 1:
+            scores[ancestors[-2]] = scores.get(ancestors[-2], 0.0) + score / 2
+    for container_id in scores:
+        tag, hint = parser.containers[container_id]
+        if tag in ("article", "main") or _POSITIVE_HINTS.search(hint):
+            scores[container_id] *= 1.25
+
+    if scores:
+        best = max(scores, key=scores.get)
+        blocks = [block for block in parser.blocks if best in block[0]]
+    else:
+        blocks = parser.blocks
+
+    paragraphs = []
+    for _, tag, text, link_chars in blocks:
+        if tag.startswith("h") or (len(text) >= MIN_PARAGRAPH_LENGTH and link_chars / len(text) <= 0.5):
+            if not paragraphs or paragraphs[-1] != text:
+                paragraphs.append(text)
+    title = _WHITESPACE.sub(" ", parser.og_title or parser.title).strip()
+    return {"title": title, "text": "\n\n".join(paragraphs)}
+
+
+def _cache_path(url: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def _read_cache(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path: str, article: Dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(article, f)
+    os.replace(tmp_path, path)
+
+
+def _decode(body: bytes, content_type: str) -> str:
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.IGNORECASE)
+    if not match:
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', body[:2048], re.IGNORECASE)
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    else:
+        charset = match.group(1)
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+class BlockedURLError(ValueError):
+    """The URL is not a public http(s) page, e.g. it points at a private or loopback address."""
+
+
+def _fixture_url(url: str) -> bool:
+    return (os.environ.get("ARTICLE_FETCH_ALLOW_LOCAL_FIXTURES") == "1"
+            and urllib.parse.urlsplit(url).path.startswith("/fixtures/"))
+
+
+def _allowed_address(address: str, allow_loopback: bool) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if allow_loopback and ip.is_loopback:
+        return True
+    # is_global is False for private, loopback, link-local, reserved, shared and unspecified addresses
+    return ip.is_global and not ip.is_multicast
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, allow_loopback=False):
+    """socket.create_connection that only connects to allowed addresses of the host."""
+    host, port = address
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    blocked = [info[4][0] for info in infos if not _allowed_address(info[4][0], allow_loopback)]
+    if blocked or not infos:
+        raise BlockedURLError(f"{host} resolves to a non-public address ({', '.join(blocked) or 'none'})")
+    error = None
+    # Connect to the addresses that were checked, never to a second lookup of the name
+    for info in infos:
+        try:
+            return socket.create_connection((info[4][0], port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, allow_loopback=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = partial(_connect_public, allow_loopback=allow_loopback)
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, allow_loopback=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = partial(_connect_public, allow_loopback=allow_loopback)
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, allow_loopback=False):
+        super().__init__()
+        self.allow_loopback = allow_loopback
+
+    def http_open(self, req):
+        return self.do_open(partial(_PublicHTTPConnection, allow_loopback=self.allow_loopback), req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, allow_loopback=False):
+        super().__init__()
+        self.allow_loopback = allow_loopback
+
+    def https_open(self, req):
+        return self.do_open(partial(_PublicHTTPSConnection, allow_loopback=self.allow_loopback), req,
+                            context=self._context)
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def __init__(self, allow_loopback=False):
+        super().__init__()
+        self.allow_loopback = allow_loopback
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_url(newurl)
+        if self.allow_loopback and not _fixture_url(newurl):
+            raise BlockedURLError(f"redirect from a local fixture to {newurl}")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def check_url(url: str):
+    """
+    Raise BlockedURLError unless `url` is an http(s) URL with a host. The
+    host's addresses are checked when connecting.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https"):
+        raise BlockedURLError(f"only http and https URLs can be fetched, not '{parts.scheme}'")
+    if not parts.hostname:
+        raise BlockedURLError(f"URL has no host: {url}")
+
+
+def _opener(url: str) -> urllib.request.OpenerDirector:
+    allow_loopback = _fixture_url(url)
+    return urllib.request.build_opener(_PublicHTTPHandler(allow_loopback), _PublicHTTPSHandler(allow_loopback),
+                                       _CheckedRedirectHandler(allow_loopback))
+
+
+def fetch_article(url: str, cache_dir: Optional[str] = None, max_age: float = DEFAULT_MAX_AGE_S,
+                  timeout: float = DEFAULT_TIMEOUT_S) -> Dict:
+    """
+    Fetch and extract an article, using and revalidating the URL cache.
+    Args:
+        url: Page to fetch (a public http or https page)
+        cache_dir: Cache directory; defaults to ARTICLE_CACHE_DIR or cache/articles
+        max_age: Seconds a cached article is used without revalidation
+        timeout: Network timeout in seconds
+    Returns:
+        Dictionary with url, title, text, etag, last_modified, fetched_at and
+        `cache` ("fresh", "revalidated", "miss", or "stale" when the page could not be
+        fetched and the cached copy is returned instead)
+    Raises:
+        BlockedURLError if the URL or one it redirects to is not a public http(s) page
+        urllib.error.URLError / OSError if the page cannot be fetched and nothing is cached
+    """
+    check_url(url)
+    cache_dir = cache_dir or os.environ.get("ARTICLE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    path = _cache_path(url, cache_dir)
+    cached = _read_cache(path)
+    if cached and time.time() - cached.get("checked_at", 0) < max_age:
+        return {**cached, "cache": "fresh"}
+
+    headers = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with _opener(url).open(request, timeout=timeout) as response:
+            body = response.read(MAX_DOWNLOAD_BYTES)
+            content_type = response.headers.get("Content-Type", "")
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            cached["checked_at"] = time.time()
+            _write_cache(path, cached)
+            return {**cached, "cache": "revalidated"}
+        if cached:
+            print(f"Error fetching article {url}, using the cached copy: {str(e)}")
+            return {**cached, "cache": "stale"}
+        raise
+    except OSError as e:
+        # URLError, timeouts and connection errors; checked_at is left alone so the next call tries again
+        if cached:
+            print(f"Error fetching article {url}, using the cached copy: {str(e)}")
+            return {**cached, "cache": "stale"}
+        raise
+
+    extracted = extract_article(_decode(body, content_type))
+    article = {
+        "url": url,
+        "title": extracted["title"],
+        "text": extracted["text"],
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+        "checked_at": time.time()
+    }
+    try:
+        _write_cache(path, article)
+    except OSError as e:
+        print(f"Error caching article {url}: {str(e)}")
+    return {**article, "cache": "miss"}
+
+
+def article_text_for(url: str) -> Optional[str]:
+    """
+    Extracted text for `url` ready to send to the model, or None when the
+    page cannot be fetched or has no readable text.
+    """
+    try:
+        article = fetch_article(url)
+    except Exception as e:
+        print(f"Error fetching article {url}: {str(e)}")
+        return None
+    if len(article["text"]) < MIN_PARAGRAPH_LENGTH * 4:
+        return None
+    if article["title"] and not article["text"].startswith(article["title"]):
+        return f"{article['title']}\n\n{article['text']}"
+    return article["text"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m utils.article_fetch URL")
+        sys.exit(1)
+    result = fetch_article(sys.argv[1])
+    print(f"{result['title']} ({result['cache']}, {len(result['text'])} chars)\n")
+    print(result["text"])
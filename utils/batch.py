@@ -0,0 +1,163 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .openai import generate_social_posts, article_to_posts
+
+
+def _slugify(value: str) -> str:
+    """Make a brand name safe to use in a file name."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', value or '').strip('_')
+    return slug or "brand"
+
+
+def generate_for_brand(brand: Dict, mode: str, api_key: str, options: Dict) -> List[Dict]:
+    """
+    Generate posts for a single brand.
+    Args:
+        brand: Brand dictionary as stored in the 'brands' table
+        mode: "calendar" or "article"
+        api_key: OpenAI API key
+        options: Generation options (focus, posts_per_month, special_events,
+                 article_text, website_url, num_posts)
+    Returns:
+        List of generated post dictionaries
+    """
+    if mode == "calendar":
+        return generate_social_posts(
+            brand,
+            options.get("focus", ""),
+            options.get("posts_per_month", 8),
+            options.get("special_events", ""),
+            api_key
+        )
+    elif mode == "article":
+        return article_to_posts(
+            article_text=options.get("article_text"),
+            website_url=options.get("website_url"),
+            num_posts=options.get("num_posts", 3),
+            brand_data=brand,
+            api_key=api_key
+        )
+    raise ValueError(f"Unknown generation mode: {mode}")
+
+
+def save_brand_posts(posts: List[Dict], brand: Dict, mode: str, user_id: str,
+                     supabase_client=None, output_dir: Optional[str] = None) -> int:
+    """
+    Write generated posts to the database or to a JSON file.
+    Args:
+        posts: Generated post dictionaries
+        brand: Brand the posts belong to
+        mode: "calendar" or "article"
+        user_id: ID of the user the posts are saved for
+        supabase_client: SupaBase instance; used when output_dir is not given
+        output_dir: Directory to write a JSON file per brand into
+    Returns:
+        Number of posts written
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        file_name = f"{_slugify(brand['name'])}_{mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(os.path.join(output_dir, file_name), "w", encoding="utf-8") as f:
+            json.dump({"brand_id": brand["id"], "brand": brand["name"], "mode": mode, "posts": posts},
+                      f, indent=2, ensure_ascii=False)
+        return len(posts)
+
+    post_type = "LinkedIn Calendar Posts" if mode == "calendar" else "LinkedIn Article Posts"
+    saved_count = 0
+    for post in posts:
+        date = post.get('date') or datetime.now().strftime('%Y-%m-%d')
+        result = supabase_client.save_posts(
+            brand_id=brand["id"],
+            post=post['content'],
+            user_id=user_id,
+            graphic_concept=post['graphic'],
+            type=post_type,
+            date=date
+        )
+        if result:
+            saved_count += 1
+    # Embed the new posts for semantic search in one batch
+    supabase_client.flush_index()
+    return saved_count
+
+
+def _run_brand(brand: Dict, mode: str, api_key: str, options: Dict, user_id: str,
+               supabase_client, output_dir: Optional[str]) -> Dict:
+    """Generate and store posts for one brand, timing the run."""
+    result = {
+        "brand_id": brand["id"],
+        "brand": brand["name"],
+        "posts": 0,
+        "saved": 0,
+        "seconds": 0.0,
+        "error": None
+    }
+    start = time.perf_counter()
+    try:
+        posts = generate_for_brand(brand, mode, api_key, options)
+        result["posts"] = len(posts)
+        if not posts:
+            result["error"] = "No posts were generated"
+        else:
+            result["saved"] = save_brand_posts(posts, brand, mode, user_id, supabase_client, output_dir)
+            if result["saved"] < len(posts):
+                result["error"] = f"Only saved {result['saved']} of {len(posts)} posts"
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_brands(brands: List[Dict], mode: str, api_key: str, options: Dict, user_id: str,
+               supabase_client=None, output_dir: Optional[str] = None,
+               max_workers: int = 4, on_result=None) -> List[Dict]:
+    """
+    Generate posts for several brands on a bounded worker pool.
+    Args:
+        brands: Brand dictionaries to generate for
+        mode: "calendar" or "article"
+        api_key: OpenAI API key
+        options: Generation options shared by every brand
+        user_id: ID of the user the posts are saved for
+        supabase_client: SupaBase instance used when writing to the database
+        output_dir: Directory to write JSON files into instead of the database
+        max_workers: Maximum number of brands generated concurrently
+        on_result: Optional callback invoked with each brand result as it finishes
+    Returns:
+        List of per-brand result dictionaries in completion order
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [
+            pool.submit(_run_brand, brand, mode, api_key, options, user_id, supabase_client, output_dir)
+            for brand in brands
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def format_report(results: List[Dict], wall_seconds: float) -> str:
+    """Build a plain-text throughput and failure report for a batch run."""
+    lines = [f"{'Brand':<30} {'Posts':>6} {'Saved':>6} {'Secs':>8} {'Posts/s':>8}  Status"]
+    for r in sorted(results, key=lambda r: r["brand"]):
+        rate = r["posts"] / r["seconds"] if r["seconds"] else 0.0
+        status = "ok" if not r["error"] else f"FAILED: {r['error']}"
+        lines.append(f"{r['brand'][:30]:<30} {r['posts']:>6} {r['saved']:>6} {r['seconds']:>8.1f} {rate:>8.2f}  {status}")
+
+    total_posts = sum(r["posts"] for r in results)
+    failures = sum(1 for r in results if r["error"])
+    overall_rate = total_posts / wall_seconds if wall_seconds else 0.0
+    lines.append("")
+    lines.append(f"{len(results)} brands, {total_posts} posts in {wall_seconds:.1f}s "
+                 f"({overall_rate:.2f} posts/s), {failures} failed")
+    return "\n".join(lines)
@@ -0,0 +1,116 @@
+"""
+LinkedIn-style post cards rendered as HTML.
+
+Card HTML is memoized in a bounded LRU cache keyed by a hash of everything
+that goes into the card, so reruns reuse the strings of unchanged posts.
+`render_cards` sends a whole page of cards as one markdown block instead
+of one st.markdown call (and websocket message) per card.
+
+Card text is HTML-escaped and newlines are written as character references,
+so a post can neither inject markup nor end the markdown HTML block early.
+The card styles (.social-post-card etc.) are defined in app_dev.py.
+"""
+import hashlib
+import html
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence
+
+import streamlit as st
+
+MAX_CACHED_CARDS = 1024
+
+_GRAPHIC_STYLE = ("background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 15px; "
+                  "border-radius: 8px; margin-top: 10px; border: 2px solid #667eea; color: white;")
+_NOTES_STYLE = "font-size: 12px; color: #cccccc; margin-top: 10px;"
+
+
+class _LRUCache:
+    """Thread-safe least-recently-used cache."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+_cache = _LRUCache(MAX_CACHED_CARDS)
+
+
+def _text(value) -> str:
+    """Escape text for a card; newlines survive white-space: pre-wrap without ending the HTML block."""
+    return html.escape(str(value or "")).replace("\r\n", "\n").replace("\n", "&#10;")
+
+
+def _initials(brand_name: str) -> str:
+    return "".join(word[0].upper() for word in (brand_name or "").split()[:2])
+
+
+def post_stats(metrics: Dict[str, int]) -> str:
+    """One line of a post's stored metrics (see utils/post_metrics.py)."""
+    return (f"📊 {metrics['char_count']} characters · {metrics['hashtag_count']} hashtags · "
+            f"{metrics['mention_count']} mentions · {metrics['url_count']} links · "
+            f"{max(1, round(metrics['reading_time_s'] / 60))} min read")
+
+
+def card_html(content: str, brand_name: str, date: Optional[str] = None, graphic: Optional[str] = None,
+              notes: Sequence[str] = ()) -> str:
+    """
+    HTML for one post card, memoized by a hash of its inputs.
+    Args:
+        content: Post text (literal "\\n" sequences are shown as line breaks)
+        brand_name: Brand shown as the author
+        date: Date shown under the brand; "Today" when empty
+        graphic: Optional graphic concept shown under the card
+        notes: Optional lines of small print, e.g. post stats
+    Returns:
+        HTML string for st.markdown(..., unsafe_allow_html=True)
+    """
+    parts = (content or "", brand_name or "", date or "", graphic or "", *notes)
+    key = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    body = (content or "").replace("\\n", "\n")
+    engagement = "".join(f'<div class="engagement-btn">{label}</div>'
+                         for label in ("👍 Like", "💬 Comment", "🔄 Repost", "📤 Send"))
+    lines = [
+        '<div class="social-post-card">',
+        '<div class="post-header">',
+        f'<div class="profile-pic">{_text(_initials(brand_name))}</div>',
+        f'<div class="post-meta"><div class="brand-name">{_text(brand_name)}</div>'
+        f'<div class="post-time">{_text(date or "Today")} • LinkedIn</div></div>',
+        '</div>',
+        f'<div class="post-content">{_text(body)}</div>',
+        f'<div class="post-engagement">{engagement}</div>',
+        '</div>'
+    ]
+    if graphic:
+        lines.append(f'<div style="{_GRAPHIC_STYLE}"><strong>🎨 Graphic Concept:</strong><br>'
+                     f'<em>{_text(graphic)}</em></div>')
+    if notes:
+        lines.append(f'<div style="{_NOTES_STYLE}">{"<br>".join(_text(note) for note in notes)}</div>')
+    card = "\n".join(lines)
+    _cache.put(key, card)
+    return card
+
+
+def render_cards(cards: Iterable[str], separator: str = '<hr style="margin: 20px 0;">'):
+    """Render a page of cards with a single st.markdown call."""
+    st.markdown(f"\n{separator}\n".join(cards), unsafe_allow_html=True)
@@ -0,0 +1,183 @@
+"""
+Generated posts kept as drafts, so a browser refresh, reconnect or server
+restart doesn't throw away a paid-for generation.
+
+A draft is the output of one generation job: the posts plus the request
+that produced them (brand, focus, article...), keyed by user and job id.
+Background jobs save their draft as soon as they finish, whether or not
+the page is still open, and the page reloads the user's latest calendar
+and article drafts at the start of the next session.
+
+The store is chosen with the DRAFTS_STORE environment variable:
+    local:path   one JSON file per draft under path (default: local:cache/drafts)
+    supabase     the Supabase 'drafts' table (see migrations/004_drafts.sql)
+    none         drafts are not kept
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_STORE = "local:" + os.path.join("cache", "drafts")
+MAX_DRAFTS_PER_KIND = 5
+
+
+def make_draft(draft_id: str, user_id: str, kind: str, posts: List[Dict], request: Optional[Dict] = None) -> Dict:
+    """Build a draft record; `kind` is the tab it belongs to, e.g. "calendar" or "article"."""
+    now = time.time()
+    return {
+        "id": draft_id,
+        "user_id": str(user_id),
+        "kind": kind,
+        "posts": posts,
+        "request": request or {},
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+class LocalDraftStore:
+    """Keeps drafts as JSON files, one folder per user."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _user_dir(self, user_id: str) -> str:
+        # User ids may be emails or UUIDs; hash them into safe folder names
+        return os.path.join(self.directory, hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()[:16])
+
+    def _read_all(self, user_id: str) -> List[Dict]:
+        folder = self._user_dir(user_id)
+        if not os.path.isdir(folder):
+            return []
+        drafts = []
+        for name in os.listdir(folder):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(folder, name), encoding="utf-8") as f:
+                    drafts.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Error reading draft {name}: {str(e)}")
+        return drafts
+
+    def save(self, draft: Dict):
+        folder = self._user_dir(draft["user_id"])
+        path = os.path.join(folder, f"{draft['id']}.json")
+        with self._lock:
+            os.makedirs(folder, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(draft, f, default=str)
+            os.replace(tmp_path, path)
+            self._prune(draft["user_id"], draft["kind"])
+
+    def latest(self, user_id: str, kind: str) -> Optional[Dict]:
+        with self._lock:
+            drafts = [draft for draft in self._read_all(user_id) if draft.get("kind") == kind]
+        return max(drafts, key=lambda draft: draft.get("updated_at", 0), default=None)
+
+    def delete(self, user_id: str, draft_id: str):
+        with self._lock:
+            path = os.path.join(self._user_dir(user_id), f"{draft_id}.json")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _prune(self, user_id: str, kind: str):
+        drafts = sorted((draft for draft in self._read_all(user_id) if draft.get("kind") == kind),
+                        key=lambda draft: draft.get("updated_at", 0), reverse=True)
+        for draft in drafts[MAX_DRAFTS_PER_KIND:]:
+            os.remove(os.path.join(self._user_dir(user_id), f"{draft['id']}.json"))
+
+
+class SupabaseDraftStore:
+    """Keeps drafts in the Supabase 'drafts' table."""
+
+    def __init__(self, supabase_client=None):
+        if supabase_client is None:
+            from .supabase_conn import SupaBase
+            supabase_client = SupaBase()
+        self.supabase_client = supabase_client
+
+    def save(self, draft: Dict):
+        self.supabase_client.save_draft(draft)
+
+    def latest(self, user_id: str, kind: str) -> Optional[Dict]:
+        return self.supabase_client.get_latest_draft(user_id, kind)
+
+    def delete(self, user_id: str, draft_id: str):
+        self.supabase_client.delete_draft(draft_id, user_id)
+
+
+class NullDraftStore:
+    """Keeps nothing."""
+
+    def save(self, draft: Dict):
+        pass
+
+    def latest(self, user_id: str, kind: str) -> Optional[Dict]:
+        return None
+
+    def delete(self, user_id: str, draft_id: str):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_store(spec: str):
+    """Build a store from a spec such as 'local:path', 'supabase' or 'none'."""
+    kind, _, target = spec.partition(":")
+    if kind == "local":
+        return LocalDraftStore(target or os.path.join("cache", "drafts"))
+    if kind == "supabase":
+        return SupabaseDraftStore()
+    if kind == "none":
+        return NullDraftStore()
+    raise ValueError(f"Unknown drafts store: {spec}")
+
+
+def get_store():
+    """Return the process-wide store configured by DRAFTS_STORE."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = create_store(os.environ.get("DRAFTS_STORE", DEFAULT_STORE))
+            except Exception as e:
+                print(f"Error creating drafts store, drafts disabled: {str(e)}")
+                _store = NullDraftStore()
+        return _store
+
+
+def save_draft(draft: Dict):
+    """Save a draft; a failing store never breaks a generation."""
+    try:
+        get_store().save(draft)
+    except Exception as e:
+        print(f"Error saving draft {draft.get('id')}: {str(e)}")
+
+
+def load_latest(user_id: Optional[str], kind: str) -> Optional[Dict]:
+    """The user's most recent draft of this kind, or None."""
+    if not user_id:
+        return None
+    try:
+        return get_store().latest(str(user_id), kind)
+    except Exception as e:
+        print(f"Error loading {kind} draft: {str(e)}")
+        return None
+
+
+def discard(user_id: Optional[str], draft_id: Optional[str]):
+    """Delete a draft, e.g. once its posts are saved."""
+    if not user_id or not draft_id:
+        return
+    try:
+        get_store().delete(str(user_id), draft_id)
+    except Exception as e:
+        print(f"Error deleting draft {draft_id}: {str(e)}")
@@ -0,0 +1,196 @@
+"""
+Text embeddings for semantic search.
+
+OpenAIEmbedder calls the embeddings API in batches. HashingEmbedder is a
+deterministic, offline stand-in (feature hashing of words and word pairs)
+for tests and for running without an API key. Both return L2-normalised
+float32 vectors, so a dot product is the cosine similarity.
+
+CachedEmbedder wraps either one with an on-disk cache keyed by a hash of
+the model name and text, so a post is only ever embedded once. New vectors
+are appended to a log next to the compressed cache, which is only rewritten
+once the log has grown to a fraction of it.
+"""
+import hashlib
+import os
+import re
+import threading
+import zlib
+from typing import List, Optional
+
+from . import lazy
+from .rate_limit import call_with_rate_limit, estimate_tokens
+
+np = lazy.load("numpy")
+openai = lazy.load("openai")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 256
+BATCH_SIZE = 100
+DEFAULT_CACHE_DIR = os.path.join("cache", "embeddings")
+COMPACT_MIN_ENTRIES = 1000
+
+_WORD_PATTERN = re.compile(r"[a-z0-9#@']+")
+
+
+def _normalise(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API."""
+
+    def __init__(self, api_key: str, model: str = EMBEDDING_MODEL,
+                 dimensions: int = EMBEDDING_DIMENSIONS, batch_size: int = BATCH_SIZE):
+        self.api_key = api_key
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.name = f"{model}-{dimensions}"
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        client = openai.OpenAI(api_key=self.api_key, max_retries=0, timeout=60,
+                               base_url=os.environ.get("OPENAI_BASE_URL") or None)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [text or " " for text in texts[start:start + self.batch_size]]
+            response = call_with_rate_limit(
+                self.api_key,
+                estimate_tokens("".join(batch)),
+                lambda: client.embeddings.create(model=self.model, input=batch, dimensions=self.dimensions)
+            )
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        if not vectors:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return _normalise(np.array(vectors, dtype=np.float32))
+
+
+class HashingEmbedder:
+    """Deterministic local embedder: signed feature hashing of words and word pairs."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_PATTERN.findall((text or "").lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dimensions] += sign
+        return _normalise(vectors)
+
+
+class CachedEmbedder:
+    """
+    Adds a persistent cache to an embedder. Vectors are stored in one .npz
+    file per model, keyed by a SHA-1 of the text, plus an append-only log of
+    the vectors embedded since the .npz was last written.
+    """
+
+    def __init__(self, embedder, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.dimensions = embedder.dimensions
+        self.path = os.path.join(cache_dir, f"{embedder.name}.npz")
+        self.log_path = os.path.join(cache_dir, f"{embedder.name}.log")
+        self._record = np.dtype([("key", "S40"), ("vector", "<f2", (self.dimensions,))])
+        self._lock = threading.Lock()
+        self._vectors = {}
+        self._logged = 0
+        self._load()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path) as data:
+                    self._vectors = dict(zip(data["keys"].tolist(), data["vectors"].astype(np.float32)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading embedding cache {self.path}: {str(e)}")
+        if os.path.exists(self.log_path):
+            try:
+                with open(self.log_path, "rb") as f:
+                    data = f.read()
+                # A write cut short leaves a partial record at the end; drop it so appends stay aligned
+                size = len(data) - len(data) % self._record.itemsize
+                if size < len(data):
+                    os.truncate(self.log_path, size)
+                records = np.frombuffer(data[:size], dtype=self._record)
+                self._vectors.update(zip((key.decode("ascii") for key in records["key"]),
+                                         records["vector"].astype(np.float32)))
+                self._logged = len(records)
+            except (OSError, ValueError) as e:
+                print(f"Error loading embedding cache {self.log_path}: {str(e)}")
+
+    def _append(self, keys: List[str], vectors: "np.ndarray"):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        records = np.empty(len(keys), dtype=self._record)
+        records["key"] = keys
+        records["vector"] = vectors
+        with open(self.log_path, "ab") as f:
+            f.write(records.tobytes())
+        self._logged += len(keys)
+        if self._logged >= max(COMPACT_MIN_ENTRIES, len(self._vectors) // 4):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the .npz with every vector and empty the log."""
+        keys = list(self._vectors)
+        vectors = np.array([self._vectors[key] for key in keys], dtype=np.float16).reshape(-1, self.dimensions)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez_compressed(tmp_path, keys=np.array(keys), vectors=vectors)
+        os.replace(tmp_path, self.path)
+        os.remove(self.log_path)
+        self._logged = 0
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            missing = list(dict.fromkeys(key for key in keys if key not in self._vectors))
+        if missing:
+            by_key = dict(zip(keys, texts))
+            fresh = self.embedder.embed([by_key[key] for key in missing])
+            with self._lock:
+                self._vectors.update(zip(missing, fresh))
+                try:
+                    self._append(missing, fresh)
+                except OSError as e:
+                    print(f"Error saving embedding cache {self.path}: {str(e)}")
+        with self._lock:
+            vectors = [self._vectors[key] for key in keys]
+        if not vectors:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.array(vectors, dtype=np.float32)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(api_key: Optional[str] = None) -> CachedEmbedder:
+    """
+    Return the cached embedder to use. EMBEDDINGS=hashing forces the local
+    stand-in; otherwise OpenAI is used when an API key is available.
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    use_openai = api_key and os.environ.get("EMBEDDINGS", "openai").lower() != "hashing"
+    cache_key = hashlib.sha256(api_key.encode()).hexdigest() if use_openai else "hashing"
+    with _embedders_lock:
+        if cache_key not in _embedders:
+            embedder = OpenAIEmbedder(api_key) if use_openai else HashingEmbedder()
+            cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+            base_url = os.environ.get("OPENAI_BASE_URL")
+            if use_openai and base_url:
+                # Keep vectors from another endpoint (e.g. the mock server) apart from real ones
+                cache_dir = os.path.join(cache_dir, hashlib.sha1(base_url.encode()).hexdigest()[:12])
+            _embedders[cache_key] = CachedEmbedder(embedder, cache_dir)
+        return _embedders[cache_key]
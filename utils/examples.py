@@ -0,0 +1,79 @@
+"""
+Retrieval of a brand's most relevant example posts.
+
+Brands keep their example posts in one free-text `previous_posts` field.
+Pasting all of it into every prompt makes prompt size, latency and cost
+grow with the brand's history. Instead the field is split into individual
+posts (utils/similarity.split_posts), embedded once (embeddings are cached
+on disk), and only the examples closest to the request's focus and events
+are sent, up to a fixed token budget.
+
+The first few examples are the brand's anchor examples. They sit in the
+stable prompt prefix (utils/prompts.py), so they are always shown and are
+cached with it; retrieval picks the extras from the rest.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from . import embeddings, lazy
+from .rate_limit import estimate_tokens
+from .similarity import split_posts
+
+logger = logging.getLogger(__name__)
+
+np = lazy.load("numpy")
+
+MAX_EXAMPLES = 5
+MAX_EXAMPLE_TOKENS = 1000
+ANCHOR_EXAMPLES = 2
+ANCHOR_EXAMPLE_TOKENS = 400
+
+
+def _within_budget(examples: List[str], max_tokens: int) -> List[str]:
+    """Keep examples in order until the token budget is used up."""
+    selected, used = [], 0
+    for example in examples:
+        tokens = estimate_tokens(example)
+        if used + tokens > max_tokens:
+            continue
+        selected.append(example)
+        used += tokens
+    return selected
+
+
+def anchor_examples(brand_data: Dict) -> List[str]:
+    """The brand's first examples, within ANCHOR_EXAMPLE_TOKENS; the same for every request."""
+    examples = split_posts((brand_data or {}).get('previous_posts') or '')
+    return _within_budget(examples, ANCHOR_EXAMPLE_TOKENS)[:ANCHOR_EXAMPLES]
+
+
+def select_examples(brand_data: Dict, query: str, k: int = MAX_EXAMPLES,
+                    max_tokens: int = MAX_EXAMPLE_TOKENS, api_key: Optional[str] = None) -> List[str]:
+    """
+    Pick the brand's example posts most relevant to a request, leaving out
+    its anchor examples.
+    Args:
+        brand_data: Brand dictionary with a free-text `previous_posts` field
+        query: What the request is about, e.g. focus and special events
+        k: Maximum number of examples
+        max_tokens: Maximum estimated tokens for all examples together
+        api_key: OpenAI API key for embeddings; the local embedder is used without one
+    Returns:
+        Example posts, most relevant first
+    """
+    anchors = set(anchor_examples(brand_data))
+    examples = [example for example in split_posts((brand_data or {}).get('previous_posts') or '')
+                if example not in anchors]
+    if len(examples) <= k:
+        return _within_budget(examples, max_tokens)
+
+    try:
+        embedder = embeddings.get_embedder(api_key)
+        vectors = embedder.embed(examples)
+        query_vector = embedder.embed([query or (brand_data or {}).get('name', '')])[0]
+        order = np.argsort(-(vectors @ query_vector), kind="stable")
+        ranked = [examples[i] for i in order]
+    except Exception as e:
+        logger.warning("Error ranking example posts, using the first ones: %s", e)
+        ranked = examples
+    return _within_budget(ranked, max_tokens)[:k]
@@ -0,0 +1,327 @@
+"""
+Streaming export of saved posts to CSV, JSON Lines, Excel or Parquet.
+
+Posts are read from the database a chunk at a time (SupaBase.get_posts_page)
+and each chunk is handed to a format writer and dropped, so memory stays
+bounded by the chunk size however many posts a brand or user has. The
+output goes to a file under EXPORT_DIR, and the page keeps only its path.
+st.download_button still reads the whole file into memory while it is
+shown, so the finished export is held once by Streamlit, not by the export.
+
+The tabular formats (CSV, Excel, Parquet) have the columns in COLUMNS;
+JSON Lines keeps every column of the posts table, one post per line.
+Excel needs openpyxl and Parquet needs pyarrow; both are optional, and
+available_formats() lists only what can be written here.
+
+enhanced_export_data() builds the "Enhanced CSV" table of generated posts
+column by column, and keeps recent tables, up to MAX_CACHED_TABLE_BYTES in
+all, by a digest of the posts they were built from, so reruns of the
+export panel (e.g. the preview checkbox) reuse them.
+benchmarks/enhanced_export.py measures it.
+"""
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import lazy, post_metrics
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+DEFAULT_CHUNK_SIZE = 500
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "corporate_crusader_exports"))
+EXPORT_FILE_TTL_S = 6 * 3600
+MAX_CACHED_TABLE_BYTES = 64 * 1024 * 1024
+
+COLUMNS = ("Date", "Brand", "Type", "Content", "Graphic Concept", "Character Count", "Hashtag Count",
+           "Mention Count", "Link Count", "Reading Time (s)")
+_INTEGER_COLUMNS = ("Character Count", "Hashtag Count", "Mention Count", "Link Count", "Reading Time (s)")
+
+
+def export_row(post: Dict, brand_names: Optional[Dict[str, str]] = None) -> Dict:
+    """One post as a row of the tabular formats."""
+    metrics = post_metrics.metrics_for(post, 'post')
+    brand_id = post.get('brand_id')
+    return {
+        "Date": post.get('date', '') or '',
+        "Brand": (brand_names or {}).get(brand_id, brand_id or ''),
+        "Type": post.get('type', '') or '',
+        "Content": post.get('post', '') or '',
+        "Graphic Concept": post.get('graphic_concept', '') or '',
+        "Character Count": metrics['char_count'],
+        "Hashtag Count": metrics['hashtag_count'],
+        "Mention Count": metrics['mention_count'],
+        "Link Count": metrics['url_count'],
+        "Reading Time (s)": metrics['reading_time_s']
+    }
+
+
+class _CsvWriter:
+    def __init__(self, out, brand_names=None):
+        self.brand_names = brand_names
+        self._text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        self._writer = csv.DictWriter(self._text, fieldnames=COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, posts: List[Dict]):
+        self._writer.writerows(export_row(post, self.brand_names) for post in posts)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()     # leave `out` open for the caller
+
+
+class _JsonLinesWriter:
+    def __init__(self, out, brand_names=None):
+        self.out = out
+
+    def write(self, posts: List[Dict]):
+        self.out.write("".join(json.dumps(post, ensure_ascii=False, default=str) + "\n"
+                               for post in posts).encode("utf-8"))
+
+    def close(self):
+        pass
+
+
+class _XlsxWriter:
+    def __init__(self, out, brand_names=None):
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        self.out = out
+        self.brand_names = brand_names
+        self._illegal = ILLEGAL_CHARACTERS_RE
+        # Write-only workbooks keep rows in a temporary file, not in memory
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Posts")
+        self._sheet.append(COLUMNS)
+
+    def write(self, posts: List[Dict]):
+        for post in posts:
+            row = export_row(post, self.brand_names)
+            self._sheet.append([self._illegal.sub("", value) if isinstance(value, str) else value
+                                for value in (row[column] for column in COLUMNS)])
+
+    def close(self):
+        self._workbook.save(self.out)
+
+
+class _ParquetWriter:
+    def __init__(self, out, brand_names=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.brand_names = brand_names
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.int64() if column in _INTEGER_COLUMNS else pa.string())
+                                  for column in COLUMNS])
+        self._writer = pq.ParquetWriter(out, self._schema)
+
+    def write(self, posts: List[Dict]):
+        # One row group per chunk
+        rows = [export_row(post, self.brand_names) for post in posts]
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+FORMATS = {
+    "csv": {"label": "CSV", "extension": "csv", "mime": "text/csv", "requires": None, "writer": _CsvWriter},
+    "jsonl": {"label": "JSON Lines", "extension": "jsonl", "mime": "application/x-ndjson", "requires": None,
+              "writer": _JsonLinesWriter},
+    "xlsx": {"label": "Excel", "extension": "xlsx", "requires": "openpyxl", "writer": _XlsxWriter,
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "parquet": {"label": "Parquet", "extension": "parquet", "mime": "application/vnd.apache.parquet",
+                "requires": "pyarrow", "writer": _ParquetWriter}
+}
+
+
+def available_formats() -> List[str]:
+    """Export formats whose optional dependency is installed."""
+    return [name for name, spec in FORMATS.items()
+            if spec["requires"] is None or importlib.util.find_spec(spec["requires"]) is not None]
+
+
+def iter_chunks(fetch_page: Callable[[int], Tuple[List[Dict], int]]) -> Iterator[List[Dict]]:
+    """Pages of `fetch_page(page) -> (rows, total)` until the total is reached, one chunk each."""
+    page = 0
+    seen = 0
+    while True:
+        rows, total = fetch_page(page)
+        if not rows:
+            return
+        yield rows
+        seen += len(rows)
+        page += 1
+        if seen >= total:
+            return
+
+
+def list_chunks(rows: List[Dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict]]:
+    """Chunks of rows that are already in memory, e.g. semantic search results."""
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+def query_chunks(client, brand_id: Optional[str] = None, user_id: Optional[str] = None,
+                 post_type: Optional[str] = None, search: Optional[str] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict]]:
+    """
+    Every matching post, read from the database a chunk at a time.
+    Args:
+        client: SupaBase client
+        brand_id: Brand to export; None exports all of the user's brands
+        user_id: User whose posts are exported
+        post_type: Optional post type to keep
+        search: Optional keywords the post must contain
+        chunk_size: Posts per database request
+    Returns:
+        Iterator of lists of post dictionaries, newest first
+    """
+    return iter_chunks(partial(client.get_posts_page, brand_id, user_id, page_size=chunk_size,
+                               post_type=post_type, search=search))
+
+
+def write_export(chunks: Iterable[List[Dict]], fmt: str, out, brand_names: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Write posts to `out` in the given format, one chunk at a time.
+    Args:
+        chunks: Lists of post dictionaries, e.g. from query_chunks()
+        fmt: Key of FORMATS
+        out: Writable binary file
+        brand_names: Optional brand id -> name, for the Brand column
+    Returns:
+        Export stats: rows, chunks, seconds, rows_per_s
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Export format '{fmt}' is not available; choose one of {available_formats()}")
+    start = time.perf_counter()
+    writer = FORMATS[fmt]["writer"](out, brand_names)
+    rows = 0
+    count = 0
+    for chunk in chunks:
+        writer.write(chunk)
+        rows += len(chunk)
+        count += 1
+    writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "chunks": count,
+        "seconds": seconds,
+        "rows_per_s": rows / seconds if seconds > 0 else float(rows)
+    }
+
+
+def export_path(suffix: str) -> str:
+    """A new, empty file under EXPORT_DIR; files older than EXPORT_FILE_TTL_S are removed."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    cutoff = time.time() - EXPORT_FILE_TTL_S
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+    handle, path = tempfile.mkstemp(suffix=suffix, dir=EXPORT_DIR)
+    os.close(handle)
+    return path
+
+
+def export_file(chunks: Iterable[List[Dict]], fmt: str,
+                brand_names: Optional[Dict[str, str]] = None) -> Tuple[str, Dict]:
+    """
+    Write the export to a file under EXPORT_DIR, for st.download_button.
+    Returns:
+        Tuple of (file path, export stats with `bytes`); the caller may delete the file
+        once it is replaced, and it is removed after EXPORT_FILE_TTL_S otherwise
+    """
+    path = export_path(f".{FORMATS.get(fmt, {}).get('extension', 'bin')}")
+    try:
+        with open(path, "wb") as out:
+            stats = write_export(chunks, fmt, out, brand_names)
+            stats["bytes"] = out.tell()
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, stats
+
+
+_tables = OrderedDict()
+_tables_bytes = 0
+_tables_lock = threading.Lock()
+
+
+def _rows_digest(brand_name: str, rows: Tuple[tuple, ...]) -> str:
+    digest = hashlib.blake2b(brand_name.encode("utf-8"), digest_size=16)
+    for number, date, content, graphic in rows:
+        digest.update(f"\x00\x00{number}\x00{date}\x00{content}\x00{graphic}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _build_enhanced_table(posts: List[Dict], rows: Tuple[tuple, ...], brand_name: str) -> "pd.DataFrame":
+    position = np.arange(1, len(posts) + 1)
+    numbers, dates, contents, graphics = zip(*rows) if rows else ((), (), (), ())
+    metrics = post_metrics.metrics_frame(posts)
+    reach_low = pd.Series(position * 1200 + 500).astype(str)
+    reach_high = pd.Series(position * 1500 + 800).astype(str)
+    return pd.DataFrame({
+        "Post Number": [f"#{number}" for number in numbers],
+        "Date": list(dates),
+        "Brand": brand_name,
+        "Content": list(contents),
+        "Graphic Concept": list(graphics),
+        "Character Count": metrics["char_count"],
+        "Hashtags": metrics["hashtag_count"],
+        "Mentions": metrics["mention_count"],
+        "Links": metrics["url_count"],
+        "Reading Time (s)": metrics["reading_time_s"],
+        "Estimated Reach": reach_low + "-" + reach_high,
+        "Best Time to Post": np.where(position % 2 == 1, "9:00 AM - 11:00 AM", "1:00 PM - 3:00 PM")
+    })
+
+
+def enhanced_export_data(posts: List[Dict], brand_name: str) -> "pd.DataFrame":
+    """
+    The "Enhanced CSV" table of generated posts: one row per post, with its
+    metrics and posting suggestions. Tables are cached by a digest of the
+    posts' number, date, content and graphic, so the returned DataFrame is
+    shared and must not be modified.
+    Args:
+        posts: Generated post dictionaries ('number', 'date', 'content', 'graphic')
+        brand_name: Brand shown in the Brand column
+    Returns:
+        pandas DataFrame
+    """
+    global _tables_bytes
+    rows = tuple((post.get('number', i), post.get('date', ''), post.get('content', ''), post.get('graphic', ''))
+                 for i, post in enumerate(posts, 1))
+    # Keyed by a digest, so the cache holds no copy of the posts' text besides the tables
+    key = _rows_digest(brand_name, rows)
+    with _tables_lock:
+        entry = _tables.get(key)
+        if entry is not None:
+            _tables.move_to_end(key)
+            return entry[0]
+    table = _build_enhanced_table(posts, rows, brand_name)
+    size = int(table.memory_usage(deep=True).sum())
+    if size > MAX_CACHED_TABLE_BYTES:
+        return table
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = (table, size)
+            _tables_bytes += size
+        while _tables_bytes > MAX_CACHED_TABLE_BYTES:
+            _, (_, dropped) = _tables.popitem(last=False)
+            _tables_bytes -= dropped
+    return table
@@ -0,0 +1,217 @@
+"""
+Hedged requests to cut tail latency.
+
+A hedged call starts the request normally. If no first token has arrived
+within a chosen percentile of the recent time-to-first-token for that
+operation and model, counted from when the request was actually sent (not
+while it waits in the rate limiter's queue), a duplicate request is
+started. Whichever finishes first wins and the other is cancelled: it
+leaves the limiter's queue, or its stream is closed. Hedging only kicks in
+once enough latency samples exist to compute the percentile.
+
+Hedging is off unless LLM_HEDGING=on, and applies to routes that set a
+`hedge_percentile` (see utils/model_router.py).
+"""
+import contextvars
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # Streamlit is optional for headless runs
+    add_script_run_ctx = get_script_run_ctx = None
+
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a request that lost the race and was cancelled."""
+
+
+class HedgeAttempt:
+    """One request of a hedged call: what it reports back, and how it is stopped when it loses."""
+
+    def __init__(self):
+        self.sent = threading.Event()
+        self.first_token = threading.Event()
+        self.cancelled = threading.Event()
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise HedgeCancelled once the other request has won."""
+        if self.cancelled.is_set():
+            raise HedgeCancelled()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            hooks = list(self._hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error closing a cancelled hedged request: {str(e)}")
+
+    @contextmanager
+    def closing(self, close: Callable):
+        """
+        Call `close` (e.g. closing the stream) as soon as this attempt loses,
+        even while it waits for its next token. A stream that ended or failed
+        because it was closed raises HedgeCancelled.
+        """
+        with self._lock:
+            cancelled = self.cancelled.is_set()
+            if not cancelled:
+                self._hooks.append(close)
+        if cancelled:
+            close()
+            raise HedgeCancelled()
+        try:
+            yield
+        except Exception:
+            self.check()
+            raise
+        finally:
+            with self._lock:
+                if close in self._hooks:
+                    self._hooks.remove(close)
+        self.check()
+
+
+def hedging_enabled() -> bool:
+    return os.environ.get("LLM_HEDGING", "off").lower() in ("1", "on", "true", "yes")
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples per key (operation and model)."""
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self._samples = {}
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+
+    def add(self, key: str, seconds: Optional[float]):
+        if seconds is None:
+            return
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self._max_samples)).append(seconds)
+
+    def percentile(self, key: str, pct: float, min_samples: int = MIN_SAMPLES) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgeStats:
+    """Counts calls, hedges fired and which request won, per key."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, key: str, field: str):
+        with self._lock:
+            counts = self._counts.setdefault(key, {"calls": 0, "hedges": 0, "hedge_wins": 0, "primary_wins": 0})
+            counts[field] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {key: dict(counts) for key, counts in self._counts.items()}
+
+
+_tracker = LatencyTracker()
+_stats = HedgeStats()
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    """Hedge counters per operation and model, e.g. {"refine_content:gpt-4o-mini": {...}}."""
+    return _stats.snapshot()
+
+
+def _start_thread(target):
+    # Carry context variables over, e.g. the current job (see utils/jobs.py)
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target,), daemon=True)
+    if add_script_run_ctx is not None and get_script_run_ctx() is not None:
+        # Let the request update Streamlit placeholders (e.g. the rate-limit queue notice)
+        add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return thread
+
+
+def run_hedged(key: str, request: Callable, percentile: Optional[float], record: Dict = None):
+    """
+    Run `request(attempt)`, hedging it when slow.
+    Args:
+        key: Latency bucket, usually "operation:model"
+        request: Callable performing the call, given a HedgeAttempt (None when
+                 not hedged). It must set `attempt.sent` once the request has
+                 left the rate limiter and `attempt.first_token` when the first
+                 token arrives, close its stream through `attempt.closing()`,
+                 and return an object with a `ttft` attribute
+        percentile: Recent time-to-first-token percentile after which to hedge;
+                    None disables hedging for this call
+        record: Optional telemetry record to note whether a hedge fired and won
+    Returns:
+        Result of the winning request
+    """
+    threshold = _tracker.percentile(key, percentile) if percentile and hedging_enabled() else None
+    _stats.count(key, "calls")
+    if threshold is None:
+        result = request(None)
+        _tracker.add(key, result.ttft)
+        return result
+
+    results = queue.Queue()
+    attempts = []
+
+    def start(label):
+        attempt = HedgeAttempt()
+
+        def run():
+            try:
+                results.put((label, request(attempt), None))
+            except BaseException as e:
+                results.put((label, None, e))
+            finally:
+                # Wake the waiter early when the request ends before it was sent or streamed
+                attempt.sent.set()
+                attempt.first_token.set()
+
+        attempts.append((label, attempt))
+        _start_thread(run)
+        return attempt
+
+    primary = start("primary")
+    # Time spent queued in the rate limiter doesn't count: a duplicate would only queue behind it
+    primary.sent.wait()
+    if not primary.first_token.wait(threshold) and results.empty():
+        start("hedge")
+        _stats.count(key, "hedges")
+        if record is not None:
+            record["hedged"] = 1
+
+    errors = []
+    for _ in range(len(attempts)):
+        label, result, error = results.get()
+        if error is not None:
+            errors.append(error)
+            continue
+        for other_label, attempt in attempts:
+            if other_label != label:
+                attempt.cancel()
+        if len(attempts) > 1:
+            _stats.count(key, "hedge_wins" if label == "hedge" else "primary_wins")
+            if record is not None:
+                record["hedge_won"] = 1 if label == "hedge" else 0
+        _tracker.add(key, result.ttft)
+        return result
+    raise errors[0]
@@ -0,0 +1,135 @@
+"""
+"Download all images": every selected post's image in one ZIP.
+
+Images are rendered by utils/post_image.py on a pool of worker processes
+(IMAGE_EXPORT_WORKERS, default up to 4), so a whole calendar renders in
+parallel without holding the GIL of the Streamlit server. Each PNG is
+written into the archive as soon as it comes back and then dropped, and
+the archive is written to a file (see utils/export.export_path) whose path
+the page keeps. st.download_button still reads the finished archive into
+memory while it is shown. Unchanged posts come straight from the image cache.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from . import post_image
+from .export import export_path
+
+DEFAULT_WORKERS = int(os.environ.get("IMAGE_EXPORT_WORKERS", min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render(item: Tuple[str, str, Optional[str], float]) -> bytes:
+    content, brand_name, date, scale = item
+    return post_image.post_image(content, brand_name, date, scale)
+
+
+def get_pool(workers: int = DEFAULT_WORKERS) -> ProcessPoolExecutor:
+    """The process-wide render pool, started on first use and kept for later exports."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Fresh interpreters rather than forks of the threaded Streamlit server
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def image_name(post: Dict, index: int, file_stem: str) -> str:
+    """File name of a post's image inside the archive, e.g. linkedin_calendar_03.png."""
+    number = str(post.get("number") or index + 1).strip()
+    return f"{file_stem}_{number.zfill(2)}.png"
+
+
+def archive_key(posts: List[Dict], brand_name: str, scale: float = 1.0) -> str:
+    """Hash of everything in the archive; it changes when any selected post does."""
+    digest = hashlib.sha1()
+    for post in posts:
+        digest.update(post_image.image_key(post.get("content", ""), brand_name, post.get("date"), scale).encode())
+    return digest.hexdigest()
+
+
+def write_images_zip(posts: List[Dict], brand_name: str, file_stem: str, out, scale: float = 1.0,
+                     workers: int = DEFAULT_WORKERS) -> Dict:
+    """
+    Render the posts' images and write them into a ZIP.
+    Args:
+        posts: Post dictionaries with 'content', 'date' and 'number'
+        brand_name: Brand shown on the images
+        file_stem: Prefix of the image file names
+        out: Writable binary file for the archive
+        scale: Image scale (see post_image.post_image)
+        workers: Render processes; 1 renders on the calling thread
+    Returns:
+        Render stats: images, rendered (not cached), seconds, images_per_s, workers
+    """
+    names = [image_name(post, i, file_stem) for i, post in enumerate(posts)]
+    items = [(post.get("content", ""), brand_name, post.get("date"), scale) for post in posts]
+    start = time.perf_counter()
+    # Cached images are read here; only the others go to the pool
+    cached = [post_image.is_cached(*item) for item in items]
+    misses = [item for item, hit in zip(items, cached) if not hit]
+    rendered = None
+    if workers > 1 and len(misses) > 1:
+        try:
+            chunksize = max(1, len(misses) // (workers * 4))
+            rendered = get_pool(workers).map(_render, misses, chunksize=chunksize)
+        except (BrokenProcessPool, OSError) as e:
+            print(f"Error starting image workers, rendering here instead: {str(e)}")
+            _reset_pool()
+    # PNGs are already compressed: store them as they are
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, item, hit in zip(names, items, cached):
+            png = None
+            if not hit and rendered is not None:
+                try:
+                    png = next(rendered)
+                except (BrokenProcessPool, OSError) as e:
+                    print(f"Error rendering images in worker processes, rendering here instead: {str(e)}")
+                    _reset_pool()
+                    rendered = None
+            if png is None:
+                png = _render(item)
+            archive.writestr(name, png)
+    seconds = time.perf_counter() - start
+    return {
+        "images": len(items),
+        "rendered": len(misses),
+        "seconds": seconds,
+        "images_per_s": len(items) / seconds if seconds > 0 else float(len(items)),
+        "workers": workers if rendered is not None else 1
+    }
+
+
+def images_zip_file(posts: List[Dict], brand_name: str, file_stem: str, scale: float = 1.0,
+                    workers: int = DEFAULT_WORKERS) -> Tuple[str, Dict]:
+    """
+    Write the posts' images into a ZIP file, for st.download_button.
+    Returns:
+        Tuple of (file path, render stats with `zip_bytes`); see export.export_file for the file's lifetime
+    """
+    path = export_path(".zip")
+    try:
+        with open(path, "wb") as out:
+            stats = write_images_zip(posts, brand_name, file_stem, out, scale, workers)
+            stats["zip_bytes"] = out.tell()
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, stats
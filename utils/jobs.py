@@ -0,0 +1,391 @@
+"""
+Background, cancellable, deadline-bound generation jobs.
+
+`submit` queues a function (e.g. generate_social_posts) and returns a job
+id straight away. A pool of worker threads runs the jobs, and the job store
+keeps their status, messages and results until the page picks them up, so
+the Streamlit script is never blocked by a generation.
+
+The job is reachable from inside that call through a context variable, so
+the OpenAI helpers in utils/openai.py can honour it. They stop waiting in
+the rate-limit queue, close an in-flight stream as soon as the job is
+cancelled, never let a request run past the job's deadline, and keep their
+user-facing messages on the job instead of writing to a page.
+
+Jobs belong to a Streamlit session. A reaper thread cancels the jobs of
+sessions that have been disconnected (e.g. a closed browser tab) for
+DISCONNECT_GRACE_S, so their tokens and workers are freed. Until then a
+new session of the same user can `adopt` the job, e.g. after a refresh.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # Streamlit is optional for headless runs
+    get_script_run_ctx = None
+
+DEFAULT_DEADLINE_S = float(os.environ.get("JOB_DEADLINE_S", 240))
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+REAPER_INTERVAL_S = 5.0
+DISCONNECT_GRACE_S = float(os.environ.get("JOB_DISCONNECT_GRACE_S", 120))
+FINISHED_JOB_TTL_S = 3600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = (
+    "queued", "running", "done", "failed", "cancelled", "timed_out"
+)
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job's call when the job was cancelled. Like
+    asyncio.CancelledError it is a BaseException, so the broad
+    `except Exception` handlers in the generation functions let it through.
+    """
+
+
+class JobTimedOut(JobCancelled):
+    """Raised inside a job's call once its deadline has passed."""
+
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class Job:
+    """One generation request with its cancel flag, deadline and outcome."""
+
+    def __init__(self, kind: str, session_id: Optional[str] = None, deadline_s: float = DEFAULT_DEADLINE_S,
+                 label: str = "", owner: Optional[str] = None, request: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label
+        self.session_id = session_id
+        self.owner = owner
+        self.request = request
+        self.deadline_s = deadline_s
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.note = ""
+        self.messages = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._deadline = None
+        self._cancel_reason = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Job({self.kind}, {self.id[:8]}, {self.status})"
+
+    @property
+    def done(self) -> bool:
+        return self._done_event.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None before the job starts."""
+        if self._deadline is None:
+            return None
+        return self._deadline - time.monotonic()
+
+    def elapsed(self) -> float:
+        end = self.finished_at or time.time()
+        return end - (self.started_at or end)
+
+    def notify(self, level: str, message: str):
+        """Keep a message (level is a Streamlit call, e.g. "warning") for the page to show."""
+        with self._lock:
+            self.messages.append((level, message))
+
+    def cancel(self, reason: str = "cancelled by user"):
+        """Ask the job to stop; in-flight streams are closed right away."""
+        with self._lock:
+            if self.done or self._cancel_event.is_set():
+                return
+            self._cancel_reason = reason
+            self._cancel_event.set()
+            hooks = list(self._hooks)
+            if self.status == QUEUED:
+                # Never started: finish it now rather than when a worker frees up
+                self.status, self.error = CANCELLED, reason
+                self.finished_at = time.time()
+                self._done_event.set()
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error aborting job {self.id}: {str(e)}")
+
+    def check(self):
+        """Raise if the job was cancelled or ran out of time."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self._cancel_reason)
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise JobTimedOut(f"deadline of {self.deadline_s:.0f}s exceeded")
+
+    def add_hook(self, hook: Callable):
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done_event.wait(timeout)
+
+    def run(self, fn: Callable, args: tuple, kwargs: Dict):
+        """Execute `fn` as this job, on the calling thread."""
+        with self._lock:
+            if self.done:
+                return
+            self.started_at = time.time()
+            self._deadline = time.monotonic() + self.deadline_s
+            self.status = RUNNING
+        token = _current_job.set(self)
+        try:
+            self.check()
+            self.result = fn(*args, **kwargs)
+            # The call may have swallowed the cancellation; report what happened
+            self.status = CANCELLED if self.cancelled else DONE
+        except JobTimedOut as e:
+            self.status, self.error = TIMED_OUT, str(e)
+        except JobCancelled as e:
+            self.status, self.error = CANCELLED, str(e) or self._cancel_reason
+        except Exception as e:
+            self.status, self.error = FAILED, str(e)
+        finally:
+            _current_job.reset(token)
+            self.finished_at = time.time()
+            self._done_event.set()
+
+
+def current_job() -> Optional[Job]:
+    """The job the calling code runs in, if any."""
+    return _current_job.get()
+
+
+def check_current_job():
+    """Raise JobCancelled / JobTimedOut if the current job should stop."""
+    job = _current_job.get()
+    if job is not None:
+        job.check()
+
+
+def remaining_time(timeout: Optional[float]) -> Optional[float]:
+    """Clamp a request timeout to what is left of the current job's deadline."""
+    job = _current_job.get()
+    remaining = job.remaining() if job is not None else None
+    if remaining is None:
+        return timeout
+    remaining = max(0.1, remaining)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+@contextmanager
+def abort_on_cancel(abort: Callable):
+    """
+    Call `abort` (e.g. stream.close) as soon as the current job is cancelled.
+    A stream that ended or failed because it was closed raises JobCancelled.
+    """
+    job = _current_job.get()
+    if job is None:
+        yield
+        return
+    job.add_hook(abort)
+    try:
+        yield
+    except Exception:
+        if job.cancelled:
+            job.check()
+        raise
+    finally:
+        job.remove_hook(abort)
+    if job.cancelled:
+        job.check()
+
+
+def current_session_id() -> Optional[str]:
+    """Streamlit session id of the calling script thread, if any."""
+    if get_script_run_ctx is None:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_active(session_id: str) -> bool:
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return True
+        return runtime.get_instance().is_active_session(session_id)
+    except Exception:
+        # Unknown Streamlit internals: never cancel on a guess
+        return True
+
+
+class JobStore:
+    """In-memory store of jobs by id. Finished jobs are kept for FINISHED_JOB_TTL_S."""
+
+    def __init__(self, ttl_s: float = FINISHED_JOB_TTL_S):
+        self.ttl_s = ttl_s
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: Job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def for_session(self, session_id: str) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def unfinished(self) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_s
+        for job_id in [j.id for j in self._jobs.values() if j.done and (j.finished_at or 0) < cutoff]:
+            del self._jobs[job_id]
+
+
+class JobManager:
+    """Queues jobs on a worker pool, keeps them in a job store and reaps disconnected sessions."""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self.store = JobStore()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def submit(self, fn: Callable, *args, kind: str = "generation", session_id: Optional[str] = None,
+               deadline_s: float = DEFAULT_DEADLINE_S, label: str = "", owner: Optional[str] = None,
+               request: Optional[Dict] = None, on_done: Optional[Callable[[Job], None]] = None, **kwargs) -> str:
+        """
+        Queue `fn(*args, **kwargs)` to run as a job on the worker pool.
+        Args:
+            fn: Function to run, e.g. generate_social_posts
+            kind: Job type, e.g. "calendar" or "article"
+            session_id: Streamlit session the job belongs to; defaults to the caller's
+            deadline_s: Seconds the job may run once a worker picks it up
+            label: Short description for the UI
+            owner: Optional user id, so another session of the user can adopt the job
+            request: Optional description of what was asked, handed to the adopting session
+            on_done: Optional callback receiving the job once it has run, on the worker
+                     thread, e.g. to persist the result while no page is watching
+        Returns:
+            The job id
+        """
+        job = Job(kind, session_id or current_session_id(), deadline_s, label, owner, request)
+        self.store.add(job)
+        # The job runs without the page's Streamlit context: it outlives reruns and reports through the store
+        self._pool.submit(self._run, job, fn, args, kwargs, on_done)
+        self._start_reaper()
+        return job.id
+
+    @staticmethod
+    def _run(job: Job, fn: Callable, args: tuple, kwargs: Dict, on_done: Optional[Callable]):
+        job.run(fn, args, kwargs)
+        if on_done is not None and job.started_at is not None:
+            try:
+                on_done(job)
+            except Exception as e:
+                print(f"Error finishing job {job.id}: {str(e)}")
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_forever, daemon=True, name="job-reaper")
+                self._reaper.start()
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str, reason: str = "cancelled by user") -> bool:
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel(reason)
+        return True
+
+    def jobs_for_session(self, session_id: str) -> List[Job]:
+        return self.store.for_session(session_id)
+
+    def cancel_session(self, session_id: str, reason: str = "session disconnected") -> int:
+        cancelled = 0
+        for job in self.jobs_for_session(session_id):
+            if not job.done:
+                job.cancel(reason)
+                cancelled += 1
+        return cancelled
+
+    def adopt(self, owner: Optional[str], kind: str, session_id: Optional[str] = None) -> Optional[Job]:
+        """
+        Move the newest unfinished `kind` job of `owner` whose session has
+        disconnected to this session, so it is shown and kept running.
+        Returns:
+            The adopted job, or None
+        """
+        if not owner:
+            return None
+        session_id = session_id or current_session_id()
+        with self._lock:
+            orphans = [job for job in self.store.unfinished()
+                       if job.owner == owner and job.kind == kind and job.session_id
+                       and job.session_id != session_id and not _session_active(job.session_id)]
+            if not orphans:
+                return None
+            job = max(orphans, key=lambda job: job.created_at)
+            job.session_id = session_id
+            return job
+
+    def _reap_forever(self):
+        disconnected = {}   # session id -> time.monotonic() it was first seen disconnected
+        while True:
+            time.sleep(REAPER_INTERVAL_S)
+            now = time.monotonic()
+            with self._lock:
+                sessions = {job.session_id for job in self.store.unfinished() if job.session_id}
+                for session_id in sessions:
+                    if _session_active(session_id):
+                        disconnected.pop(session_id, None)
+                    elif now - disconnected.setdefault(session_id, now) >= DISCONNECT_GRACE_S:
+                        count = self.cancel_session(session_id)
+                        print(f"Cancelled {count} jobs of disconnected session {session_id}")
+                for session_id in set(disconnected) - sessions:
+                    del disconnected[session_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> JobManager:
+    """Return the process-wide job manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,59 @@
+"""
+Lazy imports for heavy modules.
+
+    pd = lazy.load("pandas")
+
+binds `pd` to a stand-in that imports pandas on first attribute access,
+so a script run that never touches pandas (e.g. the login screen) never
+pays for importing it. After the first access the stand-in forwards to the
+real module. Run benchmarks/import_time.py to see what this saves.
+
+Only module-level attribute access is deferred: `from x import y` and
+`isinstance(obj, module.Type)` still need the module at that point.
+Set LAZY_IMPORTS=0 to import everything eagerly, e.g. as a baseline.
+"""
+import importlib
+import os
+import sys
+import threading
+import types
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """Module stand-in that imports the real module on first use."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def load(name: str) -> types.ModuleType:
+    """The module itself if it is already imported, else a LazyModule for it."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if os.environ.get("LAZY_IMPORTS", "1") == "0":
+        return importlib.import_module(name)
+    return LazyModule(name)
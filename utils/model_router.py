@@ -0,0 +1,175 @@
+"""
+Per-operation model routing with failover.
+
+Each operation in utils/openai.py names a route. A route lists the models to
+try in order and a request timeout. `timeout_s` is a deadline for each
+model's whole streamed answer, counted from when the request is sent (time
+spent queued in the rate limiter doesn't count). When a model errors or
+times out the next one is tried. A model that has recently been slow (EWMA
+latency above the route's `slow_after_s`) or has failed repeatedly is moved
+to the back of the list until it recovers. A 429 that is still there after
+the rate limiter's retries also moves on to the next model, since limits
+are per model, but doesn't count against the model's health: it says the
+API key is busy, not that the model is. Routes with a `hedge_percentile`
+are hedged when LLM_HEDGING=on (see utils/hedging.py).
+
+The defaults can be overridden with the MODEL_ROUTES environment variable,
+either inline JSON or a path to a JSON file, e.g.
+
+    MODEL_ROUTES='{"refine_content": {"models": ["gpt-4o-mini"], "timeout_s": 20}}'
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from . import lazy
+
+httpx = lazy.load("httpx")
+openai = lazy.load("openai")
+
+DEFAULT_ROUTES = {
+    "generate_social_posts": {"models": ["gpt-4-turbo", "gpt-4o"], "timeout_s": 120, "slow_after_s": 90},
+    "fill_missing_posts": {"models": ["gpt-4-turbo", "gpt-4o"], "timeout_s": 90, "slow_after_s": 60,
+                           "hedge_percentile": 90},
+    "article_to_posts": {"models": ["gpt-4o", "gpt-4-turbo"], "timeout_s": 120, "slow_after_s": 90},
+    # Only models that support the web_search_preview tool
+    "article_to_posts_web": {"models": ["gpt-4o", "gpt-4o-mini"], "timeout_s": 150, "slow_after_s": 120},
+    "refine_content": {"models": ["gpt-4o-mini", "gpt-4-turbo"], "timeout_s": 30, "slow_after_s": 15,
+                       "hedge_percentile": 90},
+}
+
+_EWMA_WEIGHT = 0.3
+_FAILURE_COOLDOWN_S = 60
+_FAILURES_BEFORE_COOLDOWN = 2
+
+
+def _load_overrides() -> Dict:
+    raw = os.environ.get("MODEL_ROUTES", "").strip()
+    if not raw:
+        return {}
+    try:
+        if raw.startswith("{"):
+            return json.loads(raw)
+        with open(raw, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading MODEL_ROUTES, using default routes: {str(e)}")
+        return {}
+
+
+class ModelRouter:
+    """Picks models per operation and tracks their recent latency and failures."""
+
+    def __init__(self, routes: Dict = None):
+        self.routes = {name: dict(route) for name, route in DEFAULT_ROUTES.items()}
+        for name, route in (routes if routes is not None else _load_overrides()).items():
+            self.routes[name] = {**self.routes.get(name, {}), **route}
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._failures = {}
+        self._cooldown_until = {}
+
+    def get_route(self, operation: str) -> Dict:
+        if operation not in self.routes:
+            raise KeyError(f"No model route configured for '{operation}'")
+        return self.routes[operation]
+
+    def ordered_models(self, operation: str) -> List[str]:
+        """Models for `operation`, with slow or failing ones moved to the back."""
+        route = self.get_route(operation)
+        slow_after = route.get("slow_after_s")
+        now = time.monotonic()
+        healthy, degraded = [], []
+        with self._lock:
+            for model in route["models"]:
+                cooling_down = self._cooldown_until.get(model, 0) > now
+                too_slow = slow_after is not None and self._latency.get(model, 0) > slow_after
+                (degraded if cooling_down or too_slow else healthy).append(model)
+        return healthy + degraded
+
+    def observe(self, model: str, latency_s: float, ok: bool):
+        """Feed the outcome of a call back into the model's health."""
+        with self._lock:
+            if ok:
+                previous = self._latency.get(model)
+                self._latency[model] = latency_s if previous is None else (
+                    _EWMA_WEIGHT * latency_s + (1 - _EWMA_WEIGHT) * previous
+                )
+                self._failures[model] = 0
+                self._cooldown_until.pop(model, None)
+            else:
+                self._failures[model] = self._failures.get(model, 0) + 1
+                if self._failures[model] >= _FAILURES_BEFORE_COOLDOWN:
+                    self._cooldown_until[model] = time.monotonic() + _FAILURE_COOLDOWN_S
+
+    def call(self, operation: str, request: Callable, on_attempt: Callable = None):
+        """
+        Run `request(model, timeout_s)` on the route's models until one succeeds.
+        Args:
+            operation: Route name
+            request: Callable performing the API call for a given model; it must give up
+                     after `timeout_s` seconds in total, not per read
+            on_attempt: Optional callback receiving (model, error or None) per attempt
+        Returns:
+            Tuple of (model that answered, request result)
+        """
+        route = self.get_route(operation)
+        last_error = None
+        for model in self.ordered_models(operation):
+            start = time.perf_counter()
+            try:
+                result = request(model, route.get("timeout_s"))
+            except (openai.AuthenticationError, openai.PermissionDeniedError):
+                # Another model would fail the same way: raise immediately
+                raise
+            except openai.RateLimitError as e:
+                # The key is out of capacity for this model; not a sign the model is unhealthy
+                if on_attempt:
+                    on_attempt(model, e)
+                print(f"Model {model} is rate limited for {operation}, trying the next model: {str(e)}")
+                last_error = e
+                continue
+            except (openai.APIError, httpx.TransportError) as e:
+                self.observe(model, time.perf_counter() - start, ok=False)
+                if on_attempt:
+                    on_attempt(model, e)
+                print(f"Model {model} failed for {operation}, trying the next model: {str(e)}")
+                last_error = e
+                continue
+            self.observe(model, getattr(result, "latency", None) or time.perf_counter() - start, ok=True)
+            if on_attempt:
+                on_attempt(model, None)
+            return model, result
+        raise last_error
+
+    def describe(self) -> List[Dict]:
+        """Routing table with current model health, for display and telemetry."""
+        rows = []
+        now = time.monotonic()
+        for operation, route in sorted(self.routes.items()):
+            with self._lock:
+                latencies = {m: round(self._latency[m], 2) for m in route["models"] if m in self._latency}
+                cooling = [m for m in route["models"] if self._cooldown_until.get(m, 0) > now]
+            rows.append({
+                "operation": operation,
+                "models": " > ".join(self.ordered_models(operation)),
+                "timeout_s": route.get("timeout_s"),
+                "ewma_latency_s": json.dumps(latencies) if latencies else "",
+                "cooling_down": ", ".join(cooling)
+            })
+        return rows
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -1,20 +1,474 @@
-import openai
+import os
 from datetime import datetime
 import calendar
+import contextlib
+import logging
 import re
+import socket
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
 import streamlit as st
-import pandas as pd 
-import openai
-import re
-import streamlit as st
+from .rate_limit import call_with_rate_limit, estimate_tokens
+from . import prompts
+from . import telemetry
+from . import model_router
+from . import hedging
+from . import similarity
+from . import examples as brand_examples
+from . import article_fetch
+from . import jobs
+from . import post_metrics
+from . import lazy
+
+logger = logging.getLogger(__name__)
+
+openai = lazy.load("openai")
+
+
+def _show(level, message):
+    """Show a message on the page, or keep it on the current job when running in the background."""
+    job = jobs.current_job()
+    if job is not None:
+        job.notify(level, message)
+    else:
+        getattr(st, level)(message)
+
+
+class _QueueNotice:
+    """Shows the caller's position while a request waits for rate-limit capacity."""
+
+    def __init__(self):
+        self._placeholder = None
+        self._job = jobs.current_job()
+
+    def __call__(self, position, wait_seconds):
+        message = f"⏳ Waiting for OpenAI capacity: you are #{position} in the queue (about {wait_seconds:.0f}s)"
+        if self._job is not None:
+            self._job.note = message
+            return
+        if self._placeholder is None:
+            self._placeholder = st.empty()
+        self._placeholder.info(message)
+
+    def clear(self):
+        if self._job is not None:
+            self._job.note = ""
+        elif self._placeholder is not None:
+            self._placeholder.empty()
+
+
+def _client(api_key, timeout=None):
+    """
+    Create an OpenAI client. Retries are left to the shared rate limiter and model router.
+    Set OPENAI_BASE_URL to point at another endpoint, e.g. mock_openai_server.py.
+    """
+    return openai.OpenAI(api_key=api_key, max_retries=0, timeout=timeout,
+                         base_url=os.environ.get("OPENAI_BASE_URL") or None)
+
+
+def _rate_limited(api_key, estimated_tokens, request, record=None, on_queue=None, hedge=None):
+    """Send a request through the shared per-key limiter, showing queue position in the UI."""
+    notice = on_queue or _QueueNotice()
+
+    def count_retry(attempt, delay):
+        if record is not None:
+            record["retries"] = attempt
+
+    def abort():
+        jobs.check_current_job()
+        # A hedged duplicate that lost while still queued leaves the queue
+        if hedge is not None:
+            hedge.check()
+
+    try:
+        return call_with_rate_limit(api_key, estimated_tokens, request, on_queue=notice, on_retry=count_retry,
+                                    abort=abort)
+    finally:
+        if isinstance(notice, _QueueNotice):
+            notice.clear()
+
+
+def _check_cancelled(stream, hedge):
+    """Close the stream and stop when a hedged duplicate has already won or the job was cancelled."""
+    if hedge is not None and hedge.cancelled.is_set():
+        stream.close()
+        raise hedging.HedgeCancelled()
+    job = jobs.current_job()
+    if job is not None:
+        try:
+            job.check()
+        except jobs.JobCancelled:
+            stream.close()
+            raise
+
+
+def _close_stream(stream):
+    """
+    Close a stream from another thread. Closing alone only takes effect when
+    the next chunk arrives, so the socket is shut down first to wake a read
+    that is waiting for it.
+    """
+    network_stream = stream.response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    stream.close()
+
+
+@contextlib.contextmanager
+def _deadline(stream, close, timeout, start):
+    """
+    Close the stream once `timeout` seconds have passed since `start` and
+    raise openai.APITimeoutError. The client's timeout only bounds each read,
+    so a stream that keeps trickling in would otherwise run far past it.
+    """
+    if timeout is None:
+        yield
+        return
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        close()
+
+    timer = threading.Timer(max(0.0, timeout - (time.perf_counter() - start)), expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    except Exception as e:
+        if expired.is_set():
+            raise openai.APITimeoutError(request=stream.response.request) from e
+        raise
+    finally:
+        timer.cancel()
+    if expired.is_set():
+        raise openai.APITimeoutError(request=stream.response.request)
+
+
+def _hedge_sent(hedge):
+    """Start a hedged request's threshold now that the rate limiter has let it through."""
+    if hedge is not None:
+        hedge.check()
+        hedge.sent.set()
+
+
+def _hedge_closing(hedge, close):
+    """Close the stream as soon as a hedged duplicate wins (see hedging.HedgeAttempt)."""
+    return hedge.closing(close) if hedge is not None else contextlib.nullcontext()
+
+
+def _stream_chat(api_key, model, messages, temperature, max_tokens, timeout=None, hedge=None):
+    """Stream a chat completion within `timeout` seconds, collecting its text, usage and time to first token."""
+    start = time.perf_counter()
+    timeout = jobs.remaining_time(timeout)
+    client = _client(api_key, timeout)
+    _hedge_sent(hedge)
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts, usage, ttft = [], None, None
+    close = partial(_close_stream, stream)
+    with _deadline(stream, close, timeout, start), jobs.abort_on_cancel(close), _hedge_closing(hedge, close):
+        for chunk in stream:
+            _check_cancelled(stream, hedge)
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    if hedge is not None:
+                        hedge.first_token.set()
+                parts.append(chunk.choices[0].delta.content)
+    return SimpleNamespace(content="".join(parts), usage=usage, ttft=ttft, latency=time.perf_counter() - start)
+
+
+def _stream_response(api_key, model, instructions, input_text, tools, temperature, timeout=None, hedge=None):
+    """Stream a Responses API call within `timeout` seconds, collecting its text, usage and time to first token."""
+    start = time.perf_counter()
+    timeout = jobs.remaining_time(timeout)
+    client = _client(api_key, timeout)
+    _hedge_sent(hedge)
+    stream = client.responses.create(
+        model=model,
+        tools=tools,
+        instructions=instructions,
+        input=input_text,
+        temperature=temperature,
+        stream=True
+    )
+    parts, usage, ttft = [], None, None
+    close = partial(_close_stream, stream)
+    with _deadline(stream, close, timeout, start), jobs.abort_on_cancel(close), _hedge_closing(hedge, close):
+        for event in stream:
+            _check_cancelled(stream, hedge)
+            if event.type == "response.output_text.delta":
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    if hedge is not None:
+                        hedge.first_token.set()
+                parts.append(event.delta)
+            elif event.type == "response.completed":
+                usage = event.response.usage
+    return SimpleNamespace(content="".join(parts), usage=usage, ttft=ttft, latency=time.perf_counter() - start)
+
+
+def _record_result(record, model, result):
+    """Copy model, first-token latency and token usage of a finished call onto its telemetry record."""
+    if record is None:
+        return
+    record["model"] = model
+    record["ttft_s"] = round(result.ttft, 3) if result.ttft is not None else None
+    record.update(usage_counts(result.usage))
+
+
+def _hedge_percentile(operation):
+    """Time-to-first-token percentile after which `operation` is hedged, if configured."""
+    return model_router.get_router().get_route(operation).get("hedge_percentile")
+
+
+def _routed(operation, request, record=None):
+    """Run `request(model, timeout)` through the model router, noting the route on the record."""
+    attempted = []
+
+    def note_attempt(model, error):
+        attempted.append(model)
+        if record is not None:
+            record["attempted_models"] = " > ".join(attempted)
+
+    def attempt(model, timeout):
+        # Don't fail over to the next model once the job was cancelled or timed out
+        jobs.check_current_job()
+        return request(model, timeout)
+
+    if record is not None:
+        record["route"] = operation
+    return model_router.get_router().call(operation, attempt, on_attempt=note_attempt)
+
+
+def _chat_completion(api_key, operation, messages, temperature, max_tokens, record=None, on_queue=None):
+    """
+    Rate-limited, streamed chat completion on the model routed for `operation`.
+    Returns:
+        The completion text
+    """
+    estimated = estimate_tokens("".join(m["content"] for m in messages), max_tokens)
+
+    def request(model, timeout):
+        def attempt(hedge):
+            return _rate_limited(
+                api_key, estimated,
+                lambda: _stream_chat(api_key, model, messages, temperature, max_tokens, timeout, hedge),
+                record=record,
+                on_queue=on_queue,
+                hedge=hedge
+            )
+        return hedging.run_hedged(f"{operation}:{model}", attempt, _hedge_percentile(operation), record)
+
+    model, result = _routed(operation, request, record)
+    _record_result(record, model, result)
+    return result.content
+
+
+def _response_completion(api_key, operation, messages, tools, temperature, max_tokens, record=None, on_queue=None):
+    """
+    Rate-limited, streamed Responses API call using the system message as instructions.
+    Returns:
+        The output text
+    """
+    instructions, input_text = messages[0]["content"], messages[1]["content"]
+    estimated = estimate_tokens(instructions + input_text, max_tokens)
+
+    def request(model, timeout):
+        def attempt(hedge):
+            return _rate_limited(
+                api_key, estimated,
+                lambda: _stream_response(api_key, model, instructions, input_text, tools, temperature, timeout,
+                                         hedge),
+                record=record,
+                on_queue=on_queue,
+                hedge=hedge
+            )
+        return hedging.run_hedged(f"{operation}:{model}", attempt, _hedge_percentile(operation), record)
+
+    model, result = _routed(operation, request, record)
+    _record_result(record, model, result)
+    return result.content
+
+
+def usage_counts(usage):
+    """
+    Token usage of a Chat Completions or Responses API call.
+    Returns:
+        Dict with prompt, completion and cached token counts (None when unknown)
+    """
+    if usage is None:
+        return {"prompt_tokens": None, "completion_tokens": None, "cached_tokens": None}
+
+    # Chat Completions uses prompt/completion, the Responses API uses input/output
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = getattr(usage, "input_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if completion_tokens is None:
+        completion_tokens = getattr(usage, "output_tokens", None)
+    details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) if details else None
+
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cached_tokens": cached_tokens}
+
+
+def _report_usage(record):
+    """Show how much of the prompt was served from the provider's prompt cache (also in the telemetry record)."""
+    if record.get("prompt_tokens") is None:
+        return
+    cached = record.get("cached_tokens") or 0
+    share = cached / record["prompt_tokens"] * 100 if record["prompt_tokens"] else 0
+    message = (f"🧾 {record['prompt_tokens']} prompt tokens ({cached} cached, {share:.0f}%) · "
+               f"{record['completion_tokens']} completion tokens · prompt {prompts.PROMPT_VERSION}")
+    _show("caption", message)
+
+
+RATE_LIMIT_MESSAGE = "OpenAI rate limit reached. Too many requests are in flight for this API key; please try again in a minute."
+
+PLACEHOLDER_CONTENT = "Post {number} content was not generated properly. Please try regenerating or refining the content."
+_PLACEHOLDER_PATTERN = re.compile(r"^Post \d+ content was not generated properly\.")
+
+
+def parse_calendar_posts(content):
+    """Parse a calendar completion into post dictionaries."""
+    # Parse the generated posts with improved regex
+    posts = []
+
+    # Split by POST # to handle formatting variations
+    post_sections = re.split(r'\n*POST #(\d+)', content)[1:]  # Skip first empty element
+
+    for i in range(0, len(post_sections), 2):
+        if i + 1 < len(post_sections):
+            post_num = post_sections[i].strip()
+            post_content = post_sections[i + 1].strip()
+
+            # Extract date and content
+            lines = post_content.split('\n')
+
+            # Find the date line (should contain " - " after POST #)
+            date_line = ""
+            content_start = 0
+
+            for idx, line in enumerate(lines):
+                if ' - ' in line and any(month in line for month in calendar.month_name[1:]):
+                    date_line = line.split(' - ', 1)[1] if ' - ' in line else line
+                    content_start = idx + 1
+                    break
+                elif line.strip() and not line.startswith('POST #'):
+                    # If no clear date found, use first non-empty line as date
+                    date_line = line.strip()
+                    content_start = idx + 1
+                    break
+
+            # Extract post content and graphic
+            remaining_content = '\n'.join(lines[content_start:])
+
+            # Split by GRAPHIC: to separate post content from graphic description
+            parts = re.split(r'\n\s*GRAPHIC:\s*\n?', remaining_content, flags=re.IGNORECASE)
+
+            post_text = parts[0].strip()
+            graphic_desc = parts[1].strip() if len(parts) > 1 else "No graphic suggestion provided."
+
+            # Clean up any remaining POST # references in the content
+            post_text = re.sub(r'^POST #\d+.*?\n', '', post_text, flags=re.MULTILINE).strip()
+
+            posts.append({
+                "number": post_num,
+                "date": date_line,
+                "content": post_text,
+                "graphic": graphic_desc,
+                "selected": True,
+                "feedback": "",
+                "post_feedback": "",
+                "graphic_feedback": ""
+            })
+
+    # If parsing failed, try alternative method
+    if len(posts) == 0:
+        _show("warning", "Primary parsing failed, trying alternative method...")
+
+        # Alternative parsing: split by double newlines and look for patterns
+        sections = content.split('\n\n')
+        current_post = {}
+
+        for section in sections:
+            section = section.strip()
+            if not section:
+                continue
+
+            # Check if this is a post header
+            post_match = re.match(r'POST #(\d+)\s*-\s*(.*?):', section)
+            if post_match:
+                # Save previous post if exists
+                if current_post and 'content' in current_post:
+                    posts.append({
+                        "number": current_post.get('number', str(len(posts) + 1)),
+                        "date": current_post.get('date', ''),
+                        "content": current_post.get('content', ''),
+                        "graphic": current_post.get('graphic', 'No graphic suggestion provided.'),
+                        "selected": True,
+                        "feedback": "",
+                        "post_feedback": "",
+                        "graphic_feedback": ""
+                    })
+
+                # Start new post
+                current_post = {
+                    'number': post_match.group(1),
+                    'date': post_match.group(2),
+                    'content': '',
+                    'graphic': ''
+                }
+            elif section.upper().startswith('GRAPHIC:'):
+                current_post['graphic'] = section[8:].strip()
+            elif 'content' in current_post:
+                if current_post['content']:
+                    current_post['content'] += '\n\n' + section
+                else:
+                    current_post['content'] = section
+
+        # Don't forget the last post
+        if current_post and 'content' in current_post:
+            posts.append({
+                "number": current_post.get('number', str(len(posts) + 1)),
+                "date": current_post.get('date', ''),
+                "content": current_post.get('content', ''),
+                "graphic": current_post.get('graphic', 'No graphic suggestion provided.'),
+                "selected": True,
+                "feedback": "",
+                "post_feedback": "",
+                "graphic_feedback": ""
+            })
+    
+    return post_metrics.attach_all(posts)
 
 
 def generate_social_posts(brand_data, focus, posts_per_month, 
-                         special_events, api_key):
-    """Generate social media posts using OpenAI."""
+                         special_events, api_key, saved_posts=None, regenerate_duplicates=False):
+    """
+    Generate social media posts using OpenAI.
+    
+    Posts that nearly repeat the brand's example posts or `saved_posts` are
+    flagged with a 'near_duplicate' entry, and regenerated once when
+    `regenerate_duplicates` is set.
+    """
     try:
-        openai.api_key = api_key
-        
         # Get current month name and year
         now = datetime.now()
         current_month = calendar.month_name[now.month]
@@ -29,169 +483,43 @@ def generate_social_posts(brand_data, focus, posts_per_month,
         # Double the requested number as specified in requirements
         num_posts = posts_per_month * 2
         
-        # Create a tailored prompt using brand data
-        system_prompt = f"""You are an expert social media copywriter specializing in creating engaging content.
-        Generate exactly {num_posts} unique LinkedIn posts for {brand_data['name']} for {current_month} {current_year}.
-        
-        Brand voice: {brand_data['brand_voice']}
-        How they portray themselves: {brand_data['portrayal']}
-        Primary focus: {focus}
-        Special events to highlight: {special_events}
-        Overall tone/voice: {brand_data['overall_voice']}
-        Brand phrases to include when appropriate: {brand_data['brand_phrases']}
-        Website: {brand_data.get('website', 'N/A')}
-        
-        Only schedule posts on weekdays. Create posts that are different from these examples:
-        {brand_data['previous_posts']}
-        
-        IMPORTANT: Format each post EXACTLY as shown below. Use this exact format for ALL {num_posts} posts:
-
-        POST #1 - [Weekday, Month Day, Year]:
-        [LinkedIn post content here]
-
-        GRAPHIC:
-        [Brief description of graphic concept and remember that images may be limited, it may have to be a simple graphic or text-based image]
-
-        POST #2 - [Weekday, Month Day, Year]:
-        [LinkedIn post content here]
-
-        GRAPHIC:
-        [Brief description of graphic concept and remember that images may be limited, it may have to be a simple graphic or text-based image]
-
-        Continue this pattern for all {num_posts} posts. Make sure each post is clearly separated and numbered consecutively.
-        """
-        
-        response = openai.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Generate exactly {num_posts} LinkedIn posts for {brand_data['name']} focusing on {focus}. Use the exact format specified in the system prompt."}
-            ],
-            temperature=0.7,
-            max_tokens=3000  # Increased token limit for more posts
+        # Stable brand prefix first, per-request values last, so prompt caching can hit
+        # Only the example posts relevant to this request, within a fixed token budget
+        examples = brand_examples.select_examples(brand_data, f"{focus}\n{special_events or ''}", api_key=api_key)
+        messages = prompts.calendar_messages(
+            brand_data, focus, num_posts, special_events, current_month, current_year, examples
         )
         
-        # Extract the content from the response
-        content = response.choices[0].message.content
-        
-        # Debug: Print the raw content to help troubleshoot
-        # st.write("**Debug - Raw AI Response:**")
-        # st.text(content[:500] + "..." if len(content) > 500 else content)
-        
-        # Parse the generated posts with improved regex
-        posts = []
-        
-        # Split by POST # to handle formatting variations
-        post_sections = re.split(r'\n*POST #(\d+)', content)[1:]  # Skip first empty element
-        
-        for i in range(0, len(post_sections), 2):
-            if i + 1 < len(post_sections):
-                post_num = post_sections[i].strip()
-                post_content = post_sections[i + 1].strip()
-                
-                # Extract date and content
-                lines = post_content.split('\n')
-                
-                # Find the date line (should contain " - " after POST #)
-                date_line = ""
-                content_start = 0
-                
-                for idx, line in enumerate(lines):
-                    if ' - ' in line and any(month in line for month in calendar.month_name[1:]):
-                        date_line = line.split(' - ', 1)[1] if ' - ' in line else line
-                        content_start = idx + 1
-                        break
-                    elif line.strip() and not line.startswith('POST #'):
-                        # If no clear date found, use first non-empty line as date
-                        date_line = line.strip()
-                        content_start = idx + 1
-                        break
-                
-                # Extract post content and graphic
-                remaining_content = '\n'.join(lines[content_start:])
-                
-                # Split by GRAPHIC: to separate post content from graphic description
-                parts = re.split(r'\n\s*GRAPHIC:\s*\n?', remaining_content, flags=re.IGNORECASE)
-                
-                post_text = parts[0].strip()
-                graphic_desc = parts[1].strip() if len(parts) > 1 else "No graphic suggestion provided."
-                
-                # Clean up any remaining POST # references in the content
-                post_text = re.sub(r'^POST #\d+.*?\n', '', post_text, flags=re.MULTILINE).strip()
-                
-                posts.append({
-                    "number": post_num,
-                    "date": date_line,
-                    "content": post_text,
-                    "graphic": graphic_desc,
-                    "selected": True,
-                    "feedback": "",
-                    "post_feedback": "",
-                    "graphic_feedback": ""
-                })
-        
-        # If parsing failed, try alternative method
-        if len(posts) == 0:
-            st.warning("Primary parsing failed, trying alternative method...")
-            
-            # Alternative parsing: split by double newlines and look for patterns
-            sections = content.split('\n\n')
-            current_post = {}
+        with telemetry.track("generate_social_posts", requested_posts=num_posts) as record:
+            record["prompt_version"] = prompts.PROMPT_VERSION
+            content = _chat_completion(
+                api_key,
+                "generate_social_posts",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=3000,  # Increased token limit for more posts
+                record=record
+            )
             
-            for section in sections:
-                section = section.strip()
-                if not section:
-                    continue
-                    
-                # Check if this is a post header
-                post_match = re.match(r'POST #(\d+)\s*-\s*(.*?):', section)
-                if post_match:
-                    # Save previous post if exists
-                    if current_post and 'content' in current_post:
-                        posts.append({
-                            "number": current_post.get('number', str(len(posts) + 1)),
-                            "date": current_post.get('date', ''),
-                            "content": current_post.get('content', ''),
-                            "graphic": current_post.get('graphic', 'No graphic suggestion provided.'),
-                            "selected": True,
-                            "feedback": "",
-                            "post_feedback": "",
-                            "graphic_feedback": ""
-                        })
-                    
-                    # Start new post
-                    current_post = {
-                        'number': post_match.group(1),
-                        'date': post_match.group(2),
-                        'content': '',
-                        'graphic': ''
-                    }
-                elif section.upper().startswith('GRAPHIC:'):
-                    current_post['graphic'] = section[8:].strip()
-                elif 'content' in current_post:
-                    if current_post['content']:
-                        current_post['content'] += '\n\n' + section
-                    else:
-                        current_post['content'] = section
+            # Debug: Print the raw content to help troubleshoot
+            # st.write("**Debug - Raw AI Response:**")
+            # st.text(content[:500] + "..." if len(content) > 500 else content)
             
-            # Don't forget the last post
-            if current_post and 'content' in current_post:
-                posts.append({
-                    "number": current_post.get('number', str(len(posts) + 1)),
-                    "date": current_post.get('date', ''),
-                    "content": current_post.get('content', ''),
-                    "graphic": current_post.get('graphic', 'No graphic suggestion provided.'),
-                    "selected": True,
-                    "feedback": "",
-                    "post_feedback": "",
-                    "graphic_feedback": ""
-                })
+            posts = parse_calendar_posts(content)
+            record["parsed_posts"] = len(posts)
+        _report_usage(record)
         
-        st.success(f"Successfully parsed {len(posts)} posts out of expected {num_posts}")
-        return posts
+        _show("success", f"Successfully parsed {len(posts)} posts out of expected {num_posts}")
+        return _check_near_duplicates(
+            posts, num_posts, brand_data, api_key, saved_posts, regenerate_duplicates,
+            mode="calendar", focus=focus, special_events=special_events
+        )
         
+    except openai.RateLimitError:
+        _show("error", f"Error generating posts: {RATE_LIMIT_MESSAGE}")
+        return []
     except Exception as e:
-        st.error(f"Error generating posts: {str(e)}")
+        _show("error", f"Error generating posts: {str(e)}")
         return []
 
 
@@ -210,8 +538,6 @@ def refine_content(post, feedback, api_key, refine_post=True, refine_graphic=Tru
         dict: Updated post object with refined content
     """
     try:
-        openai.api_key = api_key
-        
         # Determine what to refine based on checkboxes
         if refine_post and refine_graphic:
             # Refine both post and graphic
@@ -275,18 +601,21 @@ def refine_content(post, feedback, api_key, refine_post=True, refine_graphic=Tru
             # Neither checkbox selected - return original post
             return post
         
-        response = openai.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
+        with telemetry.track("refine_content") as record:
+            revised_text = _chat_completion(
+                api_key,
+                "refine_content",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.7,
+                max_tokens=1000,
+                record=record
+            )
         
         # Parse the response based on what was refined
-        revised_text = response.choices[0].message.content.strip()
+        revised_text = revised_text.strip()
         
         # Create updated post object
         updated_post = {
@@ -319,277 +648,170 @@ def refine_content(post, feedback, api_key, refine_post=True, refine_graphic=Tru
             # Only update graphic concept
             updated_post['graphic'] = revised_text
         
-        return updated_post
+        return post_metrics.attach(updated_post)
         
+    except openai.RateLimitError:
+        _show("error", f"Error refining content: {RATE_LIMIT_MESSAGE}")
+        return post
     except Exception as e:
-        st.error(f"Error refining content: {str(e)}")
+        _show("error", f"Error refining content: {str(e)}")
         return post
 
-def article_to_posts(article_text=None, website_url=None, num_posts=3, brand_data=None, api_key=None):
-    """Generate LinkedIn posts based on an article text and/or website URL."""
+def parse_article_posts(content, num_posts):
+    """Parse an article completion into post dictionaries (without placeholder padding)."""
+    # Parse the generated posts with improved regex
+    posts = []
+    # Updated pattern to be more flexible with whitespace and formatting
+    pattern = r'POST #(\d+):\s*(.*?)(?:\s*GRAPHIC:\s*(.*?))?(?=\s*POST #\d+:|$)'
+    matches = re.finditer(pattern, content, re.DOTALL | re.IGNORECASE)
+
+    for match in matches:
+        post_num = match.group(1)
+        post_content = match.group(2).strip() if match.group(2) else ""
+        graphic_desc = match.group(3).strip() if match.group(3) else "Simple, clean graphic that complements the post content"
+
+        # Clean up post content - remove any trailing GRAPHIC: text that might have been included
+        post_content = re.sub(r'\s*GRAPHIC:\s*.*$', '', post_content, flags=re.DOTALL | re.IGNORECASE).strip()
+
+        # Remove markdown formatting (** bold markers)
+        post_content = re.sub(r'\*\*(.*?)\*\*', r'\1', post_content)  # Remove **text**
+        post_content = re.sub(r'\*(.*?)\*', r'\1', post_content)      # Remove *text*
+        post_content = post_content.replace('**', '').replace('*', '') # Remove any remaining asterisks
+
+        # Clean up graphic description too
+        graphic_desc = re.sub(r'\*\*(.*?)\*\*', r'\1', graphic_desc)
+        graphic_desc = re.sub(r'\*(.*?)\*', r'\1', graphic_desc)
+        graphic_desc = graphic_desc.replace('**', '').replace('*', '')
+
+        posts.append({
+            "number": post_num,
+            "date": "",  # No date required for article-based posts
+            "content": post_content,
+            "graphic": graphic_desc,
+            "selected": True,
+            "feedback": "",
+            "post_feedback": "",
+            "graphic_feedback": "",
+            "refine_post": False,
+            "refine_graphic": False
+        })
+
+    logger.debug("Parsed %d posts from response", len(posts))
+    for i, post in enumerate(posts):
+        logger.debug("Post %d: %s...", i + 1, post['content'][:100])
+
+    # If no posts were parsed or we got fewer than expected, try alternative parsing
+    if len(posts) < num_posts:
+        logger.debug("Trying alternative parsing method")
+
+        # Try splitting by POST # and processing each section
+        alt_posts = []
+        post_sections = re.split(r'POST #\d+:', content, flags=re.IGNORECASE)
+
+        # Skip the first section (it's before the first POST #)
+        for i, section in enumerate(post_sections[1:], 1):
+            section = section.strip()
+            if section:
+                # Split by GRAPHIC: if present
+                parts = re.split(r'\s*GRAPHIC:\s*', section, flags=re.IGNORECASE)
+                post_content = parts[0].strip()
+                graphic_content = parts[1].strip() if len(parts) > 1 else "Simple, clean graphic that complements the post content"
+
+                if post_content:
+                    # Clean markdown formatting from alternative parsing too
+                    post_content = re.sub(r'\*\*(.*?)\*\*', r'\1', post_content)
+                    post_content = re.sub(r'\*(.*?)\*', r'\1', post_content)
+                    post_content = post_content.replace('**', '').replace('*', '')
+
+                    graphic_content = re.sub(r'\*\*(.*?)\*\*', r'\1', graphic_content)
+                    graphic_content = re.sub(r'\*(.*?)\*', r'\1', graphic_content)
+                    graphic_content = graphic_content.replace('**', '').replace('*', '')
+
+                    alt_posts.append({
+                        "number": str(i),
+                        "date": "",
+                        "content": post_content,
+                        "graphic": graphic_content,
+                        "selected": True,
+                        "feedback": "",
+                        "post_feedback": "",
+                        "graphic_feedback": "",
+                        "refine_post": False,
+                        "refine_graphic": False
+                    })
+
+        # Use alternative parsing if it found more posts
+        if len(alt_posts) > len(posts):
+            posts = alt_posts
+            logger.debug("Alternative parsing found %d posts", len(posts))
+    
+    return post_metrics.attach_all(posts)
+
+
+def article_to_posts(article_text=None, website_url=None, num_posts=3, brand_data=None, api_key=None,
+                     saved_posts=None, regenerate_duplicates=False):
+    """
+    Generate LinkedIn posts based on an article text and/or website URL.
+    Near-duplicates are flagged or regenerated as in generate_social_posts.
+    """
     try:
-        openai.api_key = api_key
-        
         # Validate inputs
         if not article_text and not website_url:
             raise ValueError("Either article_text or website_url must be provided")
         
-        # Include brand information in the prompt
-        brand_context = f"""
-        Brand: {brand_data['name']}
-        Brand voice: {brand_data['brand_voice']}
-        Overall tone: {brand_data['overall_voice']}
-        Brand phrases: {brand_data['brand_phrases']}
-        """
+        # Fetch and extract the page locally (cached per URL) instead of asking the model to search
+        fetched_text = article_fetch.article_text_for(website_url) if website_url else None
         
-        # Determine the content source and build the prompt accordingly
-        if article_text and website_url:
-            # Both provided
-            system_prompt = f"""You are an expert content marketer specializing in LinkedIn.
-            Based on the article text provided AND the content from the website URL, create exactly {num_posts} LinkedIn posts that highlight key insights or quotes.
-            Each post should be standalone, engaging, and encourage readers to engage with the content.
-            Vary the style and approach of each post to appeal to different audience segments.
-            
-            {brand_context}
-            
-            Make sure the posts align with the brand voice and tone specified above.
-            
-            IMPORTANT: You must create exactly {num_posts} posts. Number them clearly as POST #1, POST #2, POST #3, etc.
-            
-            Format each post EXACTLY as:
-            
-            POST #1:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept that would complement this post and remember that images may be limited, it may have to be a simple graphic or text-based image]
-            
-            POST #2:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept]
-            
-            Continue this pattern for all {num_posts} posts.
-            """
-            
-            # Truncate article if too long
-            max_article_length = 10000
-            if len(article_text) > max_article_length:
-                article_text = article_text[:max_article_length] + "... [article truncated]"
-            
-            user_prompt = f"""Here's the article text to use:
-            
-            {article_text}
-            
-            Also, please search for and analyze the content from this URL: {website_url}
-            
-            Create exactly {num_posts} LinkedIn posts using insights from both sources."""
-            
-        elif article_text:
-            # Only article text provided
-            system_prompt = f"""You are an expert content marketer specializing in LinkedIn.
-            Based on the article text provided, create exactly {num_posts} LinkedIn posts that highlight key insights or quotes from the article.
-            Each post should be standalone, engaging, and encourage readers to engage with the content.
-            Vary the style and approach of each post to appeal to different audience segments.
-            
-            {brand_context}
-            
-            Make sure the posts align with the brand voice and tone specified above.
-            
-            IMPORTANT: You must create exactly {num_posts} posts. Number them clearly as POST #1, POST #2, POST #3, etc.
-            
-            Format each post EXACTLY as:
-            
-            POST #1:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept that would complement this post and remember that images may be limited, it may have to be a simple graphic or text-based image]
-            
-            POST #2:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept]
-            
-            Continue this pattern for all {num_posts} posts.
-            """
-            
-            # Truncate article if too long
-            max_article_length = 10000
-            if len(article_text) > max_article_length:
-                article_text = article_text[:max_article_length] + "... [article truncated]"
-            
-            user_prompt = f"Here's the article to use for creating exactly {num_posts} LinkedIn posts:\n\n{article_text}"
-            
-        else:
-            # Only website URL provided
-            system_prompt = f"""You are an expert content marketer specializing in LinkedIn.
-            Search for and analyze the content from the provided URL, then create exactly {num_posts} LinkedIn posts that highlight key insights or quotes from that content.
-            Each post should be standalone, engaging, and encourage readers to visit the original article.
-            Vary the style and approach of each post to appeal to different audience segments.
-            
-            {brand_context}
-            
-            Make sure the posts align with the brand voice and tone specified above.
-            
-            IMPORTANT: You must create exactly {num_posts} posts. Number them clearly as POST #1, POST #2, POST #3, etc.
-            
-            Format each post EXACTLY as:
-            
-            POST #1:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept that would complement this post and remember that images may be limited, it may have to be a simple graphic or text-based image]
-            
-            POST #2:
-            [LinkedIn post copy]
-            
-            GRAPHIC:
-            [Brief description of graphic concept]
-            
-            Continue this pattern for all {num_posts} posts.
-            """
-            
-            user_prompt = f"Please search for and analyze the content from this URL: {website_url}\n\nThen create exactly {num_posts} LinkedIn posts based on that content."
+        # Stable brand prefix first, per-request instructions and article last
+        messages = prompts.article_messages(brand_data, num_posts, article_text, website_url, fetched_text)
         
-        # Prepare the API call
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        # Only include web search tool if we have a website URL
+        # Only fall back to the web search tool when the page could not be fetched
         tools = []
-        if website_url:
+        if website_url and not fetched_text:
             tools = [{"type": "web_search_preview"}]
         
-        # Make the API call using the Responses API for web search capability
-        if tools:
-            # Use the new Responses API when web search is needed
-            client = openai.OpenAI(api_key=api_key)
-            response = client.responses.create(
-                model="gpt-4o",  # Use a model that supports web search
-                tools=tools,
-                input=user_prompt + "\n\nSystem instructions: " + system_prompt,
-                temperature=0.7
-            )
-            content = response.output_text
-        else:
-            # Use regular chat completions when only article text is provided
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=3000  # Increased to accommodate multiple posts
-            )
-            content = response.choices[0].message.content
-        
-        # Debug: Print the raw content to see what's being generated
-        print("Raw API Response:")
-        print("=" * 50)
-        print(content)
-        print("=" * 50)
-        
-        # Parse the generated posts with improved regex
-        posts = []
-        # Updated pattern to be more flexible with whitespace and formatting
-        pattern = r'POST #(\d+):\s*(.*?)(?:\s*GRAPHIC:\s*(.*?))?(?=\s*POST #\d+:|$)'
-        matches = re.finditer(pattern, content, re.DOTALL | re.IGNORECASE)
-        
-        for match in matches:
-            post_num = match.group(1)
-            post_content = match.group(2).strip() if match.group(2) else ""
-            graphic_desc = match.group(3).strip() if match.group(3) else "Simple, clean graphic that complements the post content"
-            
-            # Clean up post content - remove any trailing GRAPHIC: text that might have been included
-            post_content = re.sub(r'\s*GRAPHIC:\s*.*$', '', post_content, flags=re.DOTALL | re.IGNORECASE).strip()
-            
-            # Remove markdown formatting (** bold markers)
-            post_content = re.sub(r'\*\*(.*?)\*\*', r'\1', post_content)  # Remove **text**
-            post_content = re.sub(r'\*(.*?)\*', r'\1', post_content)      # Remove *text*
-            post_content = post_content.replace('**', '').replace('*', '') # Remove any remaining asterisks
-            
-            # Clean up graphic description too
-            graphic_desc = re.sub(r'\*\*(.*?)\*\*', r'\1', graphic_desc)
-            graphic_desc = re.sub(r'\*(.*?)\*', r'\1', graphic_desc)
-            graphic_desc = graphic_desc.replace('**', '').replace('*', '')
-            
-            posts.append({
-                "number": post_num,
-                "date": "",  # No date required for article-based posts
-                "content": post_content,
-                "graphic": graphic_desc,
-                "selected": True,
-                "feedback": "",
-                "post_feedback": "",
-                "graphic_feedback": "",
-                "refine_post": False,
-                "refine_graphic": False
-            })
-        
-        # Debug: Print parsing results
-        print(f"Parsed {len(posts)} posts from response")
-        for i, post in enumerate(posts):
-            print(f"Post {i+1}: {post['content'][:100]}...")
-        
-        # If no posts were parsed or we got fewer than expected, try alternative parsing
-        if len(posts) < num_posts:
-            print("Trying alternative parsing method...")
-            
-            # Try splitting by POST # and processing each section
-            alt_posts = []
-            post_sections = re.split(r'POST #\d+:', content, flags=re.IGNORECASE)
-            
-            # Skip the first section (it's before the first POST #)
-            for i, section in enumerate(post_sections[1:], 1):
-                section = section.strip()
-                if section:
-                    # Split by GRAPHIC: if present
-                    parts = re.split(r'\s*GRAPHIC:\s*', section, flags=re.IGNORECASE)
-                    post_content = parts[0].strip()
-                    graphic_content = parts[1].strip() if len(parts) > 1 else "Simple, clean graphic that complements the post content"
-                    
-                    if post_content:
-                        # Clean markdown formatting from alternative parsing too
-                        post_content = re.sub(r'\*\*(.*?)\*\*', r'\1', post_content)
-                        post_content = re.sub(r'\*(.*?)\*', r'\1', post_content)
-                        post_content = post_content.replace('**', '').replace('*', '')
-                        
-                        graphic_content = re.sub(r'\*\*(.*?)\*\*', r'\1', graphic_content)
-                        graphic_content = re.sub(r'\*(.*?)\*', r'\1', graphic_content)
-                        graphic_content = graphic_content.replace('**', '').replace('*', '')
-                        
-                        alt_posts.append({
-                            "number": str(i),
-                            "date": "",
-                            "content": post_content,
-                            "graphic": graphic_content,
-                            "selected": True,
-                            "feedback": "",
-                            "post_feedback": "",
-                            "graphic_feedback": "",
-                            "refine_post": False,
-                            "refine_graphic": False
-                        })
-            
-            # Use alternative parsing if it found more posts
-            if len(alt_posts) > len(posts):
-                posts = alt_posts
-                print(f"Alternative parsing found {len(posts)} posts")
+        with telemetry.track("article_to_posts", requested_posts=num_posts) as record:
+            record["prompt_version"] = prompts.PROMPT_VERSION
+            
+            # Make the API call using the Responses API for web search capability
+            if tools:
+                # Use the new Responses API when web search is needed
+                content = _response_completion(
+                    api_key,
+                    "article_to_posts_web",  # Routed to models that support web search
+                    messages=messages,
+                    tools=tools,
+                    temperature=0.7,
+                    max_tokens=3000,
+                    record=record
+                )
+            else:
+                # Use regular chat completions when only article text is provided
+                content = _chat_completion(
+                    api_key,
+                    "article_to_posts",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=3000,  # Increased to accommodate multiple posts
+                    record=record
+                )
+            
+            logger.debug("Raw API response:\n%s", content)
+            
+            posts = parse_article_posts(content, num_posts)
+            record["parsed_posts"] = min(len(posts), num_posts)
+        _report_usage(record)
         
         # If we still don't have enough posts, create placeholder posts
         if len(posts) < num_posts:
-            st.warning(f"Only generated {len(posts)} out of {num_posts} requested posts. Check the raw response in the console for debugging.")
+            _show("warning", f"Only generated {len(posts)} out of {num_posts} requested posts. Run with LOG_LEVEL=DEBUG to log the raw response.")
             
             # Add placeholder posts if needed
             for i in range(len(posts) + 1, num_posts + 1):
-                posts.append({
+                posts.append(post_metrics.attach({
                     "number": str(i),
                     "date": "",
-                    "content": f"Post {i} content was not generated properly. Please try regenerating or refining the content.",
+                    "content": PLACEHOLDER_CONTENT.format(number=i),
                     "graphic": "Simple, clean graphic that complements the post content",
                     "selected": True,
                     "feedback": "",
@@ -597,10 +819,208 @@ def article_to_posts(article_text=None, website_url=None, num_posts=3, brand_dat
                     "graphic_feedback": "",
                     "refine_post": False,
                     "refine_graphic": False
-                })
+                }))
         
-        return posts[:num_posts]  # Return only the requested number of posts
+        return _check_near_duplicates(
+            posts[:num_posts],  # Return only the requested number of posts
+            num_posts, brand_data, api_key, saved_posts, regenerate_duplicates,
+            mode="article", article_text=article_text, website_url=website_url
+        )
         
+    except openai.RateLimitError:
+        _show("error", f"Error generating posts from article: {RATE_LIMIT_MESSAGE}")
+        return []
     except Exception as e:
-        st.error(f"Error generating posts from article: {str(e)}")
-        return []
\ No newline at end of file
+        _show("error", f"Error generating posts from article: {str(e)}")
+        return []
+
+
+def is_placeholder_post(post):
+    """True when a post slot holds padding instead of generated content."""
+    content = (post.get('content') or '').strip()
+    return not content or bool(_PLACEHOLDER_PATTERN.match(content))
+
+
+def _post_number(post, default):
+    try:
+        return int(str(post.get('number', '')).strip())
+    except ValueError:
+        return default
+
+
+def find_missing_slots(posts, expected_count):
+    """
+    Find post numbers that are missing or only hold placeholder content.
+    Args:
+        posts: Current post dictionaries
+        expected_count: Number of posts that were requested
+    Returns:
+        Sorted list of post numbers (1-based) that need content
+    """
+    filled = {
+        _post_number(post, i + 1)
+        for i, post in enumerate(posts)
+        if not is_placeholder_post(post)
+    }
+    return [number for number in range(1, expected_count + 1) if number not in filled]
+
+
+def _merge_posts(posts, new_posts, slots):
+    """Place regenerated posts into their slots, keeping every good post untouched."""
+    returned_numbers = [_post_number(post, 0) for post in new_posts]
+    if not set(returned_numbers) <= set(slots) or len(set(returned_numbers)) != len(returned_numbers):
+        # The model renumbered its answer; assign the posts to the open slots in order
+        returned_numbers = slots[:len(new_posts)]
+
+    by_number = {}
+    for i, post in enumerate(posts):
+        by_number[_post_number(post, i + 1)] = post
+    for number, post in zip(returned_numbers, new_posts):
+        post["number"] = str(number)
+        by_number[number] = post
+
+    return [by_number[number] for number in sorted(by_number)]
+
+
+def fill_missing_posts(posts, expected_count, brand_data, api_key, mode="calendar",
+                       focus="", special_events="", article_text=None, website_url=None, slots=None):
+    """
+    Regenerate only the missing or placeholder posts and merge them in place.
+    Pass `slots` to regenerate specific post numbers instead, e.g. near-duplicates.
+    
+    Args:
+        posts (list): Current post dictionaries
+        expected_count (int): Number of posts that were requested
+        brand_data (dict): Brand the posts are for
+        api_key (str): OpenAI API key
+        mode (str): "calendar" or "article"
+        focus (str): Calendar focus (calendar mode)
+        special_events (str): Calendar special events (calendar mode)
+        article_text (str): Article text (article mode)
+        website_url (str): Article URL (article mode)
+        slots (list): Post numbers to regenerate; defaults to the missing ones
+    
+    Returns:
+        list: Posts with the gaps filled; slots the model still missed keep their previous content
+    """
+    replacing = slots is not None
+    slots = sorted(set(slots)) if replacing else find_missing_slots(posts, expected_count)
+    if not slots:
+        return posts
+
+    kept_posts = [
+        post for i, post in enumerate(posts)
+        if not is_placeholder_post(post) and _post_number(post, i + 1) not in slots
+    ]
+    try:
+        with telemetry.track("fill_missing_posts", requested_posts=len(slots)) as record:
+            record["prompt_version"] = prompts.PROMPT_VERSION
+            if mode == "calendar":
+                now = datetime.now()
+                examples = brand_examples.select_examples(brand_data, f"{focus}\n{special_events or ''}", api_key=api_key)
+                messages = prompts.calendar_gap_messages(
+                    brand_data, slots, kept_posts, focus, special_events,
+                    calendar.month_name[now.month], now.year, examples
+                )
+                content = _chat_completion(
+                    api_key,
+                    "fill_missing_posts",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=min(3000, 400 * len(slots)),
+                    record=record
+                )
+                new_posts = parse_calendar_posts(content)
+            else:
+                fetched_text = article_fetch.article_text_for(website_url) if website_url else None
+                messages = prompts.article_gap_messages(
+                    brand_data, slots, kept_posts, article_text, website_url, fetched_text
+                )
+                if website_url and not fetched_text:
+                    content = _response_completion(
+                        api_key,
+                        "article_to_posts_web",
+                        messages=messages,
+                        tools=[{"type": "web_search_preview"}],
+                        temperature=0.7,
+                        max_tokens=min(3000, 400 * len(slots)),
+                        record=record
+                    )
+                else:
+                    content = _chat_completion(
+                        api_key,
+                        "article_to_posts",
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=min(3000, 400 * len(slots)),
+                        record=record
+                    )
+                new_posts = parse_article_posts(content, len(slots))
+
+            new_posts = [post for post in new_posts if not is_placeholder_post(post)][:len(slots)]
+            record["parsed_posts"] = len(new_posts)
+        _report_usage(record)
+
+        merged = _merge_posts(posts, new_posts, slots)
+        if replacing:
+            if len(new_posts) < len(slots):
+                _show("warning", f"Regenerated {len(new_posts)} of {len(slots)} posts; the rest were kept as they were.")
+            else:
+                _show("success", f"Regenerated {len(slots)} posts")
+            return merged
+
+        still_missing = find_missing_slots(merged, expected_count)
+        if still_missing:
+            _show("warning", f"Filled {len(slots) - len(still_missing)} of {len(slots)} missing posts. "
+                       f"Posts {', '.join(f'#{n}' for n in still_missing)} are still missing.")
+        else:
+            _show("success", f"Filled {len(slots)} missing posts")
+        return merged
+
+    except openai.RateLimitError:
+        _show("error", f"Error filling missing posts: {RATE_LIMIT_MESSAGE}")
+        return posts
+    except Exception as e:
+        _show("error", f"Error filling missing posts: {str(e)}")
+        return posts
+
+
+def flag_near_duplicates(posts, brand_data, saved_posts=None):
+    """
+    Flag posts that nearly repeat the brand's example posts, its saved posts
+    or another post in the same batch (see utils/similarity.py).
+    
+    Args:
+        posts (list): Generated post dictionaries, updated in place
+        brand_data (dict): Brand the posts are for
+        saved_posts (iterable): Text of the brand's saved posts, read once
+    
+    Returns:
+        list: Numbers of the flagged posts
+    """
+    return _flag_against(posts, similarity.get_brand_index(brand_data or {}, saved_posts))
+
+
+def _flag_against(posts, index):
+    candidates = [(i, post) for i, post in enumerate(posts) if not is_placeholder_post(post)]
+    flagged = similarity.flag_near_duplicates([post for _, post in candidates], index)
+    return [_post_number(candidates[j][1], candidates[j][0] + 1) for j in flagged]
+
+
+def _check_near_duplicates(posts, expected_count, brand_data, api_key, saved_posts, regenerate, **fill_args):
+    """Flag near-duplicates and, when asked, regenerate them once."""
+    try:
+        # Built once: `saved_posts` may page through the library and can only be read once
+        index = similarity.get_brand_index(brand_data or {}, saved_posts)
+        flagged = _flag_against(posts, index)
+    except Exception as e:
+        logger.warning("Error checking for near-duplicate posts: %s", e)
+        return posts
+
+    if flagged and regenerate:
+        posts = fill_missing_posts(posts, expected_count, brand_data, api_key, slots=flagged, **fill_args)
+        flagged = _flag_against(posts, index)
+    if flagged:
+        _show("warning", f"{len(flagged)} posts look like near-duplicates of earlier posts: "
+                   f"{', '.join(f'#{n}' for n in flagged)}")
+    return posts
@@ -0,0 +1,82 @@
+"""
+Page-at-a-time access to long result lists, e.g. the Saved Posts library.
+
+PageCache wraps a `fetch_page(page) -> (rows, total)` function. It keeps
+only the few most recently used pages, and while one page is on screen it
+fetches the next one on a background thread, so paging forward is usually
+instant. Memory and render time therefore stay constant however large the
+library grows.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_PAGE_SIZE = 25
+MAX_CACHED_PAGES = 3
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="page-prefetch")
+
+
+class PageCache:
+    """Bounded cache of fetched pages with next-page prefetch."""
+
+    def __init__(self, fetch_page: Callable[[int], Tuple[List[Dict], int]], page_size: int = DEFAULT_PAGE_SIZE,
+                 max_pages: int = MAX_CACHED_PAGES):
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.total = None
+        self._pages = OrderedDict()     # page -> Future of (rows, total)
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self) -> int:
+        if not self.total:
+            return 1
+        return (self.total + self.page_size - 1) // self.page_size
+
+    def _future(self, page: int, background: bool) -> Future:
+        with self._lock:
+            future = self._pages.get(page)
+            if future is None:
+                if background:
+                    future = _prefetch_pool.submit(self.fetch_page, page)
+                else:
+                    future = Future()
+                    future.set_running_or_notify_cancel()
+                self._pages[page] = future
+                created = True
+            else:
+                created = False
+            self._pages.move_to_end(page)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        if created and not background:
+            try:
+                future.set_result(self.fetch_page(page))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def get(self, page: int) -> List[Dict]:
+        """
+        Rows of one page (0-based), fetching it now unless it was prefetched.
+        The following page is then prefetched in the background.
+        """
+        try:
+            rows, total = self._future(page, background=False).result()
+        except Exception as e:
+            print(f"Error fetching page {page}: {str(e)}")
+            with self._lock:
+                self._pages.pop(page, None)
+            return []
+        self.total = total
+        if page + 1 < self.page_count:
+            self._future(page + 1, background=True)
+        return rows
+
+
+def list_pages(rows: List[Dict], page_size: int = DEFAULT_PAGE_SIZE) -> PageCache:
+    """PageCache over rows that are already in memory, e.g. semantic search results."""
+    return PageCache(lambda page: (rows[page * page_size:(page + 1) * page_size], len(rows)), page_size)
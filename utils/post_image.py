@@ -0,0 +1,293 @@
+"""
+PNG images of posts, styled like a LinkedIn post, rendered with Pillow.
+
+Fonts are loaded once, and the card template (background, border,
+header band) is drawn once per size and copied for each post. Text is
+wrapped by its rendered width, so lines fill the card whatever the font.
+Rendered PNGs are cached by a hash of everything drawn: in memory, and on
+disk under POST_IMAGE_CACHE_DIR (default cache/post_images; "none" turns
+the disk cache off). An unchanged post is never rendered twice, even from
+another process. benchmarks/post_image.py compares this renderer with the
+old matplotlib one.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump when the layout changes, so cached images are rendered again
+RENDERER_VERSION = 1
+
+WIDTH, HEIGHT = 1080, 1350          # LinkedIn portrait (4:5), at scale 1
+MAX_CACHED_IMAGES = 128
+DEFAULT_CACHE_DIR = os.path.join("cache", "post_images")
+
+_BACKGROUND = "#f3f2ef"
+_CARD = "#ffffff"
+_CARD_BORDER = "#e1e8ed"
+_HEADER = "#f8f9fa"
+_ACCENT = "#667eea"
+_TEXT = "#1d2226"
+_MUTED = "#666666"
+
+# Emoji outside the Basic Multilingual Plane (and their variation selectors) have no glyphs
+# in the card fonts and would be drawn as empty boxes
+_NO_GLYPH_PATTERN = re.compile("[\U00010000-\U0010FFFF\uFE0F\u200D]")
+
+_REGULAR_FONTS = ("DejaVuSans.ttf", "Arial.ttf", "arial.ttf", "LiberationSans-Regular.ttf")
+_BOLD_FONTS = ("DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf", "LiberationSans-Bold.ttf")
+
+
+@lru_cache(maxsize=None)
+def _font(size: int, bold: bool = False) -> ImageFont.ImageFont:
+    """A TrueType font of `size` pixels, loaded once; POST_IMAGE_FONT(_BOLD) override the choice."""
+    configured = os.environ.get("POST_IMAGE_FONT_BOLD" if bold else "POST_IMAGE_FONT")
+    for name in ((configured,) if configured else ()) + (_BOLD_FONTS if bold else _REGULAR_FONTS):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has one fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def _layout(scale: float) -> dict:
+    """Pixel positions and font sizes of the card at a given scale."""
+    def px(value):
+        return int(round(value * scale))
+    return {
+        "size": (px(WIDTH), px(HEIGHT)),
+        "card": (px(60), px(60), px(WIDTH - 60), px(HEIGHT - 60)),
+        "header": (px(61), px(61), px(WIDTH - 61), px(230)),
+        "avatar": (px(100), px(95), px(200), px(195)),
+        "brand_at": (px(225), px(108)),
+        "date_at": (px(225), px(155)),
+        "text_box": (px(110), px(280), px(WIDTH - 110), px(HEIGHT - 200)),
+        "footer_y": px(HEIGHT - 140),
+        "initials_font": _font(px(38), bold=True),
+        "brand_font": _font(px(34), bold=True),
+        "meta_font": _font(px(24)),
+        "body_font": _font(px(30)),
+        "footer_font": _font(px(26), bold=True),
+        "line_height": px(44),
+        "radius": px(18),
+        "width": max(1, px(2))
+    }
+
+
+@lru_cache(maxsize=4)
+def _template(scale: float) -> Image.Image:
+    """The parts of the card that are the same for every post."""
+    layout = _layout(scale)
+    image = Image.new("RGB", layout["size"], _BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle(layout["card"], radius=layout["radius"], fill=_CARD, outline=_CARD_BORDER,
+                           width=layout["width"])
+    draw.rectangle(layout["header"], fill=_HEADER)
+    left, _, right, _ = layout["text_box"]
+    footer_y = layout["footer_y"]
+    draw.line((left, footer_y - layout["line_height"], right, footer_y - layout["line_height"]),
+              fill=_CARD_BORDER, width=layout["width"])
+    labels = ("Like", "Comment", "Repost", "Send")
+    slot = (right - left) / len(labels)
+    for i, label in enumerate(labels):
+        x = left + slot * i + slot / 2
+        draw.text((x, footer_y), label, font=layout["footer_font"], fill=_MUTED, anchor="mm")
+    return image
+
+
+def wrap_text(text: str, font: ImageFont.ImageFont, max_width: int) -> List[str]:
+    """Wrap text to lines no wider than max_width pixels, keeping its line breaks."""
+    lines = []
+    text = _NO_GLYPH_PATTERN.sub("", (text or "").replace("\\n", "\n"))
+    for paragraph in text.splitlines():
+        words = paragraph.split()
+        if not words:
+            lines.append("")
+            continue
+        line = ""
+        for word in words:
+            candidate = f"{line} {word}" if line else word
+            if font.getlength(candidate) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # Break words longer than a whole line (e.g. URLs)
+            while font.getlength(word) > max_width:
+                cut = max(1, int(len(word) * max_width / font.getlength(word)))
+                while cut > 1 and font.getlength(word[:cut]) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+def _fit_lines(lines: List[str], max_lines: int, font: ImageFont.ImageFont, max_width: int) -> List[str]:
+    """Keep what fits in the text box, ending with an ellipsis when text was cut."""
+    while lines and not lines[-1]:
+        lines = lines[:-1]
+    if len(lines) <= max_lines:
+        return lines
+    lines = lines[:max_lines]
+    last = lines[-1].rstrip()
+    while last and font.getlength(last + " …") > max_width:
+        last = last[:-1].rstrip()
+    lines[-1] = f"{last} …"
+    return lines
+
+
+def _initials(brand_name: str) -> str:
+    return "".join(word[0].upper() for word in (brand_name or "").split()[:2])
+
+
+def render_png(content: str, brand_name: str, date: Optional[str] = None, scale: float = 1.0) -> bytes:
+    """Render a post image without looking at the cache."""
+    layout = _layout(scale)
+    image = _template(scale).copy()
+    draw = ImageDraw.Draw(image)
+
+    draw.ellipse(layout["avatar"], fill=_ACCENT)
+    draw.text(((layout["avatar"][0] + layout["avatar"][2]) / 2, (layout["avatar"][1] + layout["avatar"][3]) / 2),
+              _initials(brand_name), font=layout["initials_font"], fill="#ffffff", anchor="mm")
+    draw.text(layout["brand_at"], brand_name or "", font=layout["brand_font"], fill=_TEXT)
+    draw.text(layout["date_at"], f"{date or 'Today'} • LinkedIn", font=layout["meta_font"], fill=_MUTED)
+
+    left, top, right, bottom = layout["text_box"]
+    font = layout["body_font"]
+    max_lines = (bottom - top) // layout["line_height"]
+    lines = _fit_lines(wrap_text(content, font, right - left), max_lines, font, right - left)
+    for i, line in enumerate(lines):
+        draw.text((left, top + i * layout["line_height"]), line, font=font, fill=_TEXT)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=3)
+    return buffer.getvalue()
+
+
+class _ImageCache:
+    """Rendered PNGs by key: a small in-memory LRU in front of an optional directory."""
+
+    def __init__(self, max_items: int, directory: Optional[str]):
+        self.max_items = max_items
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return png
+        png = None
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    png = f.read()
+            except OSError:
+                pass
+        if png is not None:
+            self._remember(key, png)
+        with self._lock:
+            if png is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return png
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._items:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def put(self, key: str, png: bytes):
+        self._remember(key, png)
+        if self.directory:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(png)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error caching post image {key}: {str(e)}")
+
+    def _remember(self, key: str, png: bytes):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "max_size": self.max_items, "hits": self.hits, "misses": self.misses,
+                    "directory": self.directory}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> _ImageCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = os.environ.get("POST_IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR)
+            _cache = _ImageCache(MAX_CACHED_IMAGES, None if directory.lower() == "none" else directory)
+        return _cache
+
+
+def image_key(content: str, brand_name: str, date: Optional[str] = None, scale: float = 1.0) -> str:
+    """Hash of everything that goes into a post image."""
+    parts = (str(RENDERER_VERSION), content or "", brand_name or "", date or "", f"{scale:g}")
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def post_image(content: str, brand_name: str, date: Optional[str] = None, scale: float = 1.0) -> bytes:
+    """
+    PNG image of a post, from the cache when it was rendered before.
+    Args:
+        content: Post text (literal "\\n" sequences are shown as line breaks)
+        brand_name: Brand shown as the author
+        date: Date shown under the brand; "Today" when empty
+        scale: 1.0 renders 1080x1350 pixels; 2.0 doubles that for print
+    Returns:
+        PNG bytes
+    """
+    key = image_key(content, brand_name, date, scale)
+    cache = _get_cache()
+    png = cache.get(key)
+    if png is None:
+        png = render_png(content, brand_name, date, scale)
+        cache.put(key, png)
+    return png
+
+
+def is_cached(content: str, brand_name: str, date: Optional[str] = None, scale: float = 1.0) -> bool:
+    """True when post_image() would not have to render this image."""
+    return image_key(content, brand_name, date, scale) in _get_cache()
+
+
+def cache_info() -> dict:
+    """Size and hit/miss counts of the image cache."""
+    return _get_cache().info()
@@ -0,0 +1,107 @@
+"""
+Text metrics of a post: characters, words, hashtags, mentions, links and
+reading time.
+
+They are computed once, when a post is generated, refined, edited or
+saved, and stored on the post (the same fields are columns of the 'posts'
+table, see migrations/005_post_metrics.sql), so cards, lists and exports
+read them instead of re-splitting every post on every rerun. A digest of
+the measured text is stored with them (migrations/006_post_text_digest.sql);
+metrics whose digest doesn't match the text, and rows saved before the
+columns existed, are measured on the fly. metrics_frame() does the same for
+a whole list of posts at once, as pandas columns.
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+from . import lazy
+
+pd = lazy.load("pandas")
+
+WORDS_PER_MINUTE = 200
+
+FIELDS = ("char_count", "word_count", "hashtag_count", "mention_count", "url_count", "reading_time_s")
+DIGEST_FIELD = "text_digest"
+
+_WORD_PATTERN = re.compile(r"\S+")
+_HASHTAG_PATTERN = re.compile(r"(?<!\S)#\w")
+_MENTION_PATTERN = re.compile(r"(?<!\S)@\w")
+_URL_PATTERN = re.compile(r"(?<!\S)(?:https?://|www\.)\S+", re.IGNORECASE)
+
+
+def digest(text: Optional[str]) -> str:
+    """Short hash of the text the metrics were computed from."""
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).hexdigest()
+
+
+def compute(text: Optional[str]) -> Dict[str, int]:
+    """Metrics of one post's text."""
+    text = text or ""
+    words = sum(1 for _ in _WORD_PATTERN.finditer(text))
+    return {
+        "char_count": len(text),
+        "word_count": words,
+        "hashtag_count": len(_HASHTAG_PATTERN.findall(text)),
+        "mention_count": len(_MENTION_PATTERN.findall(text)),
+        "url_count": len(_URL_PATTERN.findall(text)),
+        "reading_time_s": round(words * 60 / WORDS_PER_MINUTE)
+    }
+
+
+def attach(post: Dict, field: str = "content") -> Dict:
+    """Store the metrics of post[field], and its digest, on the post itself and return it."""
+    post.update(compute(post.get(field)))
+    post[DIGEST_FIELD] = digest(post.get(field))
+    return post
+
+
+def attach_all(posts: List[Dict], field: str = "content") -> List[Dict]:
+    for post in posts:
+        attach(post, field)
+    return posts
+
+
+def metrics_for(post: Dict, field: str = "content") -> Dict[str, int]:
+    """
+    The post's stored metrics, or freshly computed ones when they are
+    missing (older rows and drafts) or their digest shows they were stored
+    for other text.
+    """
+    text = post.get(field) or ""
+    if all(post.get(name) is not None for name in FIELDS) and post.get(DIGEST_FIELD) == digest(text):
+        return {name: post[name] for name in FIELDS}
+    return compute(text)
+
+
+def compute_frame(texts) -> "pd.DataFrame":
+    """compute() for many texts at once, one row per text, with pandas string operations."""
+    texts = pd.Series(list(texts), dtype=object).fillna("").astype(str)
+    words = texts.str.count(_WORD_PATTERN)
+    return pd.DataFrame({
+        "char_count": texts.str.len(),
+        "word_count": words,
+        "hashtag_count": texts.str.count(_HASHTAG_PATTERN),
+        "mention_count": texts.str.count(_MENTION_PATTERN),
+        "url_count": texts.str.count(_URL_PATTERN),
+        "reading_time_s": (words * 60 / WORDS_PER_MINUTE).round()
+    }, columns=list(FIELDS)).astype("int64")
+
+
+def metrics_frame(posts: List[Dict], field: str = "content") -> "pd.DataFrame":
+    """
+    metrics_for() for many posts at once, one row per post: the stored
+    metrics where they are complete and their digest matches the text, the
+    rest computed together by compute_frame().
+    """
+    texts = pd.Series([post.get(field) or "" for post in posts], dtype=object)
+    frame = pd.DataFrame([[post.get(name) for name in FIELDS] for post in posts], columns=list(FIELDS),
+                         dtype="float64")
+    current = pd.Series([post.get(DIGEST_FIELD) == digest(text) for post, text in zip(posts, texts)],
+                        index=frame.index, dtype=bool)
+    stale = frame.isna().any(axis=1) | ~current
+    if stale.any():
+        computed = compute_frame(texts[stale])
+        computed.index = frame.index[stale]
+        frame.loc[stale, list(FIELDS)] = computed
+    return frame.astype("int64")
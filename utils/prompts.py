@@ -0,0 +1,268 @@
+"""
+Prompt templates for post generation.
+
+Every prompt is split into a stable prefix and a short per-request suffix.
+The prefix (instructions, brand voice, a fixed set of the brand's example
+posts, output format) only depends on the brand, so consecutive requests
+for the same brand share it byte for byte and OpenAI's automatic prompt
+caching can reuse it. Caching only kicks in once the shared prefix is at
+least 1024 tokens; a brand with short details and few example posts stays
+under that and simply gets no cache hits, which is cheaper than padding
+every prompt to reach it. Anything that changes between requests (month,
+post count, focus, events, the extra example posts retrieved for them,
+article text) goes into the user message at the end.
+
+Bump PROMPT_VERSION whenever template text changes so telemetry can tell
+results from different templates apart.
+"""
+from typing import Dict, List
+
+from .examples import anchor_examples
+
+PROMPT_VERSION = "2024-07-v6"
+
+_POST_FORMAT_WITH_DATES = """Format each post EXACTLY as shown below and use this exact format for every post:
+
+POST #1 - [Weekday, Month Day, Year]:
+[LinkedIn post content here]
+
+GRAPHIC:
+[Brief description of graphic concept and remember that images may be limited, it may have to be a simple graphic or text-based image]
+
+POST #2 - [Weekday, Month Day, Year]:
+[LinkedIn post content here]
+
+GRAPHIC:
+[Brief description of graphic concept and remember that images may be limited, it may have to be a simple graphic or text-based image]
+
+Continue this pattern for every requested post. Make sure each post is clearly separated and numbered consecutively."""
+
+_POST_FORMAT = """Number the posts clearly as POST #1, POST #2, POST #3, etc.
+
+Format each post EXACTLY as:
+
+POST #1:
+[LinkedIn post copy]
+
+GRAPHIC:
+[Brief description of graphic concept that would complement this post and remember that images may be limited, it may have to be a simple graphic or text-based image]
+
+POST #2:
+[LinkedIn post copy]
+
+GRAPHIC:
+[Brief description of graphic concept]
+
+Continue this pattern for every requested post."""
+
+_CALENDAR_PREFIX = """You are an expert social media copywriter specializing in creating engaging content.
+You write LinkedIn posts for {name}.
+
+Brand voice: {brand_voice}
+How they portray themselves: {portrayal}
+Overall tone/voice: {overall_voice}
+Brand phrases to include when appropriate: {brand_phrases}
+Website: {website}
+
+Only schedule posts on weekdays. You may be shown a few of the brand's earlier posts as examples
+of its voice. Match their voice but create posts that are different from them.
+{anchors}
+IMPORTANT: {post_format}"""
+
+_CALENDAR_SUFFIX = """Generate exactly {num_posts} unique LinkedIn posts for {name} for {month} {year}.
+Primary focus: {focus}
+Special events to highlight: {special_events}
+{examples}Use the exact format specified in the system prompt for all {num_posts} posts."""
+
+_ARTICLE_PREFIX = """You are an expert content marketer specializing in LinkedIn.
+You turn articles and web pages into LinkedIn posts that highlight key insights or quotes.
+Each post should be standalone, engaging, and encourage readers to engage with the content.
+Vary the style and approach of each post to appeal to different audience segments.
+
+Brand: {name}
+Brand voice: {brand_voice}
+Overall tone: {overall_voice}
+Brand phrases: {brand_phrases}
+
+Make sure the posts align with the brand voice and tone specified above.
+
+IMPORTANT: {post_format}"""
+
+_ARTICLE_SOURCE_INSTRUCTIONS = {
+    "both": "Based on the article text provided AND the content from the website URL, create exactly {num_posts} LinkedIn posts using insights from both sources.",
+    "text": "Based on the article text provided, create exactly {num_posts} LinkedIn posts that highlight key insights or quotes from the article.",
+    "url": "Search for and analyze the content from the provided URL, then create exactly {num_posts} LinkedIn posts that highlight key insights or quotes from that content. Encourage readers to visit the original article.",
+    "fetched": "Based on the article content fetched from the URL below, create exactly {num_posts} LinkedIn posts that highlight key insights or quotes from it. Encourage readers to visit the original article."
+}
+
+MAX_ARTICLE_LENGTH = 10000
+
+
+def _brand_fields(brand_data: Dict) -> Dict:
+    """Brand values used by the stable prefixes, with empty values normalised."""
+    return {
+        "name": brand_data.get('name', ''),
+        "brand_voice": brand_data.get('brand_voice') or '',
+        "portrayal": brand_data.get('portrayal') or '',
+        "overall_voice": brand_data.get('overall_voice') or '',
+        "brand_phrases": brand_data.get('brand_phrases') or '',
+        "website": brand_data.get('website') or 'N/A'
+    }
+
+
+def _examples_section(examples: List[str] = None, heading: str = "Earlier posts from this brand") -> str:
+    """Example posts (see utils/examples.py), or nothing."""
+    if not examples:
+        return ""
+    body = "\n\n---\n\n".join(example.strip() for example in examples)
+    return f"\n{heading} (match the voice, do not repeat them):\n{body}\n\n"
+
+
+def calendar_prefix(brand_data: Dict) -> str:
+    """Stable system prompt for calendar generation; depends only on the brand."""
+    return _CALENDAR_PREFIX.format(post_format=_POST_FORMAT_WITH_DATES,
+                                   anchors=_examples_section(anchor_examples(brand_data), "Examples of the brand's posts"),
+                                   **_brand_fields(brand_data))
+
+
+def calendar_messages(brand_data: Dict, focus: str, num_posts: int, special_events: str,
+                      month: str, year: int, examples: List[str] = None) -> List[Dict]:
+    """
+    Build chat messages for a monthly calendar.
+    Args:
+        brand_data: Brand dictionary
+        focus: Primary focus for the month
+        num_posts: Number of posts to generate
+        special_events: Free-text events to highlight
+        month: Month name the calendar is for
+        year: Year the calendar is for
+        examples: Example posts relevant to this request, besides the prefix's anchor_examples
+    Returns:
+        List of chat messages, stable prefix first
+    """
+    suffix = _CALENDAR_SUFFIX.format(
+        num_posts=num_posts,
+        name=brand_data.get('name', ''),
+        month=month,
+        year=year,
+        focus=focus,
+        special_events=special_events or 'None',
+        examples=_examples_section(examples)
+    )
+    return [
+        {"role": "system", "content": calendar_prefix(brand_data)},
+        {"role": "user", "content": suffix}
+    ]
+
+
+def article_prefix(brand_data: Dict) -> str:
+    """Stable system prompt for article-based posts; depends only on the brand."""
+    return _ARTICLE_PREFIX.format(post_format=_POST_FORMAT, **_brand_fields(brand_data))
+
+
+def _truncate_article(text: str) -> str:
+    if text and len(text) > MAX_ARTICLE_LENGTH:
+        return text[:MAX_ARTICLE_LENGTH] + "... [article truncated]"
+    return text
+
+
+def article_suffix(num_posts: int, article_text: str = None, website_url: str = None,
+                   fetched_text: str = None) -> str:
+    """
+    Per-request instructions and source material for article-based posts.
+    Args:
+        num_posts: Number of posts to generate
+        article_text: Optional article text, truncated to MAX_ARTICLE_LENGTH
+        website_url: Optional URL of the article
+        fetched_text: Optional text extracted from `website_url` (see utils/article_fetch.py);
+                      without it the model is asked to search for the URL itself
+    Returns:
+        User message content
+    """
+    article_text = _truncate_article(article_text)
+    fetched_text = _truncate_article(fetched_text)
+
+    if article_text and website_url:
+        source = "both"
+    elif article_text:
+        source = "text"
+    elif fetched_text:
+        source = "fetched"
+    else:
+        source = "url"
+
+    parts = [_ARTICLE_SOURCE_INSTRUCTIONS[source].format(num_posts=num_posts),
+             f"You must create exactly {num_posts} posts."]
+    if website_url:
+        parts.append(f"URL: {website_url}")
+    if article_text:
+        parts.append(f"Here's the article text to use:\n\n{article_text}")
+    if fetched_text:
+        parts.append(f"Here's the content of the page at the URL:\n\n{fetched_text}")
+    return "\n\n".join(parts)
+
+
+def article_messages(brand_data: Dict, num_posts: int, article_text: str = None,
+                     website_url: str = None, fetched_text: str = None) -> List[Dict]:
+    """Build chat messages for article-based posts, stable prefix first."""
+    return [
+        {"role": "system", "content": article_prefix(brand_data)},
+        {"role": "user", "content": article_suffix(num_posts, article_text, website_url, fetched_text)}
+    ]
+
+
+def _existing_posts_summary(existing_posts: List[Dict], limit: int = 160) -> str:
+    """One line per kept post so the model avoids repeating them."""
+    lines = []
+    for post in existing_posts:
+        first_line = (post.get('content') or '').strip().split('\n')[0][:limit]
+        lines.append(f"- POST #{post.get('number')}: {first_line}")
+    return "\n".join(lines) or "- (none)"
+
+
+def calendar_gap_messages(brand_data: Dict, slots: List[int], existing_posts: List[Dict], focus: str,
+                          special_events: str, month: str, year: int, examples: List[str] = None) -> List[Dict]:
+    """
+    Build chat messages that ask only for the missing posts of a calendar.
+    Args:
+        brand_data: Brand dictionary
+        slots: Post numbers that need content
+        existing_posts: Posts that are kept as they are
+        focus: Primary focus for the month
+        special_events: Free-text events to highlight
+        month: Month name the calendar is for
+        year: Year the calendar is for
+        examples: Example posts relevant to this request, besides the prefix's anchor_examples
+    Returns:
+        List of chat messages, same stable prefix as calendar_messages
+    """
+    numbers = ", ".join(f"#{slot}" for slot in slots)
+    suffix = (
+        f"Part of a {month} {year} LinkedIn calendar for {brand_data.get('name', '')} is missing.\n"
+        f"Primary focus: {focus}\n"
+        f"Special events to highlight: {special_events or 'None'}\n"
+        f"{_examples_section(examples)}\n"
+        f"These posts already exist and must not be repeated:\n{_existing_posts_summary(existing_posts)}\n\n"
+        f"Write ONLY posts {numbers} ({len(slots)} posts). Keep their original numbers in the headers "
+        f"(e.g. POST #{slots[0]} - [Weekday, Month Day, Year]:) and use the exact format specified in the system prompt."
+    )
+    return [
+        {"role": "system", "content": calendar_prefix(brand_data)},
+        {"role": "user", "content": suffix}
+    ]
+
+
+def article_gap_messages(brand_data: Dict, slots: List[int], existing_posts: List[Dict],
+                         article_text: str = None, website_url: str = None,
+                         fetched_text: str = None) -> List[Dict]:
+    """Build chat messages that ask only for the missing article-based posts."""
+    numbers = ", ".join(f"#{slot}" for slot in slots)
+    suffix = (
+        f"{article_suffix(len(slots), article_text, website_url, fetched_text)}\n\n"
+        f"These posts already exist and must not be repeated:\n{_existing_posts_summary(existing_posts)}\n\n"
+        f"Write ONLY posts {numbers}. Keep their original numbers in the headers (e.g. POST #{slots[0]}:)."
+    )
+    return [
+        {"role": "system", "content": article_prefix(brand_data)},
+        {"role": "user", "content": suffix}
+    ]
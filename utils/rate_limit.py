@@ -0,0 +1,213 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from . import lazy
+
+openai = lazy.load("openai")
+
+# Default limits match OpenAI's tier 1 quota for gpt-4-turbo. Override with
+# OPENAI_RPM / OPENAI_TPM when the organisation has a higher tier.
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 30000
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter tracking requests-per-minute and tokens-per-minute
+    for one API key. Waiters are served strictly first-in, first-out so a
+    large request cannot be starved by a stream of small ones.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_budget = float(requests_per_minute)
+        self._token_budget = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_budget = min(self.requests_per_minute,
+                                   self._request_budget + elapsed * self.requests_per_minute / 60.0)
+        self._token_budget = min(self.tokens_per_minute,
+                                 self._token_budget + elapsed * self.tokens_per_minute / 60.0)
+
+    def _seconds_until_ready(self, tokens: int, now: float) -> float:
+        """How long the head of the queue must wait for enough budget."""
+        waits = [self._paused_until - now]
+        if self._request_budget < 1:
+            waits.append((1 - self._request_budget) * 60.0 / self.requests_per_minute)
+        if self._token_budget < tokens:
+            waits.append((tokens - self._token_budget) * 60.0 / self.tokens_per_minute)
+        return max(0.0, *waits)
+
+    def acquire(self, tokens: int, on_queue: Optional[Callable[[int, float], None]] = None,
+                abort: Optional[Callable[[], None]] = None):
+        """
+        Block until a request estimated at `tokens` tokens may be sent.
+        Args:
+            tokens: Estimated prompt plus completion tokens for the request
+            on_queue: Optional callback receiving (queue position, estimated wait
+                      in seconds) whenever the caller has to wait
+            abort: Optional callback checked while waiting; raise from it to give up
+        """
+        tokens = min(max(1, int(tokens)), self.tokens_per_minute)
+        ticket = object()
+        last_position = None
+
+        with self._condition:
+            self._queue.append(ticket)
+
+        try:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    self._refill(now)
+                    position = self._queue.index(ticket)
+                    wait = self._seconds_until_ready(tokens, now)
+                    if position == 0 and wait <= 0:
+                        self._request_budget -= 1
+                        self._token_budget -= tokens
+                        self._queue.popleft()
+                        self._condition.notify_all()
+                        return
+                    if position == 0:
+                        timeout = wait
+                    else:
+                        timeout = 0.5
+                    if abort:
+                        timeout = min(timeout, 0.5)
+
+                # Report outside the lock so a slow callback never blocks other sessions
+                if abort:
+                    abort()
+                if on_queue and position != last_position:
+                    on_queue(position + 1, wait)
+                    last_position = position
+
+                with self._condition:
+                    self._condition.wait(timeout)
+        except BaseException:
+            with self._condition:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token budget once the real usage of a request is known."""
+        with self._condition:
+            estimated = min(max(1, int(estimated_tokens)), self.tokens_per_minute)
+            self._token_budget = min(self.tokens_per_minute, self._token_budget + estimated - actual_tokens)
+            self._condition.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every waiter for `seconds`, e.g. after the API returned a 429."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """Return the process-wide limiter shared by every session using `api_key`."""
+    key_id = hashlib.sha256((api_key or "").encode()).hexdigest()
+    with _limiters_lock:
+        if key_id not in _limiters:
+            _limiters[key_id] = RateLimiter(
+                int(os.environ.get("OPENAI_RPM", DEFAULT_REQUESTS_PER_MINUTE)),
+                int(os.environ.get("OPENAI_TPM", DEFAULT_TOKENS_PER_MINUTE))
+            )
+        return _limiters[key_id]
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """Rough token estimate (about four characters per token) plus the completion budget."""
+    return len(text or "") // 4 + (max_tokens or 0)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server's requested back-off from a rate-limit error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+def call_with_rate_limit(api_key: str, estimated_tokens: int, request: Callable,
+                         on_queue: Optional[Callable[[int, float], None]] = None,
+                         on_retry: Optional[Callable[[int, float], None]] = None,
+                         max_retries: int = 5, abort: Optional[Callable[[], None]] = None):
+    """
+    Run an OpenAI request through the shared limiter for `api_key`, retrying
+    429 responses with Retry-After-aware exponential backoff.
+    Args:
+        api_key: OpenAI API key the request is billed to
+        estimated_tokens: Estimated prompt plus completion tokens
+        request: Zero-argument callable performing the API call
+        on_queue: Optional callback receiving (queue position, estimated wait)
+        on_retry: Optional callback receiving (attempt number, back-off seconds)
+                  before each 429 retry
+        max_retries: Number of 429 retries before the error is raised
+        abort: Optional callback checked while queued; raise from it to give up
+    Returns:
+        Whatever `request` returns
+    """
+    limiter = get_rate_limiter(api_key)
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimated_tokens, on_queue, abort)
+        try:
+            response = request()
+        except openai.RateLimitError as e:
+            # Nothing was consumed, but the provider wants everyone on this key to slow down
+            limiter.reconcile(estimated_tokens, 0)
+            if attempt == max_retries:
+                raise
+            delay = _retry_after_seconds(e)
+            if delay is None:
+                delay = random.uniform(0, min(60.0, 2.0 ** attempt))
+            limiter.pause(delay)
+            if on_retry:
+                on_retry(attempt + 1, delay)
+            continue
+
+        actual_tokens = _usage_tokens(response)
+        if actual_tokens is not None:
+            limiter.reconcile(estimated_tokens, actual_tokens)
+        return response
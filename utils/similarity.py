@@ -0,0 +1,293 @@
+"""
+Local near-duplicate detection for posts.
+
+Posts are reduced to word 3-shingles and summarised with 128-permutation
+MinHash signatures. The signatures are banded into an LSH table so a query
+only compares against posts that share at least one band. Candidates are
+then confirmed with the Jaccard similarity estimated from the full
+signature. That keeps lookups fast on libraries of tens of thousands of
+posts while every step stays local and deterministic.
+"""
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import lazy
+
+np = lazy.load("numpy")
+
+NUM_PERM = 128
+BANDS = 32                      # 32 bands x 4 rows -> candidates from ~0.42 Jaccard
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.5
+MATCH_PREVIEW_CHARS = 160
+
+_MAX_HASH = (1 << 32) - 1
+
+_URL_PATTERN = re.compile(r'https?://\S+')
+_WORD_PATTERN = re.compile(r"[a-z0-9#@']+")
+_EXAMPLE_SEPARATOR = re.compile(r'\n\s*(?:-{3,}|={3,}|\*{3,})\s*\n|\n\s*\n\s*\n|\n\s*(?=(?:POST\s*#?\d+|Example\s*\d*|\d+[.)])\s)', re.IGNORECASE)
+
+
+def split_posts(text: str, min_length: int = 40) -> List[str]:
+    """
+    Split a free-text block of example posts into individual posts.
+    Examples may be separated by '---' lines, two or more blank lines, or
+    numbered headers such as 'POST #2', 'Example 3' or '4.'. Falls back to
+    single blank lines when no stronger separator is present.
+    """
+    if not text or not text.strip():
+        return []
+    parts = _EXAMPLE_SEPARATOR.split(text)
+    if len(parts) == 1:
+        parts = re.split(r'\n\s*\n', text)
+    posts = [part.strip() for part in parts if part and part.strip()]
+    # Glue short fragments (e.g. a stray hashtag line) onto the previous post
+    merged = []
+    for post in posts:
+        if merged and len(post) < min_length:
+            merged[-1] = f"{merged[-1]}\n{post}"
+        else:
+            merged.append(post)
+    return merged
+
+
+@lru_cache(maxsize=None)
+def _hash_params() -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Multiply-shift hashing: (a * x + b) mod 2**64, keeping the top 32 bits.
+    Wrapping uint64 arithmetic avoids a modulo, which dominates the cost otherwise.
+    Built on first use, so importing this module doesn't load numpy.
+    Returns:
+        Tuple of (a and b for every permutation, multipliers mixing a band's rows)
+    """
+    rng = np.random.RandomState(1)
+    perm_a = rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    perm_b = rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+    band_mix = rng.randint(0, 1 << 63, size=ROWS_PER_BAND, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return perm_a, perm_b, band_mix
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> "np.ndarray":
+    """Hashed word shingles of normalised text as a uint64 array."""
+    words = _WORD_PATTERN.findall(_URL_PATTERN.sub(' ', (text or '').lower()))
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.array(sorted({zlib.crc32(gram.encode('utf-8')) for gram in grams}), dtype=np.uint64)
+
+
+def _permute(shingle_hashes: "np.ndarray") -> "np.ndarray":
+    """Hash every shingle under every permutation; one row per permutation."""
+    perm_a, perm_b, _ = _hash_params()
+    with np.errstate(over='ignore'):
+        return ((np.outer(perm_a, shingle_hashes) + perm_b[:, None]) >> np.uint64(32)).astype(np.uint32)
+
+
+def minhash(shingle_hashes: "np.ndarray") -> "np.ndarray":
+    """MinHash signature of a set of shingle hashes."""
+    if shingle_hashes.size == 0:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32)
+    return _permute(shingle_hashes).min(axis=1)
+
+
+def signature(text: str) -> "np.ndarray":
+    return minhash(shingles(text))
+
+
+def signatures(texts: List[str], chunk_shingles: int = 50000) -> "np.ndarray":
+    """
+    MinHash signatures for many texts at once, one row per text.
+    Shingles are hashed in chunks with a single vectorised pass per chunk,
+    which is much faster than calling signature() in a loop.
+    """
+    result = np.full((len(texts), NUM_PERM), _MAX_HASH, dtype=np.uint32)
+    shingle_sets = [shingles(text) for text in texts]
+    start = 0
+    while start < len(texts):
+        end, total = start, 0
+        while end < len(texts) and (total == 0 or total + shingle_sets[end].size <= chunk_shingles):
+            total += shingle_sets[end].size
+            end += 1
+        chunk = [(row, hashes) for row, hashes in enumerate(shingle_sets[start:end], start) if hashes.size]
+        if chunk:
+            hashes = np.concatenate([h for _, h in chunk])
+            offsets = np.cumsum([0] + [h.size for _, h in chunk[:-1]])
+            result[[row for row, _ in chunk]] = np.minimum.reduceat(_permute(hashes), offsets, axis=1).T
+        start = end
+    return result
+
+
+def estimated_jaccard(sig_a: "np.ndarray", sig_b: "np.ndarray") -> float:
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+class DuplicateIndex:
+    """MinHash LSH index over a set of reference posts."""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._signatures = []
+        self._texts = []
+        self._sources = []
+        self._buckets = [dict() for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self._texts)
+
+    @staticmethod
+    def _band_keys(sigs: "np.ndarray") -> "np.ndarray":
+        """One integer key per band for each signature row."""
+        bands = sigs.reshape(-1, BANDS, ROWS_PER_BAND).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            return (bands * _hash_params()[2]).sum(axis=2, dtype=np.uint64)
+
+    def _candidates(self, sig: "np.ndarray") -> set:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(sig)[0].tolist()):
+            candidates.update(self._buckets[band].get(key, ()))
+        return candidates
+
+    def _insert(self, texts: List[str], sigs: "np.ndarray", source: str):
+        for text, sig, keys in zip(texts, sigs, self._band_keys(sigs).tolist()):
+            doc_id = len(self._texts)
+            self._signatures.append(sig)
+            # Matches only show a preview, so the full text is not kept
+            self._texts.append(text[:MATCH_PREVIEW_CHARS])
+            self._sources.append(source)
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(doc_id)
+
+    def add(self, text: str, source: str = "saved"):
+        """Add a reference post; `source` says where it came from (e.g. 'saved', 'example')."""
+        if text and text.strip():
+            self._insert([text], signature(text)[None, :], source)
+
+    def add_many(self, texts: Iterable[str], source: str = "saved"):
+        texts = [text for text in texts if text and text.strip()]
+        if texts:
+            self._insert(texts, signatures(texts), source)
+
+    def query(self, text: str, threshold: Optional[float] = None) -> List[Dict]:
+        """
+        Find reference posts similar to `text`.
+        Returns:
+            Matches sorted by similarity, each with similarity, source and the
+            first MATCH_PREVIEW_CHARS characters of the text
+        """
+        threshold = self.threshold if threshold is None else threshold
+        sig = signature(text)
+        matches = []
+        for doc_id in self._candidates(sig):
+            similarity = estimated_jaccard(sig, self._signatures[doc_id])
+            if similarity >= threshold:
+                matches.append({
+                    "similarity": round(similarity, 3),
+                    "text": self._texts[doc_id],
+                    "source": self._sources[doc_id]
+                })
+        return sorted(matches, key=lambda m: m["similarity"], reverse=True)
+
+
+_signature_cache = OrderedDict()
+_signature_cache_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 32
+INDEX_BATCH_SIZE = 500
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _batches(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    batch = []
+    for text in texts:
+        if text and text.strip():
+            batch.append(text)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def get_brand_index(brand_data: Dict, saved_posts: Optional[Iterable[str]] = None,
+                    threshold: float = DEFAULT_THRESHOLD) -> DuplicateIndex:
+    """
+    Index of a brand's example posts (`previous_posts`) and saved posts.
+    `saved_posts` is read once, INDEX_BATCH_SIZE texts at a time, so it can
+    be a generator that pages through the library. Signatures are cached
+    per brand by a digest of the text, so only new posts are hashed again.
+    """
+    cache_key = brand_data.get('id') or brand_data.get('name')
+    with _signature_cache_lock:
+        known = _signature_cache.get(cache_key, {})
+
+    index = DuplicateIndex(threshold)
+    index.add_many(split_posts(brand_data.get('previous_posts') or ''), source="example")
+    seen = {}
+    for batch in _batches(saved_posts or (), INDEX_BATCH_SIZE):
+        keys = [_text_key(text) for text in batch]
+        missing = [(key, text) for key, text in zip(keys, batch) if key not in known and key not in seen]
+        if missing:
+            seen.update(zip((key for key, _ in missing), signatures([text for _, text in missing])))
+        sigs = np.array([seen[key] if key in seen else known[key] for key in keys], dtype=np.uint32)
+        seen.update((key, sig) for key, sig in zip(keys, sigs) if key not in seen)
+        index._insert(batch, sigs, "saved")
+
+    with _signature_cache_lock:
+        # Only the posts read this time are kept, so deleted posts drop out
+        _signature_cache[cache_key] = seen
+        _signature_cache.move_to_end(cache_key)
+        while len(_signature_cache) > _INDEX_CACHE_SIZE:
+            _signature_cache.popitem(last=False)
+    return index
+
+
+def flag_near_duplicates(posts: List[Dict], index: DuplicateIndex,
+                         threshold: Optional[float] = None) -> List[int]:
+    """
+    Mark generated posts that nearly repeat a reference post or an earlier
+    post in the same batch. Flagged posts get a 'near_duplicate' entry with
+    the similarity, a preview of the matching text and its source; others
+    have the entry removed.
+    Returns:
+        Indexes (into `posts`) of the flagged posts
+    """
+    threshold = index.threshold if threshold is None else threshold
+    batch = DuplicateIndex(threshold)
+    flagged = []
+    for i, post in enumerate(posts):
+        content = post.get('content', '')
+        matches = index.query(content, threshold) + batch.query(content, threshold)
+        batch.add(content, source="this batch")
+        post.pop('near_duplicate', None)
+        if matches:
+            best = max(matches, key=lambda m: m["similarity"])
+            post['near_duplicate'] = {
+                "similarity": best["similarity"],
+                "match": best["text"],
+                "source": best["source"]
+            }
+            flagged.append(i)
+    return flagged
+
+
+def duplicate_pairs(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[int, int, float]]:
+    """All (i, j, similarity) pairs above `threshold` within a list of texts."""
+    index = DuplicateIndex(threshold)
+    pairs = []
+    for j, text in enumerate(texts):
+        sig = signature(text)
+        for i in sorted(index._candidates(sig)):
+            similarity = estimated_jaccard(sig, index._signatures[i])
+            if similarity >= threshold:
+                pairs.append((i, j, round(similarity, 3)))
+        index.add(text)
+    return pairs
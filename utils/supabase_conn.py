@@ -2,8 +2,33 @@ from supabase import create_client, Client
 from supabase.client import ClientOptions
 from dotenv import load_dotenv
 import streamlit as st
-from datetime import datetime
-from typing import Dict, List, Optional
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from . import embeddings
+from . import post_metrics
+from .vector_index import VectorIndex, get_index
+
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", os.path.join("cache", "vector_index"))
+# Posts saved or deleted by other processes show up in search after this long
+INDEX_RESYNC_S = float(os.environ.get("INDEX_RESYNC_S", "600"))
+INDEX_FETCH_CHUNK = 100
+# PostgREST (schema cache) and Postgres error codes for a column that doesn't exist
+_MISSING_COLUMN_CODES = ("PGRST204", "42703")
+
+# (index path, brand id, user id) -> time.monotonic() of the last sync_index, shared by all sessions
+_synced = {}
+_synced_lock = threading.Lock()
+
+
+def _missing_metric_columns(error: Exception) -> List[str]:
+    """The metric columns an insert failed for because the posts table doesn't have them yet."""
+    message = str(error)
+    if getattr(error, "code", None) not in _MISSING_COLUMN_CODES and "column" not in message:
+        return []
+    return [name for name in (*post_metrics.FIELDS, post_metrics.DIGEST_FIELD) if name in message]
 
 # Load environment variables from .env
 load_dotenv()
@@ -16,6 +41,9 @@ class SupaBase:
         url = st.secrets["DATABASE_URL"]#os.environ.get("DATABASE_URL")
         key = st.secrets["SUPABASE_SECRET"]#os.environ.get("SUPABASE_SECRET")
         self.supabase = create_client(url, key)
+        # Semantic search: set `embedder` (see utils/embeddings.py) to choose the embedding model
+        self.embedder = None
+        self._pending_index = []
 
     def get_brands(self, user_id: Optional[str] = None) -> List[Dict]:
         """
@@ -111,7 +139,8 @@ class SupaBase:
             print(f"Error deleting brand {brand_id}: {str(e)}")
             return False
 
-    def save_posts(self, brand_id: str, post: str, user_id: str, graphic_concept: str, type: str, date: Optional[str] = None) -> Optional[Dict]:
+    def save_posts(self, brand_id: str, post: str, user_id: str, graphic_concept: str, type: str, date: Optional[str] = None,
+                   metrics: Optional[Dict] = None) -> Optional[Dict]:
         """
         Save a post to the 'posts' table.
         Args:
@@ -121,6 +150,7 @@ class SupaBase:
             graphic_concept: Description or identifier for the graphic concept
             type: Type of the post
             date: Optional ISO date string; if not provided, uses current datetime
+            metrics: The post's text metrics (see utils/post_metrics.py); computed when not given
         Returns:
             Created post dictionary or None if failed
         """
@@ -133,8 +163,29 @@ class SupaBase:
                 "type": type,
                 "date": date 
             }
-            response = self.supabase.table("posts").insert(post_data).execute()
-            return response.data[0] if response.data else None
+            post_data.update(metrics or post_metrics.compute(post))
+            post_data[post_metrics.DIGEST_FIELD] = post_metrics.digest(post)
+            while True:
+                try:
+                    response = self.supabase.table("posts").insert(post_data).execute()
+                    break
+                except Exception as e:
+                    # Database without the metric columns (migrations/005_post_metrics.sql) or the
+                    # digest column (006_post_text_digest.sql) yet: save the post without them
+                    missing = [name for name in _missing_metric_columns(e) if name in post_data]
+                    if not missing:
+                        raise
+                    print(f"Error saving post metrics, saving the post without {', '.join(missing)}: {str(e)}")
+                    drop = missing if missing == [post_metrics.DIGEST_FIELD] else [*post_metrics.FIELDS, post_metrics.DIGEST_FIELD]
+                    for name in drop:
+                        post_data.pop(name, None)
+            saved = response.data[0] if response.data else None
+            if saved:
+                # Embedded in batches by flush_index()
+                self._pending_index.append(saved)
+                if len(self._pending_index) >= embeddings.BATCH_SIZE:
+                    self.flush_index()
+            return saved
         except Exception as e:
             print(f"Error saving post for brand {brand_id}: {str(e)}")
             return None
@@ -158,6 +209,229 @@ class SupaBase:
             print(f"Error fetching posts for brand {brand_id}: {str(e)}")
             return []
 
+    def get_posts_page(self, brand_id: Optional[str], user_id: Optional[str] = None, page: int = 0,
+                       page_size: int = 25, post_type: Optional[str] = None,
+                       search: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        Fetch one page of a brand's posts, newest first, filtered in the database.
+        Args:
+            brand_id: UUID string of the brand; None for the posts of all the user's brands
+            user_id: Optional user ID to ensure access to posts (required when brand_id is None)
+            page: 0-based page number
+            page_size: Number of posts per page
+            post_type: Optional post type to keep, e.g. "LinkedIn Calendar Posts"
+            search: Optional keywords the post must contain (case-insensitive)
+        Returns:
+            Tuple of (post dictionaries of the page, total number of matching posts)
+        """
+        if not brand_id and not user_id:
+            print("Error fetching posts page: a brand or a user is required")
+            return [], 0
+        try:
+            start = page * page_size
+            query = self.supabase.table("posts").select("*", count="exact")
+            if brand_id:
+                query = query.eq("brand_id", brand_id)
+            if user_id:
+                query = query.eq("user_id", user_id)
+            if post_type:
+                query = query.eq("type", post_type)
+            if search:
+                pattern = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                query = query.ilike("post", f"%{pattern}%")
+            # id breaks ties between posts of the same date, so pages never overlap
+            response = (query.order("date", desc=True).order("id", desc=True)
+                        .range(start, start + page_size - 1).execute())
+            total = response.count if response.count is not None else start + len(response.data)
+            return response.data, total
+        except Exception as e:
+            print(f"Error fetching posts page {page} for brand {brand_id or 'all'}: {str(e)}")
+            return [], 0
+
+    def _vector_index_path(self) -> str:
+        embedder = self.embedder or embeddings.get_embedder()
+        return os.path.join(VECTOR_INDEX_DIR, f"posts_{embedder.name}.npz")
+
+    def _get_vector_index(self) -> VectorIndex:
+        """The process-wide vector index for the current embedder, loaded from disk on first use."""
+        embedder = self.embedder or embeddings.get_embedder()
+        return get_index(self._vector_index_path(), embedder.dimensions)
+
+    def index_posts(self, posts: List[Dict]) -> int:
+        """
+        Embed posts and add them to the semantic search index.
+        Args:
+            posts: Post rows from the 'posts' table
+        Returns:
+            Number of posts indexed
+        """
+        posts = [post for post in posts if post.get("id") is not None and post.get("post")]
+        if not posts:
+            return 0
+        try:
+            index = self._get_vector_index()
+            vectors = (self.embedder or embeddings.get_embedder()).embed([post["post"] for post in posts])
+            payloads = [{
+                "post": post.get("post", ""),
+                "graphic_concept": post.get("graphic_concept", ""),
+                "type": post.get("type", ""),
+                "date": post.get("date", ""),
+                "brand_id": post.get("brand_id"),
+                "user_id": post.get("user_id")
+            } for post in posts]
+            index.add([post["id"] for post in posts], vectors, [post.get("brand_id") for post in posts], payloads)
+            index.save(self._vector_index_path())
+            return len(posts)
+        except Exception as e:
+            print(f"Error indexing posts: {str(e)}")
+            return 0
+
+    def flush_index(self) -> int:
+        """Index posts saved since the last flush in one batch."""
+        pending, self._pending_index = self._pending_index, []
+        return self.index_posts(pending)
+
+    def sync_index(self, brand_id: str, user_id: Optional[str] = None) -> int:
+        """
+        Bring the index in line with a brand's saved posts: embed new posts
+        and drop deleted ones. Only post ids are read for the comparison and
+        only new posts are fetched in full; removals are limited to the same
+        brand and user as the query. Embeddings are cached, so only new text
+        is sent.
+        Returns:
+            Number of posts newly indexed
+        """
+        index = self._get_vector_index()
+        query = self.supabase.table("posts").select("id").eq("brand_id", brand_id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        current_ids = {str(row.get("id")) for row in query.execute().data}
+        stale_ids = index.ids_for_brand(brand_id, user_id) - current_ids
+        for stale_id in stale_ids:
+            index.remove(stale_id)
+        missing_ids = [post_id for post_id in current_ids if post_id not in index]
+        added = 0
+        for start in range(0, len(missing_ids), INDEX_FETCH_CHUNK):
+            response = (self.supabase.table("posts").select("*")
+                        .in_("id", missing_ids[start:start + INDEX_FETCH_CHUNK]).execute())
+            added += self.index_posts(response.data)
+        if stale_ids and not added:
+            index.save(self._vector_index_path())
+        with _synced_lock:
+            _synced[(self._vector_index_path(), brand_id, user_id)] = time.monotonic()
+        return added
+
+    def semantic_search(self, brand_id: str, text: str, k: int = 10, user_id: Optional[str] = None) -> List[Dict]:
+        """
+        Find a brand's saved posts closest in meaning to `text`.
+        Args:
+            brand_id: UUID string of the brand
+            text: Free-text query, e.g. "posts about hiring"
+            k: Number of results
+            user_id: Optional user ID to ensure access to posts
+        Returns:
+            Post dictionaries with a `score` (cosine similarity), best first
+        """
+        try:
+            if self._pending_index:
+                self.flush_index()
+            index = self._get_vector_index()
+            with _synced_lock:
+                synced_at = _synced.get((self._vector_index_path(), brand_id, user_id))
+            if synced_at is None or time.monotonic() - synced_at > INDEX_RESYNC_S:
+                self.sync_index(brand_id, user_id)
+            query = (self.embedder or embeddings.get_embedder()).embed([text])[0]
+            return index.search(query, k, brand_id=brand_id, user_id=user_id or None)
+        except Exception as e:
+            print(f"Error searching posts for brand {brand_id}: {str(e)}")
+            return []
+
+    def log_llm_call(self, record: Dict) -> Optional[Dict]:
+        """
+        Save an OpenAI call telemetry record to the 'llm_calls' table.
+        Args:
+            record: Telemetry record (see utils/telemetry.py)
+        Returns:
+            Created record dictionary or None if failed
+        """
+        try:
+            response = self.supabase.table("llm_calls").insert(record).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error saving LLM call record: {str(e)}")
+            return None
+
+    def get_llm_calls(self, limit: int = 500) -> List[Dict]:
+        """
+        Fetch the most recent OpenAI call telemetry records.
+        Args:
+            limit: Maximum number of records to return
+        Returns:
+            List of record dictionaries, oldest first
+        """
+        try:
+            response = self.supabase.table("llm_calls").select("*").order("timestamp", desc=True).limit(limit).execute()
+            return list(reversed(response.data))
+        except Exception as e:
+            print(f"Error fetching LLM call records: {str(e)}")
+            return []
+
+    def save_draft(self, draft: Dict) -> Optional[Dict]:
+        """
+        Insert or update a draft in the 'drafts' table.
+        Args:
+            draft: Draft dictionary (see utils/drafts.py)
+        Returns:
+            Saved draft dictionary or None if failed
+        """
+        try:
+            row = {
+                **draft,
+                "created_at": datetime.fromtimestamp(draft["created_at"], timezone.utc).isoformat(),
+                "updated_at": datetime.fromtimestamp(draft["updated_at"], timezone.utc).isoformat()
+            }
+            response = self.supabase.table("drafts").upsert(row).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error saving draft {draft.get('id')}: {str(e)}")
+            return None
+
+    def get_latest_draft(self, user_id: str, kind: str) -> Optional[Dict]:
+        """
+        Fetch a user's most recently updated draft of one kind.
+        Args:
+            user_id: ID of the user
+            kind: Draft kind, e.g. "calendar" or "article"
+        Returns:
+            Draft dictionary or None if not found
+        """
+        try:
+            response = (self.supabase.table("drafts").select("*").eq("user_id", user_id).eq("kind", kind)
+                        .order("updated_at", desc=True).limit(1).execute())
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error fetching {kind} draft: {str(e)}")
+            return None
+
+    def delete_draft(self, draft_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        Delete a draft from the database.
+        Args:
+            draft_id: ID of the draft (the generation job id)
+            user_id: Optional user ID to ensure draft ownership
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            query = self.supabase.table("drafts").delete().eq("id", draft_id)
+            if user_id:
+                query = query.eq("user_id", user_id)
+            query.execute()
+            return True
+        except Exception as e:
+            print(f"Error deleting draft {draft_id}: {str(e)}")
+            return False
+
     # User management methods for authentication
     def create_user(self, username: str, email: str, password_hash: str) -> Optional[Dict]:
         """
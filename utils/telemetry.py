@@ -0,0 +1,282 @@
+"""
+Per-call telemetry for OpenAI requests.
+
+Every request made from utils/openai.py is wrapped in `track()`, which
+produces one record per call with the model, latency, time to first token,
+token usage (including prompt-cache hits), rate-limit retries and how many
+posts were parsed out of how many were requested. Records are written to a
+pluggable sink chosen with the LLM_TELEMETRY_SINK environment variable:
+
+    LLM_TELEMETRY_SINK=log:logs/llm_calls.jsonl   (default)
+    LLM_TELEMETRY_SINK=sqlite:logs/llm_calls.db
+    LLM_TELEMETRY_SINK=supabase                   (table 'llm_calls')
+    LLM_TELEMETRY_SINK=none
+
+Run `python -m utils.telemetry` for a summary of the recorded calls.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .jobs import JobCancelled
+
+DEFAULT_SINK = "log:logs/llm_calls.jsonl"
+
+RECORD_FIELDS = [
+    "timestamp", "operation", "route", "model", "attempted_models", "prompt_version", "status", "error",
+    "latency_s", "ttft_s", "prompt_tokens", "completion_tokens", "cached_tokens",
+    "retries", "hedged", "hedge_won", "requested_posts", "parsed_posts"
+]
+
+
+def _sqlite_type(field: str) -> str:
+    if field.endswith("_s"):
+        return "REAL"
+    if field.endswith("_tokens") or field.endswith("_posts") or field in ("retries", "hedged", "hedge_won"):
+        return "INTEGER"
+    return "TEXT"
+
+
+class LogFileSink:
+    """Appends records as JSON lines to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def read(self, limit: int = 500) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()[-limit:]
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+class SQLiteSink:
+    """Stores records in a local SQLite database."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(f"{field} {_sqlite_type(field)}" for field in RECORD_FIELDS)
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS llm_calls ({columns})")
+            # Databases created by older versions lack newer fields
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_calls)")}
+            for field in RECORD_FIELDS:
+                if field not in existing:
+                    self._conn.execute(f"ALTER TABLE llm_calls ADD COLUMN {field} {_sqlite_type(field)}")
+            self._conn.commit()
+
+    def write(self, record: Dict):
+        placeholders = ", ".join("?" for _ in RECORD_FIELDS)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO llm_calls ({', '.join(RECORD_FIELDS)}) VALUES ({placeholders})",
+                [record.get(field) for field in RECORD_FIELDS]
+            )
+            self._conn.commit()
+
+    def read(self, limit: int = 500) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RECORD_FIELDS)} FROM llm_calls ORDER BY timestamp DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(zip(RECORD_FIELDS, row)) for row in reversed(rows)]
+
+
+class SupabaseSink:
+    """Stores records in the Supabase 'llm_calls' table."""
+
+    def __init__(self, supabase_client=None):
+        if supabase_client is None:
+            from .supabase_conn import SupaBase
+            supabase_client = SupaBase()
+        self.supabase_client = supabase_client
+
+    def write(self, record: Dict):
+        self.supabase_client.log_llm_call({field: record.get(field) for field in RECORD_FIELDS})
+
+    def read(self, limit: int = 500) -> List[Dict]:
+        return self.supabase_client.get_llm_calls(limit)
+
+
+class NullSink:
+    """Discards records."""
+
+    def write(self, record: Dict):
+        pass
+
+    def read(self, limit: int = 500) -> List[Dict]:
+        return []
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def create_sink(spec: str):
+    """Build a sink from a spec such as 'log:path', 'sqlite:path', 'supabase' or 'none'."""
+    kind, _, target = spec.partition(":")
+    if kind == "log":
+        return LogFileSink(target or "logs/llm_calls.jsonl")
+    if kind == "sqlite":
+        return SQLiteSink(target or "logs/llm_calls.db")
+    if kind == "supabase":
+        return SupabaseSink()
+    if kind == "none":
+        return NullSink()
+    raise ValueError(f"Unknown telemetry sink: {spec}")
+
+
+def get_sink():
+    """Return the process-wide sink configured by LLM_TELEMETRY_SINK."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            try:
+                _sink = create_sink(os.environ.get("LLM_TELEMETRY_SINK", DEFAULT_SINK))
+            except Exception as e:
+                print(f"Error creating telemetry sink, telemetry disabled: {str(e)}")
+                _sink = NullSink()
+        return _sink
+
+
+def set_sink(sink):
+    """Replace the process-wide sink (e.g. with a NullSink in scripts)."""
+    global _sink
+    with _sink_lock:
+        _sink = sink
+
+
+def emit(record: Dict):
+    """Write a record to the configured sink; telemetry never breaks a generation."""
+    try:
+        get_sink().write(record)
+    except Exception as e:
+        print(f"Error writing telemetry record: {str(e)}")
+
+
+@contextmanager
+def track(operation: str, requested_posts: Optional[int] = None):
+    """
+    Record one OpenAI call. The caller fills in model, token and parse fields
+    on the yielded record; latency, status and errors are filled in here and
+    the record is emitted when the block exits.
+    Args:
+        operation: Name of the generating function, e.g. "generate_social_posts"
+        requested_posts: Number of posts the call was asked to produce
+    """
+    record = {field: None for field in RECORD_FIELDS}
+    record.update({
+        "timestamp": datetime.now().isoformat(),
+        "operation": operation,
+        "status": "ok",
+        "retries": 0,
+        "hedged": 0,
+        "requested_posts": requested_posts
+    })
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "cancelled" if isinstance(e, JobCancelled) else "error"
+        record["error"] = f"{type(e).__name__}: {str(e)}"[:500]
+        raise
+    finally:
+        record["latency_s"] = round(time.perf_counter() - start, 3)
+        emit(record)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(records: List[Dict]) -> List[Dict]:
+    """
+    Aggregate records per operation.
+    Returns:
+        One row per operation with call counts, latency percentiles, token
+        totals, cache hit share and parse yield
+    """
+    by_operation = {}
+    for record in records:
+        by_operation.setdefault(record.get("operation") or "unknown", []).append(record)
+
+    rows = []
+    for operation, items in sorted(by_operation.items()):
+        latencies = [float(r["latency_s"]) for r in items if r.get("latency_s") is not None]
+        ttfts = [float(r["ttft_s"]) for r in items if r.get("ttft_s") is not None]
+        prompt_tokens = sum(int(r.get("prompt_tokens") or 0) for r in items)
+        cached_tokens = sum(int(r.get("cached_tokens") or 0) for r in items)
+        requested = sum(int(r.get("requested_posts") or 0) for r in items if r.get("parsed_posts") is not None)
+        parsed = sum(int(r.get("parsed_posts") or 0) for r in items if r.get("parsed_posts") is not None)
+        p50 = _percentile(latencies, 50)
+        p95 = _percentile(latencies, 95)
+        ttft_p50 = _percentile(ttfts, 50)
+        rows.append({
+            "operation": operation,
+            "models": ", ".join(sorted({r["model"] for r in items if r.get("model")})),
+            "calls": len(items),
+            "fallbacks": sum(1 for r in items if " > " in (r.get("attempted_models") or "")),
+            "errors": sum(1 for r in items if r.get("status") != "ok"),
+            "retries": sum(int(r.get("retries") or 0) for r in items),
+            "hedges": sum(int(r.get("hedged") or 0) for r in items),
+            "hedge_wins": sum(int(r.get("hedge_won") or 0) for r in items),
+            "p50_latency_s": round(p50, 2) if p50 is not None else None,
+            "p95_latency_s": round(p95, 2) if p95 is not None else None,
+            "p50_ttft_s": round(ttft_p50, 2) if ttft_p50 is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(int(r.get("completion_tokens") or 0) for r in items),
+            "cache_hit_pct": round(cached_tokens / prompt_tokens * 100, 1) if prompt_tokens else 0.0,
+            "parse_yield_pct": round(parsed / requested * 100, 1) if requested else None
+        })
+    return rows
+
+
+def render_summary(limit: int = 500):
+    """Streamlit view of recent telemetry, aggregated per operation."""
+    import streamlit as st
+
+    from .model_router import get_router
+
+    records = get_sink().read(limit)
+    if not records:
+        st.caption("No OpenAI calls recorded yet.")
+    else:
+        st.dataframe(summarize(records), use_container_width=True, hide_index=True)
+        st.caption(f"Based on the last {len(records)} calls")
+
+    st.markdown("**Model routes**")
+    st.dataframe(get_router().describe(), use_container_width=True, hide_index=True)
+
+
+if __name__ == "__main__":
+    from .model_router import get_router
+
+    for route in get_router().describe():
+        print(json.dumps(route))
+    rows = summarize(get_sink().read(5000))
+    if not rows:
+        print("No OpenAI calls recorded yet.")
+    for row in rows:
+        print(json.dumps(row))
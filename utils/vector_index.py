@@ -0,0 +1,164 @@
+"""
+Compact in-memory vector index backed by NumPy.
+
+Vectors are kept in one float32 matrix (grown by doubling) alongside each
+post's id, brand id and a small payload for display. A search is a single
+matrix-vector product followed by a partial sort, which takes a few
+milliseconds for tens of thousands of posts. Indexes are saved as .npz
+files with float16 vectors to keep them small on disk. get_index() hands
+every session of the process the same index per file, so sessions don't
+load their own copies and overwrite each other's saves.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from . import lazy
+
+np = lazy.load("numpy")
+
+
+class VectorIndex:
+    """Normalised vectors keyed by post id, searchable by cosine similarity."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._size = 0
+        self._ids = []
+        self._brand_ids = []
+        self._payloads = []
+        self._positions = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return str(item_id) in self._positions
+
+    def _grow(self, needed: int):
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        grown = np.zeros((new_capacity, self.dimensions), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def add(self, ids: List, vectors: "np.ndarray", brand_ids: List, payloads: Optional[List[Dict]] = None):
+        """Add or replace vectors; `payloads` holds whatever a search result should show."""
+        payloads = payloads or [{} for _ in ids]
+        with self._lock:
+            self._grow(self._size + len(ids))
+            for item_id, vector, brand_id, payload in zip(ids, vectors, brand_ids, payloads):
+                item_id = str(item_id)
+                position = self._positions.get(item_id)
+                if position is None:
+                    position = self._size
+                    self._size += 1
+                    self._positions[item_id] = position
+                    self._ids.append(item_id)
+                    self._brand_ids.append(str(brand_id))
+                    self._payloads.append(payload)
+                else:
+                    self._brand_ids[position] = str(brand_id)
+                    self._payloads[position] = payload
+                self._vectors[position] = vector
+
+    def remove(self, item_id):
+        """Drop a vector by moving the last one into its place."""
+        with self._lock:
+            position = self._positions.pop(str(item_id), None)
+            if position is None:
+                return
+            last = self._size - 1
+            if position != last:
+                self._vectors[position] = self._vectors[last]
+                self._ids[position] = self._ids[last]
+                self._brand_ids[position] = self._brand_ids[last]
+                self._payloads[position] = self._payloads[last]
+                self._positions[self._ids[position]] = position
+            self._ids.pop()
+            self._brand_ids.pop()
+            self._payloads.pop()
+            self._size = last
+
+    def ids_for_brand(self, brand_id, user_id=None) -> set:
+        """Ids of a brand's vectors, only those whose payload has `user_id` when one is given."""
+        with self._lock:
+            return {item_id for item_id, owner, payload in zip(self._ids, self._brand_ids, self._payloads)
+                    if owner == str(brand_id) and (user_id is None or payload.get("user_id") == user_id)}
+
+    def search(self, query: "np.ndarray", k: int = 10, brand_id=None, user_id=None) -> List[Dict]:
+        """
+        Find the `k` nearest vectors to `query`.
+        Args:
+            query: Normalised query vector
+            k: Number of results
+            brand_id: Optional brand to restrict the search to
+            user_id: Optional user whose vectors (by payload) the search is restricted to
+        Returns:
+            Results sorted by score, each with id, score and the stored payload
+        """
+        with self._lock:
+            if not self._size:
+                return []
+            scores = self._vectors[:self._size] @ np.asarray(query, dtype=np.float32)
+            if brand_id is not None:
+                mask = np.array(self._brand_ids) == str(brand_id)
+                scores = np.where(mask, scores, -np.inf)
+            if user_id is not None:
+                mask = np.array([payload.get("user_id") in (None, user_id) for payload in self._payloads])
+                scores = np.where(mask, scores, -np.inf)
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self._ids[i], "score": float(scores[i]), **self._payloads[i]}
+                for i in top if np.isfinite(scores[i])
+            ]
+
+    def save(self, path: str):
+        with self._lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                vectors=self._vectors[:self._size].astype(np.float16),
+                ids=np.array(self._ids, dtype=str),
+                brand_ids=np.array(self._brand_ids, dtype=str),
+                payloads=np.array(json.dumps(self._payloads))
+            )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dimensions: int) -> "VectorIndex":
+        """Load an index saved with save(); returns an empty index if the file is missing or unreadable."""
+        index = cls(dimensions)
+        if not os.path.exists(path):
+            return index
+        try:
+            with np.load(path) as data:
+                vectors = data["vectors"].astype(np.float32)
+                if vectors.size and vectors.shape[1] != dimensions:
+                    raise ValueError(f"index has {vectors.shape[1]} dimensions, expected {dimensions}")
+                index.add(data["ids"].tolist(), vectors, data["brand_ids"].tolist(), json.loads(str(data["payloads"])))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading vector index {path}: {str(e)}")
+            return cls(dimensions)
+        return index
+
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path: str, dimensions: int) -> VectorIndex:
+    """The process-wide index stored at `path`, loaded on first use."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.dimensions != dimensions:
+            index = _indexes[path] = VectorIndex.load(path, dimensions)
+        return index